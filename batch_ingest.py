@@ -0,0 +1,100 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NeedData
+
+READ_CHUNK_SIZE = 64 * 1024
+# Archives are spooled to disk past this size so memory stays bounded
+ZIP_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def is_zip_name(name):
+    return name.lower().endswith(".zip")
+
+
+def iter_zip_images(fileobj):
+    """Yield (name, bytes) for every image entry of a seekable ZIP file object."""
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            # Skip macOS resource forks and other hidden entries
+            if os.path.basename(info.filename).startswith("."):
+                continue
+            yield info.filename, archive.read(info)
+
+
+def _spool_stream(stream):
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(stream, spool, READ_CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+
+def iter_multipart_images(stream, boundary):
+    """Decode a multipart body incrementally and yield (filename, bytes) per image.
+
+    Only the part currently being received is held in memory; ZIP parts are
+    spooled to a temporary file and expanded entry by entry once complete.
+    """
+    decoder = MultipartDecoder(boundary)
+    current_name = None
+    current_buffer = None
+    finished = False
+    while not finished:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        decoder.receive_data(chunk if chunk else None)
+        event = decoder.next_event()
+        while not isinstance(event, NeedData):
+            if isinstance(event, File):
+                current_name = event.filename or event.name
+                if is_zip_name(current_name):
+                    current_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_MEMORY)
+                else:
+                    current_buffer = io.BytesIO()
+            elif isinstance(event, Data) and current_buffer is not None:
+                current_buffer.write(event.data)
+                if not event.more_data:
+                    name, buffer = current_name, current_buffer
+                    current_name, current_buffer = None, None
+                    if is_zip_name(name):
+                        buffer.seek(0)
+                        try:
+                            yield from iter_zip_images(buffer)
+                        finally:
+                            buffer.close()
+                    else:
+                        yield name, buffer.getvalue()
+            elif isinstance(event, Epilogue):
+                finished = True
+                break
+            event = decoder.next_event()
+        if not chunk and not finished:
+            raise ValueError("Unexpected end of multipart body")
+
+
+def iter_request_images(stream, content_type):
+    """Yield (filename, bytes) from a multipart/form-data or ZIP request body."""
+    mimetype, options = parse_options_header(content_type or "")
+    if mimetype == "multipart/form-data":
+        boundary = options.get("boundary")
+        if not boundary:
+            raise ValueError("Missing multipart boundary")
+        yield from iter_multipart_images(stream, boundary.encode("latin-1"))
+    elif mimetype in ("application/zip", "application/x-zip-compressed"):
+        spool = _spool_stream(stream)
+        try:
+            yield from iter_zip_images(spool)
+        finally:
+            spool.close()
+    else:
+        raise ValueError(f"Unsupported content type: {mimetype or 'none'}")
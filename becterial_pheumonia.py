@@ -8,6 +8,11 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tkinter import filedialog, Tk
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import pandas as pd
+from input_pipeline import load_split
+from training_utils import (
+    EpochTimer, ResumableCheckpoint, TRAIN_JIT_COMPILE, TRAIN_MIXED_PRECISION,
+    build_model, compile_model, configure_precision, to_float32_model
+)
 # ------------------ ✅ Paths ------------------ #
 base_path = r"E:\chest_xray\Lung Disease Dataset"
 train_path = os.path.join(base_path, "train")
@@ -15,32 +20,27 @@ val_path = os.path.join(base_path, "val")
 test_path = os.path.join(base_path, "test")
 model_save_path = os.path.join(base_path, "trained_model")
 model_file = os.path.join(model_save_path, "lung_disease_model1.h5")
+# Periodic checkpoints of an unfinished run; training resumes from here after a crash
+checkpoint_path = os.path.join(model_save_path, "checkpoints")
 
 # ------------------ ✅ Load Datasets ------------------ #
 if not os.path.exists(train_path):
     raise FileNotFoundError(f"❌ Directory not found: {train_path}")
 
-train_dataset_raw = tf.keras.utils.image_dataset_from_directory(
-    train_path, labels="inferred", label_mode="int", batch_size=32,
-    image_size=(150, 150), seed=123
-)
-class_names = train_dataset_raw.class_names
+# Parallel decode, shuffle and prefetch live in input_pipeline.py. INPUT_SHARDS=1
+# reads the splits through pre-resized shards instead, which it writes to
+# <base_path>/shards next to the dataset (see dataset_shards.py)
+train_dataset = load_split(train_path, training=True)
+class_names = train_dataset.class_names
 num_classes = len(class_names)
 print(f"\n✅ Found Classes: {class_names}")
 
-def normalize_data(image, label):
-    return tf.cast(image, tf.float32) / 255.0, label
-
 # ------------------ ✅ Load or Train Model ------------------ #
 if os.path.exists(model_file):
     print(f"\n✅ Found trained model at: {model_file}")
     model = tf.keras.models.load_model(model_file)
 
-    test_dataset_raw = tf.keras.utils.image_dataset_from_directory(
-        test_path, labels="inferred", label_mode="int", batch_size=32,
-        image_size=(150, 150), seed=123
-    )
-    test_dataset = test_dataset_raw.map(normalize_data)
+    test_dataset = load_split(test_path, cache="")
     test_loss, test_accuracy = model.evaluate(test_dataset)
     print(f"\n✅ Loaded model evaluation:")
     print(f"Test Loss: {test_loss:.4f}")
@@ -49,52 +49,38 @@ if os.path.exists(model_file):
 else:
     print("\n⚙️ No trained model found. Starting training...")
 
-    val_dataset_raw = tf.keras.utils.image_dataset_from_directory(
-        val_path, labels="inferred", label_mode="int", batch_size=32,
-        image_size=(150, 150), seed=123
-    )
-    test_dataset_raw = tf.keras.utils.image_dataset_from_directory(
-        test_path, labels="inferred", label_mode="int", batch_size=32,
-        image_size=(150, 150), seed=123
-    )
+    # Validation runs every epoch, so it is cached too; test is read once
+    val_dataset = load_split(val_path)
+    test_dataset = load_split(test_path, cache="")
 
-    train_dataset = train_dataset_raw.map(normalize_data)
-    val_dataset = val_dataset_raw.map(normalize_data)
-    test_dataset = test_dataset_raw.map(normalize_data)
-
-    model = tf.keras.Sequential([
-        tf.keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(150, 150, 3)),
-        tf.keras.layers.MaxPooling2D((2, 2)),
-        tf.keras.layers.Conv2D(64, (3, 3), activation='relu'),
-        tf.keras.layers.MaxPooling2D((2, 2)),
-        tf.keras.layers.Conv2D(128, (3, 3), activation='relu'),
-        tf.keras.layers.MaxPooling2D((2, 2)),
-        tf.keras.layers.Conv2D(256, (3, 3), activation='relu'),
-        tf.keras.layers.MaxPooling2D((2, 2)),
-        tf.keras.layers.Flatten(),
-        tf.keras.layers.Dense(256, activation='relu'),
-        tf.keras.layers.Dropout(0.5),
-        tf.keras.layers.Dense(num_classes, activation='softmax')
-    ])
-
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
-        loss='sparse_categorical_crossentropy',
-        metrics=['accuracy']
-    )
+    # Opt-in speedups: TRAIN_JIT_COMPILE=1 (XLA), TRAIN_MIXED_PRECISION=1 (bfloat16)
+    configure_precision(TRAIN_MIXED_PRECISION)
+    print(f"⚙️ jit_compile={TRAIN_JIT_COMPILE}, mixed_bfloat16={TRAIN_MIXED_PRECISION}")
+    model = compile_model(build_model(num_classes), learning_rate=0.001, jit_compile=TRAIN_JIT_COMPILE)
 
     early_stop = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
     lr_scheduler = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3)
+    checkpoint = ResumableCheckpoint(checkpoint_path, callbacks=[early_stop, lr_scheduler])
+    epoch_timer = EpochTimer()
+    initial_epoch = checkpoint.restore(model)
 
     history = model.fit(
         train_dataset,
         validation_data=val_dataset,
         epochs=50,
-        callbacks=[early_stop, lr_scheduler]
+        initial_epoch=initial_epoch,
+        callbacks=[early_stop, lr_scheduler, checkpoint, epoch_timer]
     )
+    if epoch_timer.epoch_seconds:
+        steady = epoch_timer.epoch_seconds[1:] or epoch_timer.epoch_seconds
+        print(f"\n✅ Epoch time: first {epoch_timer.epoch_seconds[0]:.1f}s, "
+              f"then {sum(steady) / len(steady):.1f}s on average")
 
+    # bfloat16 training still saves (and serves) a float32 model
+    model = to_float32_model(model, lambda: compile_model(build_model(num_classes), jit_compile=False))
     os.makedirs(model_save_path, exist_ok=True)
     model.save(model_file)
+    checkpoint.clear()
     print(f"\n✅ Model has been saved to: {model_file}")
     test_loss, test_accuracy = model.evaluate(test_dataset)
     print(f"\nTest Loss: {test_loss:.4f}")
@@ -131,4 +117,4 @@ def predict_single_image():
     plt.show()
 
 # ------------------ ✅ Run Prediction ------------------ #
-predict_single_image()
\ No newline at end of file
+predict_single_image()
\ No newline at end of file
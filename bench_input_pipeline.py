@@ -0,0 +1,77 @@
+"""Input throughput: image_dataset_from_directory + map vs input_pipeline.
+
+Usage:
+    python bench_input_pipeline.py [image_dir] [--epochs E] [--batch-size B] [--cache-dir DIR]
+
+Each pipeline is iterated for E epochs without a model, so the numbers are
+the ceiling the input side imposes on training. Epoch 1 of a cached pipeline
+includes decoding; later epochs read from the cache.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import tensorflow as tf
+
+from input_pipeline import build_dataset
+
+train_path = os.path.join(r"E:\chest_xray\Lung Disease Dataset", "train")
+
+
+def legacy_dataset(directory, batch_size, image_size):
+    # The original pipeline of becterial_pheumonia.py / train.py
+    def normalize_data(image, label):
+        return tf.cast(image, tf.float32) / 255.0, label
+
+    dataset = tf.keras.utils.image_dataset_from_directory(
+        directory, labels="inferred", label_mode="int", batch_size=batch_size,
+        image_size=image_size, seed=123, verbose=False
+    )
+    return dataset.map(normalize_data)
+
+
+def time_epochs(dataset, epochs):
+    results = []
+    for _ in range(epochs):
+        images = 0
+        start = time.perf_counter()
+        for batch, _ in dataset:
+            images += int(batch.shape[0])
+        results.append((images, time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image_dir", nargs="?", default=train_path)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--cache-dir", default=None, help="on-disk cache location (default: temp dir)")
+    args = parser.parse_args()
+    image_size = (150, 150)
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="input-cache-")
+    pipelines = [
+        ("legacy", lambda: legacy_dataset(args.image_dir, args.batch_size, image_size)),
+        ("parallel, no cache", lambda: build_dataset(args.image_dir, args.batch_size, image_size,
+                                                     training=True, cache="")),
+        ("parallel + memory cache", lambda: build_dataset(args.image_dir, args.batch_size, image_size,
+                                                          training=True, cache="memory")),
+        ("parallel + disk cache", lambda: build_dataset(args.image_dir, args.batch_size, image_size,
+                                                        training=True, cache=cache_dir)),
+    ]
+    print(f"{os.cpu_count()} CPUs, batch size {args.batch_size}, {args.epochs} epochs\n")
+    print(f"{'pipeline':<26} {'epoch':>5} {'images':>7} {'seconds':>8} {'images/s':>9}")
+    try:
+        for name, make in pipelines:
+            for epoch, (images, seconds) in enumerate(time_epochs(make(), args.epochs), start=1):
+                print(f"{name:<26} {epoch:>5} {images:>7} {seconds:8.2f} {images / seconds:9.1f}")
+    finally:
+        if args.cache_dir is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""PDF extraction throughput: the original serial loop vs the rag_ingest engine.
+
+Usage:
+    python bench_pdf_ingest.py [pdf_dir] [--workers 1 4 8] [--pages-per-task 16]
+
+Every run happens in its own subprocess and reports pages/sec, the number
+of documents (pages with text) it produced and peak RSS, for the process
+itself and for its largest pool worker (on Windows only the process's own
+peak, through psutil when it is installed). The legacy loop rasterizes
+every page of a file without a text layer at once before OCR; the engine
+OCRs only pages without text, one page at a time.
+
+Document counts match only on corpora where every page has a text layer
+or none has. In a PDF where only some pages have text, the legacy loop
+skips the pages without text, but the engine OCRs them, so it yields more
+documents.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_utils import format_mb, peak_rss_mb
+from rag_ingest import FOLDER_PATH
+
+
+def legacy_extract(pdf_files):
+    # The original loop of flask_rag.py / rag_with_pkl.py (without the per-page prints)
+    from langchain.schema import Document
+    from pypdf import PdfReader
+
+    def extract_text_with_ocr(pdf_path):
+        from pdf2image import convert_from_path
+        import pytesseract
+        try:
+            pages = convert_from_path(pdf_path, dpi=300)
+            extracted = []
+            for i, page_image in enumerate(pages):
+                text = pytesseract.image_to_string(page_image)
+                extracted.append((i + 1, text.strip()))
+            return extracted
+        except Exception as e:
+            print(f"❌ OCR failed for {pdf_path}: {str(e)}", file=sys.stderr)
+            return []
+
+    documents, num_pages = [], 0
+    for path in pdf_files:
+        with open(path, "rb") as f:
+            pdf = PdfReader(f)
+            num_pages += len(pdf.pages)
+            for i, page in enumerate(pdf.pages):
+                text = page.extract_text()
+                if text and text.strip():
+                    documents.append(Document(
+                        page_content=text,
+                        metadata={"source": os.path.basename(path), "page": i + 1}
+                    ))
+            if not any(doc.metadata["source"] == os.path.basename(path) for doc in documents):
+                for page_num, text in extract_text_with_ocr(path):
+                    if text:
+                        documents.append(Document(
+                            page_content=text,
+                            metadata={"source": os.path.basename(path), "page": page_num}
+                        ))
+    return num_pages, len(documents)
+
+
+def engine_extract(pdf_files, workers, pages_per_task):
+    from rag_ingest import extract_folder
+
+    num_pages = num_documents = 0
+    for _, count, documents in extract_folder(pdf_files, workers, pages_per_task):
+        num_pages += count
+        num_documents += len(documents)
+    return num_pages, num_documents
+
+
+def run_worker(mode, pdf_files, workers, pages_per_task):
+    import langchain.schema  # noqa: F401  (import cost stays out of the timing)
+    start = time.perf_counter()
+    if mode == "legacy":
+        num_pages, num_documents = legacy_extract(pdf_files)
+    else:
+        num_pages, num_documents = engine_extract(pdf_files, workers, pages_per_task)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        'mode': mode if mode == "legacy" else f"engine x{workers}",
+        'pages': num_pages,
+        'documents': num_documents,
+        'seconds': seconds,
+        'pages_per_second': num_pages / seconds if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb("self"),
+        'peak_worker_rss_mb': peak_rss_mb("children"),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf_dir", nargs="?", default=FOLDER_PATH)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    parser.add_argument("--worker", choices=["legacy", "engine"], help=argparse.SUPPRESS)
+    parser.add_argument("--num-workers", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    pdf_files = sorted(os.path.join(args.pdf_dir, f) for f in os.listdir(args.pdf_dir) if f.endswith(".pdf"))
+    if args.worker:
+        run_worker(args.worker, pdf_files, args.num_workers, args.pages_per_task)
+        return
+    if not pdf_files:
+        raise SystemExit(f"❌ No PDFs found in {args.pdf_dir}")
+
+    print(f"📊 Benchmarking {len(pdf_files)} PDFs from {args.pdf_dir}")
+    runs = [("legacy", 1)] + [("engine", w) for w in args.workers]
+    results = []
+    for mode, workers in runs:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), args.pdf_dir, "--worker", mode,
+             "--num-workers", str(workers), "--pages-per-task", str(args.pages_per_task)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    baseline = results[0]['pages_per_second']
+    for r in results:
+        print(f"{r['mode']:>11}: {r['pages']:6d} pages {r['documents']:6d} docs  {r['seconds']:7.2f}s  "
+              f"{r['pages_per_second']:8.1f} pages/s ({r['pages_per_second'] / baseline:.2f}x)  "
+              f"peak RSS {format_mb(r['peak_rss_mb'])}, largest worker {format_mb(r['peak_worker_rss_mb'])}")
+
+
+if __name__ == "__main__":
+    main()
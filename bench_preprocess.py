@@ -0,0 +1,135 @@
+"""Micro-benchmark: Keras load_img/img_to_array vs fast_preprocess.
+
+Usage:
+    python bench_preprocess.py [image_dir] [--limit N] [--repeat R]
+
+Each path runs in its own subprocess so peak RSS is measured independently.
+Without an image directory a synthetic 3000x3000 JPEG and PNG are generated.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from batch_ingest import is_image_name
+from bench_utils import format_mb, peak_rss_mb
+
+
+def legacy_prepare_image(data, target_size=(150, 150)):
+    # The original flask_pneumonia_api.prepare_image
+    from tensorflow.keras.preprocessing.image import img_to_array, load_img
+    img = load_img(io.BytesIO(data), target_size=target_size)
+    img_array = img_to_array(img) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def fast_prepare_image(data, target_size=(150, 150)):
+    from fast_preprocess import decode_into, to_model_input
+    img_array = np.empty((1, target_size[1], target_size[0], 3), dtype=np.uint8)
+    decode_into(io.BytesIO(data), img_array[0])
+    return to_model_input(img_array)
+
+
+def list_images(image_dir, limit):
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        paths.extend(os.path.join(root, f) for f in sorted(files) if is_image_name(f))
+    return sorted(paths)[:limit]
+
+
+def make_synthetic_images(out_dir):
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    # Smooth gradient plus noise, roughly the texture of a chest film
+    yy, xx = np.mgrid[0:3000, 0:3000]
+    base = (127 + 80 * np.sin(xx / 300.0) * np.cos(yy / 400.0)).astype(np.float32)
+    film = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+    paths = []
+    for ext in ("jpg", "png"):
+        path = os.path.join(out_dir, f"synthetic_film.{ext}")
+        Image.fromarray(film, mode="L").save(path)
+        paths.append(path)
+    return paths
+
+
+def run_worker(mode, paths, repeat):
+    # Both workers import TensorFlow first so the RSS delta only reflects decoding
+    import tensorflow  # noqa: F401
+    prepare = legacy_prepare_image if mode == "legacy" else fast_prepare_image
+    blobs = [open(p, "rb").read() for p in paths]
+    baseline_rss = peak_rss_mb()
+    prepare(blobs[0])  # warm up imports
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in blobs:
+            prepare(data)
+    elapsed = time.perf_counter() - start
+    peak_rss = peak_rss_mb()
+    print(json.dumps({
+        'mode': mode,
+        'ms_per_image': elapsed * 1000.0 / (repeat * len(blobs)),
+        'peak_rss_mb': peak_rss,
+        'peak_rss_delta_mb': peak_rss - baseline_rss if peak_rss is not None and baseline_rss is not None else None
+    }))
+
+
+def compare_outputs(paths):
+    mean_diffs, max_diffs = [], []
+    for path in paths:
+        data = open(path, "rb").read()
+        diff = np.abs(legacy_prepare_image(data) - fast_prepare_image(data))
+        mean_diffs.append(float(diff.mean()))
+        max_diffs.append(float(diff.max()))
+    return {'mean_abs_diff': max(mean_diffs), 'max_abs_diff': max(max_diffs)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image_dir", nargs="?")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", choices=["legacy", "fast"], help=argparse.SUPPRESS)
+    parser.add_argument("--paths-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.paths_file, "r", encoding="utf-8") as f:
+            paths = json.load(f)
+        run_worker(args.worker, paths, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = list_images(args.image_dir, args.limit) if args.image_dir else make_synthetic_images(tmp)
+        if not paths:
+            raise SystemExit(f"❌ No images found in {args.image_dir}")
+        paths_file = os.path.join(tmp, "paths.json")
+        with open(paths_file, "w", encoding="utf-8") as f:
+            json.dump(paths, f)
+
+        print(f"📊 Benchmarking {len(paths)} images x {args.repeat} repeats")
+        results = []
+        for mode in ("legacy", "fast"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--paths-file", paths_file,
+                 "--repeat", str(args.repeat)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+        for r in results:
+            print(f"{r['mode']:>7}: {r['ms_per_image']:8.2f} ms/image   "
+                  f"peak RSS {format_mb(r['peak_rss_mb'])} (+{format_mb(r['peak_rss_delta_mb']).strip()} for decoding)")
+        speedup = results[0]['ms_per_image'] / results[1]['ms_per_image']
+        print(f"Speedup: {speedup:.2f}x")
+        diff = compare_outputs(paths)
+        print(f"Max mean |diff|: {diff['mean_abs_diff']:.4f}   max |diff|: {diff['max_abs_diff']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Throughput benchmark for serve.py from 1 to N pre-forked workers.
+
+Usage:
+    python bench_serving.py IMAGE [--max-workers N] [--tf-threads T]
+                            [--concurrency C] [--duration S] [--port P]
+
+For each worker count a fresh serve.py is started, warmed up, and hammered
+with C concurrent /predict uploads of IMAGE for S seconds. The prediction
+cache is disabled so every request reaches the model.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_until_ready(base_url, process, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("serve.py exited during start-up")
+        try:
+            if requests.get(f"{base_url}/model_info", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1.0)
+    raise TimeoutError("serve.py did not become ready")
+
+
+def run_load(base_url, image_bytes, concurrency, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/predict", files={'file': ('xray.jpg', image_bytes)}, timeout=60)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - started
+    latencies = np.array(latencies) * 1000.0
+    return {
+        'requests_per_sec': len(latencies) / wall,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else float('nan'),
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else float('nan'),
+        'errors': errors[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tf-threads", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+    env = dict(os.environ, PREDICTION_CACHE_MAX_ENTRIES="0")
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = []
+    for workers in range(1, args.max_workers + 1):
+        print(f"\n🚀 Starting serve.py with {workers} worker(s)...")
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "serve.py"), "--workers", str(workers),
+             "--tf-threads", str(args.tf_threads), "--port", str(args.port), "--host", "127.0.0.1"],
+            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_ready(base_url, process)
+            run_load(base_url, image_bytes, args.concurrency, min(3.0, args.duration))  # warm up
+            result = run_load(base_url, image_bytes, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+        result['workers'] = workers
+        results.append(result)
+        print(f"   {result['requests_per_sec']:.1f} req/s  p50 {result['p50_ms']:.1f} ms  "
+              f"p99 {result['p99_ms']:.1f} ms  errors {result['errors']}")
+
+    baseline = results[0]['requests_per_sec'] or float('nan')
+    print(f"\n{'workers':>8} {'req/s':>8} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['requests_per_sec']:8.1f} {r['requests_per_sec'] / baseline:7.2f}x "
+              f"{r['p50_ms']:8.1f} {r['p99_ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Per-epoch wall time and accuracy of the CNN under each training mode.
+
+Usage:
+    python bench_training_modes.py [--data-dir DIR] [--epochs E] [--modes fp32 xla bf16 xla+bf16]
+
+Each mode trains the becterial_pheumonia.py model from the same seed for E
+epochs in its own subprocess (the precision policy is process-wide). The
+first epoch includes tracing and XLA compilation, so the steady-state
+column averages the remaining epochs.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+
+MODES = {
+    "fp32": {"jit_compile": False, "mixed_precision": False},
+    "xla": {"jit_compile": True, "mixed_precision": False},
+    "bf16": {"jit_compile": False, "mixed_precision": True},
+    "xla+bf16": {"jit_compile": True, "mixed_precision": True},
+}
+
+
+def run_mode(mode, data_dir, epochs):
+    import tensorflow as tf
+
+    from input_pipeline import load_split
+    from training_utils import EpochTimer, build_model, compile_model, configure_precision
+
+    settings = MODES[mode]
+    tf.keras.utils.set_random_seed(123)
+    configure_precision(settings["mixed_precision"])
+    train = load_split(os.path.join(data_dir, "train"), training=True)
+    val = load_split(os.path.join(data_dir, "val"))
+    test = load_split(os.path.join(data_dir, "test"))
+    model = compile_model(build_model(len(train.class_names)), jit_compile=settings["jit_compile"])
+    timer = EpochTimer()
+    history = model.fit(train, validation_data=val, epochs=epochs, callbacks=[timer], verbose=0)
+    _, test_accuracy = model.evaluate(test, verbose=0)
+    return {
+        "mode": mode,
+        "epoch_seconds": timer.epoch_seconds,
+        "val_accuracy": float(history.history["val_accuracy"][-1]),
+        "test_accuracy": float(test_accuracy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=base_path)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--run-mode", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print("RESULT " + json.dumps(run_mode(args.run_mode, args.data_dir, args.epochs)))
+        return
+
+    results = []
+    for mode in args.modes:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-mode", mode,
+             "--data-dir", args.data_dir, "--epochs", str(args.epochs)],
+            capture_output=True, text=True
+        )
+        lines = [line for line in out.stdout.splitlines() if line.startswith("RESULT ")]
+        if out.returncode != 0 or not lines:
+            print(f"❌ {mode} failed:\n{out.stderr[-2000:]}")
+            continue
+        results.append(json.loads(lines[-1][len("RESULT "):]))
+
+    if not results:
+        return
+    baseline = None
+    print(f"\n{'mode':<10} {'first s':>8} {'epoch s':>8} {'speedup':>8} {'val acc':>8} {'test acc':>9}")
+    for result in results:
+        seconds = result["epoch_seconds"]
+        steady = seconds[1:] or seconds
+        epoch = sum(steady) / len(steady)
+        baseline = baseline or epoch
+        print(f"{result['mode']:<10} {seconds[0]:8.2f} {epoch:8.2f} {baseline / epoch:7.2f}x "
+              f"{result['val_accuracy'] * 100:7.2f}% {result['test_accuracy'] * 100:8.2f}%")
+
+
+if __name__ == "__main__":
+    main()
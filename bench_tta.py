@@ -0,0 +1,52 @@
+"""Latency of test-time augmentation as a function of the number of views K.
+
+Usage:
+    python bench_tta.py IMAGE [--model PATH] [--views 1 2 4 8 16 32] [--repeat R]
+
+Each K runs augment_views plus one batched forward pass; the table shows how
+far the cost is from K single-view predictions (linear scaling).
+"""
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+
+from fast_preprocess import decode_into, to_model_input
+from inference_backends import INFERENCE_BACKEND, load_backend
+from tta import predict_with_tta
+
+model_file = os.path.join(r"E:\chest_xray\Lung Disease Dataset", "trained_model", "lung_disease_model1.h5")
+
+
+def time_call(fn, repeat):
+    fn()  # warm up (tracing / tensor allocation for this batch size)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image")
+    parser.add_argument("--model", default=model_file)
+    parser.add_argument("--views", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    backend = load_backend(INFERENCE_BACKEND, args.model)
+    with open(args.image, "rb") as f:
+        image = decode_into(io.BytesIO(f.read()), np.empty((150, 150, 3), dtype=np.uint8))
+
+    single = time_call(lambda: backend.predict_on_batch(to_model_input(image[None])), args.repeat)
+    print(f"Single-view /predict forward pass: {single:.2f} ms ({backend.name})\n")
+    print(f"{'K':>4} {'ms':>9} {'x single':>9} {'linear ms':>10} {'ms/view':>8}")
+    for k in args.views:
+        ms = time_call(lambda: predict_with_tta(backend, image, k), args.repeat)
+        print(f"{k:>4} {ms:9.2f} {ms / single:8.2f}x {single * k:10.2f} {ms / k:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Helpers shared by the bench_*.py scripts."""
+import sys
+
+
+def peak_rss_mb(who="self"):
+    """Peak RSS in MB of this process or of its largest finished child; None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: no resource module. psutil (optional) reports this process's
+        # peak working set; the peak of exited children is not recorded
+        try:
+            import psutil
+        except ImportError:
+            return None
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None) if who == "self" else None
+        return peak / (1024 * 1024) if peak is not None else None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_mb(value):
+    return f"{value:7.1f} MB" if value is not None else "    n/a"
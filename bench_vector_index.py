@@ -0,0 +1,118 @@
+"""Recall and latency of the vector index types (vector_store.py) on the store's own chunks.
+
+Usage:
+    python bench_vector_index.py [--store-dir DIR] [--types flat ivf hnsw pq] [--k 4]
+                                 [--num-queries 200 | --query-file questions.txt]
+                                 [--nprobe 1 4 8 16] [--ef-search 16 32 64 128]
+
+Each type is built (and trained) from the current store's chunk vectors,
+which come from the embedding cache. Queries are either questions from a
+file, one per line, or chunks held out of every index. For each type and
+search parameter it reports recall@k against exact (flat) search, p50/p99
+latency of single-query searches (how /llmanswers searches), build time
+and the serialized index size, which is what the index holds in memory.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from vector_store import (
+    INDEX_TYPES, STORE_DIR, VectorStore, apply_search_params, build_index, index_config, search_params
+)
+
+WARMUP_QUERIES = 10
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def time_queries(index, queries, k):
+    """(ids (n, k), per-query latencies in ms) for single-query searches."""
+    for query in queries[:WARMUP_QUERIES]:
+        index.search(query[None], k)
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        ids[i] = index.search(query[None], k)[1][0]
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--num-queries", type=int, default=200, help="chunks held out as queries")
+    parser.add_argument("--query-file", default=None, help="questions to search for, one per line")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    store = VectorStore.load(args.store_dir)
+    texts = [store.chunks.text(row) for row in range(len(store.chunks))]
+    vectors = np.asarray(store.embeddings.embed_documents(texts), dtype=np.float32)
+    ids = np.asarray(store.chunks.ids, dtype=np.int64)
+    if args.query_file:
+        with open(args.query_file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = np.asarray([store.embeddings.embed_query(q) for q in questions], dtype=np.float32)
+        base, base_ids = vectors, ids
+    else:
+        held_out = np.random.default_rng(0).permutation(len(vectors))[:min(args.num_queries, len(vectors) // 5)]
+        keep = np.ones(len(vectors), dtype=bool)
+        keep[held_out] = False
+        queries, base, base_ids = vectors[held_out], vectors[keep], ids[keep]
+    if not len(queries):
+        raise SystemExit("❌ No queries: the store is too small to hold chunks out, pass --query-file")
+    metric = store.manifest["metric"]
+    print(f"📊 {len(base)} chunks x {base.shape[1]} dims, {len(queries)} queries, k={args.k}, {metric} metric")
+
+    exact = faiss.IndexFlat(base.shape[1], faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT)
+    exact.add(base)
+    truth = base_ids[exact.search(queries, args.k)[1]]
+
+    results = []
+    for index_type in args.types:
+        start = time.perf_counter()
+        index, info = build_index(base, base_ids, metric, index_config(index_type))
+        build_seconds = time.perf_counter() - start
+        size = len(faiss.serialize_index(index))
+        sweep = {"ivf": "nprobe", "pq": "nprobe", "hnsw": "efSearch"}.get(info["type"])
+        values = {"nprobe": args.nprobe, "efSearch": args.ef_search}.get(sweep, [None])
+        for value in values:
+            params = search_params(info, {sweep: value} if sweep else None)
+            apply_search_params(index, params)
+            found, latencies = time_queries(index, queries, args.k)
+            results.append({
+                'type': index_type,
+                'built_as': info["type"],
+                'params': params,
+                f'recall@{args.k}': recall_at_k(found, truth),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+                'build_seconds': build_seconds,
+                'index_mb': size / 1e6,
+                'bytes_per_vector': size / len(base),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        name = r['type'] if r['built_as'] == r['type'] else f"{r['type']}->{r['built_as']}"
+        params = " ".join(f"{k}={v}" for k, v in r['params'].items()) or "exact"
+        print(f"{name:>10} {params:>12}: recall@{args.k} {r[f'recall@{args.k}']:.3f}  "
+              f"p50 {r['p50_ms']:7.3f} ms  p99 {r['p99_ms']:7.3f} ms  build {r['build_seconds']:6.2f}s  "
+              f"{r['index_mb']:8.2f} MB ({r['bytes_per_vector']:.0f} B/vector)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Pre-resized uint8 dataset shards for repeated training runs.
+
+Usage:
+    python dataset_shards.py [--data-dir DIR] [--out-dir DIR] [--splits train val test]
+                             [--shard-size N] [--rebuild]
+
+Layout of one split (``<out-dir>/<split>/``)::
+
+    manifest.json       # class names, image size, shard list, one entry per file
+    shard-00000.npy     # uint8 (N, 150, 150, 3), pixels as input_pipeline decodes them
+    shard-00001.npy
+
+Shards are immutable. A rerun only stats the source files; new or changed
+files (size/mtime moved and the SHA-256 differs) are decoded into new
+shards, deleted files are dropped from the manifest. Once more than
+COMPACT_DEAD_FRACTION of the stored rows are dead, the live rows are copied
+(not re-decoded) into fresh shards. A changed class list or image size
+triggers a full rebuild.
+
+``ShardedSplit`` memory-maps the shards, so opening a split costs one JSON
+read and batches come straight from the page cache without decoding.
+Training reads them with INPUT_SHARDS=1 (see input_pipeline.py).
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from eval_cache import file_sha256
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+shards_path = os.path.join(base_path, "shards")
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png")
+# Images per shard file (1024 x 150x150x3 uint8 = 66 MiB)
+SHARD_SIZE = int(os.environ.get("DATASET_SHARD_SIZE", 1024))
+COMPACT_DEAD_FRACTION = 0.25
+
+
+def _read_manifest(split_dir):
+    path = os.path.join(split_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _write_manifest(split_dir, manifest):
+    # Written last and renamed into place: readers never see a manifest
+    # that points at a shard which is not complete yet
+    path = os.path.join(split_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _scan_source(source_dir):
+    class_names = sorted(
+        d for d in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, d))
+    )
+    files = {}
+    for label, class_name in enumerate(class_names):
+        for root, _, names in sorted(os.walk(os.path.join(source_dir, class_name))):
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    rel = os.path.relpath(path, source_dir).replace(os.sep, "/")
+                    files[rel] = (path, label)
+    return class_names, files
+
+
+def _next_shard_name(manifest):
+    used = [int(s["file"][len("shard-"):-len(".npy")]) for s in manifest["shards"]]
+    return f"shard-{(max(used) + 1) if used else 0:05d}.npy"
+
+
+def _write_shard(split_dir, manifest, rows):
+    """Write an iterable of (rel, entry, image) into one new shard, return its name."""
+    rows = list(rows)
+    name = _next_shard_name(manifest)
+    height, width = manifest["image_size"]
+    tmp_path = os.path.join(split_dir, name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(len(rows), height, width, 3))
+    for row, (rel, entry, image) in enumerate(rows):
+        out[row] = image
+        entry.update(shard=name, row=row)
+        manifest["files"][rel] = entry
+    out.flush()
+    del out
+    os.replace(tmp_path, os.path.join(split_dir, name))
+    manifest["shards"].append({"file": name, "count": len(rows)})
+    return name
+
+
+def _decode_files(paths, image_size):
+    # Same decode/resize as input_pipeline.build_dataset, so shard-trained
+    # and directory-trained models see identical pixels
+    import tensorflow as tf
+    from input_pipeline import _decode_and_resize
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, np.zeros(len(paths), dtype=np.int32)))
+    dataset = dataset.map(lambda path, label: _decode_and_resize(path, label, tuple(image_size)),
+                          num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+    for image, _ in dataset.prefetch(tf.data.AUTOTUNE):
+        yield image.numpy()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _compact(split_dir, manifest, shard_size):
+    old_shards = {s["file"]: np.load(os.path.join(split_dir, s["file"]), mmap_mode="r")
+                  for s in manifest["shards"]}
+    live = sorted(manifest["files"].items(), key=lambda item: item[0])
+    compacted = dict(manifest, shards=[], files={})
+    # Continue numbering after the old shards so no file is overwritten in place
+    compacted["shards"] = [{"file": s["file"], "count": 0} for s in manifest["shards"]]
+    for chunk in _chunks(live, shard_size):
+        _write_shard(split_dir, compacted, (
+            (rel, dict(entry), old_shards[entry["shard"]][entry["row"]]) for rel, entry in chunk
+        ))
+    compacted["shards"] = [s for s in compacted["shards"] if s["count"]]
+    _write_manifest(split_dir, compacted)
+    old_shards.clear()
+    for s in manifest["shards"]:
+        os.remove(os.path.join(split_dir, s["file"]))
+    return compacted
+
+
+def update_split(source_dir, split_dir, image_size=(150, 150), shard_size=SHARD_SIZE, rebuild=False):
+    """Bring ``split_dir`` in line with ``source_dir``; returns a summary dict."""
+    start = time.perf_counter()
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"❌ Directory not found: {source_dir}")
+    os.makedirs(split_dir, exist_ok=True)
+    class_names, source_files = _scan_source(source_dir)
+    manifest = None if rebuild else _read_manifest(split_dir)
+    if manifest is not None and (manifest["class_names"] != class_names
+                                 or manifest["image_size"] != list(image_size)):
+        print(f"⚠️ Class list or image size changed in {source_dir}, rebuilding shards")
+        manifest = None
+    stale_shards = []
+    # Only write when something changed, so concurrent readers of an
+    # up-to-date split (parallel sweep trials) never touch the manifest
+    dirty = manifest is None
+    if manifest is None:
+        previous = _read_manifest(split_dir)
+        stale_shards = [s["file"] for s in previous["shards"]] if previous else []
+        manifest = {"version": MANIFEST_VERSION, "class_names": class_names,
+                    "image_size": list(image_size), "shards": [{"file": f, "count": 0} for f in stale_shards],
+                    "files": {}}
+
+    removed = [rel for rel in manifest["files"] if rel not in source_files]
+    for rel in removed:
+        del manifest["files"][rel]
+    dirty = dirty or bool(removed)
+
+    pending = []
+    changed = 0
+    for rel, (path, label) in source_files.items():
+        stat = os.stat(path)
+        entry = manifest["files"].get(rel)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue
+        sha256 = file_sha256(path)
+        if entry is not None and entry["sha256"] == sha256:
+            # Touched but identical: keep the stored pixels
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            dirty = True
+            continue
+        if entry is not None:
+            changed += 1
+            del manifest["files"][rel]
+        pending.append((rel, path, {"sha256": sha256, "size": stat.st_size,
+                                    "mtime_ns": stat.st_mtime_ns, "label": label}))
+
+    if pending:
+        images = _decode_files([path for _, path, _ in pending], image_size)
+        for chunk in _chunks(pending, shard_size):
+            _write_shard(split_dir, manifest, ((rel, entry, next(images)) for rel, _, entry in chunk))
+    manifest["shards"] = [s for s in manifest["shards"] if s["file"] not in stale_shards]
+    if dirty or pending:
+        _write_manifest(split_dir, manifest)
+    for name in stale_shards:
+        os.remove(os.path.join(split_dir, name))
+
+    stored = sum(s["count"] for s in manifest["shards"])
+    compacted = False
+    if stored and (stored - len(manifest["files"])) / stored > COMPACT_DEAD_FRACTION:
+        manifest = _compact(split_dir, manifest, shard_size)
+        compacted = True
+    return {
+        "split_dir": split_dir,
+        "images": len(manifest["files"]),
+        "added": len(pending) - changed,
+        "changed": changed,
+        "removed": len(removed),
+        "compacted": compacted,
+        "shards": len(manifest["shards"]),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class ShardedSplit:
+    """Read-only view of one prepared split, backed by memory-mapped shards.
+
+    ``exclude`` hides files (relative paths as in the manifest) without rewriting shards.
+    """
+
+    def __init__(self, split_dir, exclude=()):
+        manifest = _read_manifest(split_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"❌ No dataset shards in {split_dir}, run dataset_shards.py first")
+        self.split_dir = split_dir
+        self.class_names = manifest["class_names"]
+        self.image_size = tuple(manifest["image_size"])
+        self._shards = [np.load(os.path.join(split_dir, s["file"]), mmap_mode="r") for s in manifest["shards"]]
+        shard_index = {s["file"]: i for i, s in enumerate(manifest["shards"])}
+        exclude = set(exclude)
+        kept = [(rel, entry) for rel, entry in manifest["files"].items() if rel not in exclude]
+        # Ordered by storage position so sequential batches are contiguous slices
+        entries = sorted(kept, key=lambda item: (shard_index[item[1]["shard"]], item[1]["row"]))
+        self.file_paths = [rel for rel, _ in entries]
+        self.labels = np.array([entry["label"] for _, entry in entries], dtype=np.int32)
+        self._shard_ids = np.array([shard_index[entry["shard"]] for _, entry in entries], dtype=np.int64)
+        self._rows = np.array([entry["row"] for _, entry in entries], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def take(self, indices, out=None):
+        """uint8 images for ``indices``; a view into the shard when they are contiguous rows."""
+        indices = np.asarray(indices)
+        shard_ids = self._shard_ids[indices]
+        rows = self._rows[indices]
+        if len(indices) and shard_ids[0] == shard_ids[-1] and np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            return self._shards[shard_ids[0]][rows[0]:rows[0] + len(rows)]
+        if out is None:
+            out = np.empty((len(indices),) + self.image_size + (3,), dtype=np.uint8)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self._shards[shard_id][rows[mask]]
+        return out
+
+    def batches(self, batch_size, shuffle=False, seed=None, num_shards=1, shard_index=0):
+        """Yield (uint8 images, int32 labels) batches, optionally shuffled and sharded."""
+        order = np.arange(len(self))[shard_index::num_shards]
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(order)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            if shuffle:
+                # Reading each batch in storage order keeps memory-map access sequential
+                indices = np.sort(indices)
+            yield self.take(indices), self.labels[indices]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare pre-resized uint8 dataset shards.")
+    parser.add_argument("--data-dir", default=base_path)
+    parser.add_argument("--out-dir", default=shards_path)
+    parser.add_argument("--splits", nargs="+", default=["train", "val", "test"])
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="ignore existing shards and start over")
+    args = parser.parse_args()
+
+    for split in args.splits:
+        summary = update_split(os.path.join(args.data_dir, split), os.path.join(args.out_dir, split),
+                               shard_size=args.shard_size, rebuild=args.rebuild)
+        print(f"✅ {split}: {summary['images']} images in {summary['shards']} shards "
+              f"(+{summary['added']} added, {summary['changed']} changed, {summary['removed']} removed"
+              f"{', compacted' if summary['compacted'] else ''}) in {summary['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
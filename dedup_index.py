@@ -0,0 +1,359 @@
+"""Perceptual-hash index for near-duplicate and cross-split leakage detection.
+
+Usage:
+    python dedup_index.py [--data-dir DIR] [--splits train val test] [--threshold 8]
+                          [--workers N] [--manifest PATH]
+
+Every image gets a 64-bit DCT perceptual hash (32x32 grayscale, top-left
+8x8 coefficients against their median), computed in a process pool with
+the DCT vectorized over whole chunks. Hashes live in a compact array index
+(``<data-dir>/dedup_index.npz``: one uint64 per image plus split, class,
+size and mtime); reruns only hash new or changed files.
+
+Near-duplicate pairs (Hamming distance <= threshold) are found by
+multi-index hashing: the hash is cut into 4 substrings of 16 bits, and two
+hashes within distance r must agree on at least one substring up to
+r // 4 bit flips (pigeonhole). Each (substring, flip mask) probe is one
+sorted search over all images, so the search never compares all pairs.
+
+The report (``dedup_report.json``) lists duplicate groups, cross-split
+leakage per split and duplicates whose class labels disagree.
+``--manifest`` writes the files to drop for a deduplicated training set: train images
+that also appear in val/test, and all but one copy within a split.
+Training reads it through INPUT_DEDUP_MANIFEST (see input_pipeline.py), which
+applies it to the train split only; val/test keep every file unless
+INPUT_DEDUP_ALL_SPLITS=1.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+
+INDEX_FILE = "dedup_index.npz"
+REPORT_FILE = "dedup_report.json"
+HASH_SIZE = 8            # 8x8 low-frequency DCT block -> 64-bit hash
+DCT_SIZE = 32
+NUM_SUBSTRINGS = 4       # multi-index hashing: 4 x 16-bit substrings
+DEFAULT_THRESHOLD = 8
+HASH_CHUNK = 256         # images per worker task
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def phash_images(pixels):
+    """uint64 perceptual hashes of a float32 (N, 32, 32) grayscale stack."""
+    coeffs = np.einsum("ij,njk,lk->nil", _DCT, pixels, _DCT)[:, :HASH_SIZE, :HASH_SIZE]
+    coeffs = coeffs.reshape(len(pixels), -1)
+    # The DC term only tracks overall brightness, so it stays out of the median
+    median = np.median(coeffs[:, 1:], axis=1, keepdims=True)
+    bits = coeffs > median
+    return np.packbits(bits, axis=1, bitorder="little").view("<u8").ravel()
+
+
+def _load_gray(path):
+    img = Image.open(path)
+    if img.format == "JPEG":
+        # Large scans decode at reduced size in the JPEG DCT domain; keeping at
+        # least 8x the hash input leaves hashes of re-encoded copies unchanged
+        img.draft("L", (DCT_SIZE * 8, DCT_SIZE * 8))
+    # Box filtering averages every source pixel, which is steadier under re-encoding than bilinear
+    img = img.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.BOX)
+    return np.asarray(img, dtype=np.float32)
+
+
+def hash_files(paths):
+    """(hashes, ok) for a chunk of files; unreadable images get ok=False."""
+    pixels = np.zeros((len(paths), DCT_SIZE, DCT_SIZE), dtype=np.float32)
+    ok = np.ones(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        try:
+            pixels[i] = _load_gray(path)
+        except Exception:
+            ok[i] = False
+    return phash_images(pixels), ok
+
+
+def popcount64(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+    return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+# ------------------ ✅ Index ------------------ #
+def build_index(data_dir, splits, workers=None):
+    """Hash every image under ``data_dir/<split>``; unchanged files reuse the previous index."""
+    # Imported here so spawned hash workers do not load TensorFlow
+    from input_pipeline import list_image_files
+
+    index_path = os.path.join(data_dir, INDEX_FILE)
+    previous = {}
+    if os.path.exists(index_path):
+        with np.load(index_path) as old:
+            for path, h, size, mtime in zip(old["paths"], old["hashes"], old["sizes"], old["mtimes"]):
+                previous[str(path)] = (h, int(size), int(mtime))
+
+    class_names = []
+    rel_paths, split_ids, label_ids, sizes, mtimes = [], [], [], [], []
+    for split_id, split in enumerate(splits):
+        split_dir = os.path.join(data_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"⚠️ Skipping missing split: {split_dir}")
+            continue
+        paths, labels, split_classes = list_image_files(split_dir)
+        for path, label in zip(paths, labels):
+            name = split_classes[label]
+            if name not in class_names:
+                class_names.append(name)
+            stat = os.stat(path)
+            rel_paths.append(os.path.relpath(path, data_dir).replace(os.sep, "/"))
+            split_ids.append(split_id)
+            label_ids.append(class_names.index(name))
+            sizes.append(stat.st_size)
+            mtimes.append(stat.st_mtime_ns)
+
+    hashes = np.zeros(len(rel_paths), dtype=np.uint64)
+    valid = np.ones(len(rel_paths), dtype=bool)
+    todo = []
+    for i, rel in enumerate(rel_paths):
+        cached = previous.get(rel)
+        if cached is not None and cached[1] == sizes[i] and cached[2] == mtimes[i]:
+            hashes[i] = cached[0]
+        else:
+            todo.append(i)
+
+    start = time.perf_counter()
+    if todo:
+        chunks = [todo[s:s + HASH_CHUNK] for s in range(0, len(todo), HASH_CHUNK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(hash_files, [[os.path.join(data_dir, rel_paths[i]) for i in chunk] for chunk in chunks])
+            for chunk, (chunk_hashes, ok) in zip(chunks, results):
+                hashes[chunk] = chunk_hashes
+                valid[chunk] = ok
+    print(f"✅ Hashed {len(todo)} new or changed images ({len(rel_paths) - len(todo)} reused) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    index = {
+        "hashes": hashes[valid],
+        "paths": np.array(rel_paths)[valid] if rel_paths else np.array([], dtype=str),
+        "split_ids": np.array(split_ids, dtype=np.uint8)[valid],
+        "label_ids": np.array(label_ids, dtype=np.int16)[valid],
+        "sizes": np.array(sizes, dtype=np.int64)[valid],
+        "mtimes": np.array(mtimes, dtype=np.int64)[valid],
+        "splits": np.array(list(splits)),
+        "class_names": np.array(class_names),
+    }
+    tmp_path = index_path + ".tmp.npz"
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, index_path)
+    unreadable = [rel for rel, ok in zip(rel_paths, valid) if not ok]
+    return index, unreadable
+
+
+# ------------------ ✅ Near-duplicate search ------------------ #
+def _flip_masks(bits, radius):
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            masks.append(sum(1 << p for p in positions))
+    return np.array(masks, dtype=np.uint64)
+
+
+def near_duplicate_pairs(hashes, threshold=DEFAULT_THRESHOLD):
+    """(i, j, distance) arrays for every pair i < j with Hamming distance <= threshold."""
+    n = len(hashes)
+    empty = np.array([], dtype=np.int64)
+    if n < 2:
+        return empty, empty, empty
+    bits = 64 // NUM_SUBSTRINGS
+    masks = _flip_masks(bits, threshold // NUM_SUBSTRINGS)
+    found = []
+    for s in range(NUM_SUBSTRINGS):
+        keys = ((hashes >> np.uint64(s * bits)) & np.uint64((1 << bits) - 1)).astype(np.int64)
+        # Bucket table over all 2^16 substring values: members of bucket k are
+        # order[starts[k]:starts[k] + counts[k]], so a probe is two array lookups
+        order = np.argsort(keys, kind="stable")
+        counts = np.bincount(keys, minlength=1 << bits)
+        starts = np.cumsum(counts) - counts
+        for mask in masks.astype(np.int64):
+            probe = keys ^ mask
+            probe_counts = counts[probe]
+            total = int(probe_counts.sum())
+            if not total:
+                continue
+            # Expand every query's bucket into explicit (query, match) pairs
+            queries = np.repeat(np.arange(n), probe_counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(probe_counts) - probe_counts, probe_counts)
+            matches = order[np.repeat(starts[probe], probe_counts) + offsets]
+            keep = queries < matches
+            queries, matches = queries[keep], matches[keep]
+            # Verify right away so only true near-duplicates are kept across probes
+            distance = popcount64(hashes[queries] ^ hashes[matches])
+            close = distance <= threshold
+            found.append(queries[close] * n + matches[close])
+    if not found:
+        return empty, empty, empty
+    # A pair agreeing on several substrings is found once per substring
+    pair_ids = np.unique(np.concatenate(found))
+    first, second = pair_ids // n, pair_ids % n
+    return first, second, popcount64(hashes[first] ^ hashes[second])
+
+
+def duplicate_groups(n, first, second):
+    """Connected components of the near-duplicate graph (union-find), groups of size >= 2."""
+    parent = np.arange(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    roots = np.array([find(i) for i in range(n)])
+    groups = {}
+    for i, root in enumerate(roots.tolist()):
+        groups.setdefault(root, []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+# ------------------ ✅ Report and manifest ------------------ #
+def leakage_report(index, first, second, distance, groups, threshold):
+    splits = [str(s) for s in index["splits"]]
+    class_names = [str(c) for c in index["class_names"]]
+    paths = index["paths"]
+    split_ids = index["split_ids"]
+    label_ids = index["label_ids"]
+
+    cross = split_ids[first] != split_ids[second]
+    per_split = {}
+    for split_id, split in enumerate(splits):
+        members = split_ids == split_id
+        if not members.any():
+            continue
+        entry = {"images": int(members.sum())}
+        for other_id, other in enumerate(splits):
+            if other_id == split_id:
+                continue
+            # Images of this split with at least one near-duplicate in the other split
+            hit = np.zeros(len(paths), dtype=bool)
+            a_side = (split_ids[first] == split_id) & (split_ids[second] == other_id)
+            b_side = (split_ids[second] == split_id) & (split_ids[first] == other_id)
+            hit[first[a_side]] = True
+            hit[second[b_side]] = True
+            count = int(hit.sum())
+            entry[f"with_duplicate_in_{other}"] = count
+            entry[f"leaked_fraction_vs_{other}"] = count / entry["images"]
+        per_split[split] = entry
+
+    conflicts = label_ids[first] != label_ids[second]
+    return {
+        "images": int(len(paths)),
+        "threshold": threshold,
+        "near_duplicate_pairs": int(len(first)),
+        "cross_split_pairs": int(cross.sum()),
+        "label_conflict_pairs": int(conflicts.sum()),
+        "splits": per_split,
+        "cross_split_examples": [
+            {"a": str(paths[a]), "b": str(paths[b]), "distance": int(d)}
+            for a, b, d in zip(first[cross][:200], second[cross][:200], distance[cross][:200])
+        ],
+        "label_conflicts": [
+            {"a": str(paths[a]), "a_class": class_names[label_ids[a]],
+             "b": str(paths[b]), "b_class": class_names[label_ids[b]], "distance": int(d)}
+            for a, b, d in zip(first[conflicts][:200], second[conflicts][:200], distance[conflicts][:200])
+        ],
+        "groups": [[str(paths[i]) for i in group] for group in groups[:500]],
+        "num_groups": len(groups),
+    }
+
+
+def dedup_manifest(index, groups, train_split="train"):
+    """Files to drop per split: train copies of val/test images, then extra copies within a split."""
+    splits = [str(s) for s in index["splits"]]
+    paths = [str(p) for p in index["paths"]]
+    split_ids = index["split_ids"]
+    train_id = splits.index(train_split) if train_split in splits else None
+    drop = {split: {} for split in splits}
+    for group in groups:
+        held_out = [i for i in group if split_ids[i] != train_id]
+        for split_id in sorted({int(split_ids[i]) for i in group}):
+            members = sorted((i for i in group if split_ids[i] == split_id), key=lambda i: paths[i])
+            split = splits[split_id]
+            if split_id == train_id and held_out:
+                # Training on a copy of an evaluation image inflates the reported accuracy
+                for i in members:
+                    drop[split][paths[i].split("/", 1)[1]] = f"duplicate of {paths[held_out[0]]}"
+            else:
+                for i in members[1:]:
+                    drop[split][paths[i].split("/", 1)[1]] = f"duplicate of {paths[members[0]]}"
+    return {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "drop": {split: dict(sorted(files.items())) for split, files in drop.items() if files},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual-hash near-duplicate and leakage index.")
+    parser.add_argument("--data-dir", default=base_path)
+    parser.add_argument("--splits", nargs="+", default=["train", "val", "test"])
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="max Hamming distance (of 64 bits) counted as a near-duplicate")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--manifest", default=None, help="write a dedup manifest for training to this path")
+    args = parser.parse_args()
+    if not 0 <= args.threshold < 4 * NUM_SUBSTRINGS:
+        parser.error(f"--threshold must be in [0, {4 * NUM_SUBSTRINGS - 1}]")
+
+    index, unreadable = build_index(args.data_dir, args.splits, args.workers)
+    start = time.perf_counter()
+    first, second, distance = near_duplicate_pairs(index["hashes"], args.threshold)
+    groups = duplicate_groups(len(index["hashes"]), first, second)
+    print(f"✅ Found {len(first)} near-duplicate pairs in {len(groups)} groups "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    report = leakage_report(index, first, second, distance, groups, args.threshold)
+    report["unreadable"] = unreadable
+    report_path = os.path.join(args.data_dir, REPORT_FILE)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for split, entry in report["splits"].items():
+        leaks = ", ".join(f"{k[len('with_duplicate_in_'):]}: {v}" for k, v in entry.items()
+                          if k.startswith("with_duplicate_in_"))
+        print(f"   {split}: {entry['images']} images, with a near-duplicate in {leaks or '-'}")
+    if report["label_conflict_pairs"]:
+        print(f"⚠️ {report['label_conflict_pairs']} near-duplicate pairs have different class labels")
+    print(f"📄 Report written to {report_path}")
+
+    if args.manifest:
+        manifest = dedup_manifest(index, groups)
+        with open(args.manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        dropped = {split: len(files) for split, files in manifest["drop"].items()}
+        print(f"📄 Dedup manifest written to {args.manifest} (drops {dropped or 'nothing'}); "
+              f"train with INPUT_DEDUP_MANIFEST={args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
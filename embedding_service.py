@@ -0,0 +1,167 @@
+"""Batched chunk embeddings with a persistent float16 cache.
+
+Usage:
+    python embedding_service.py [--cache PATH]      # cache statistics per model
+
+``EmbeddingService`` is a LangChain ``Embeddings`` that the RAG scripts get
+from ``vector_store.load_embeddings``. ``embed_documents`` normalizes every
+text (Unicode NFC, runs of whitespace collapsed), drops duplicates, and looks
+the rest up in a SQLite cache keyed by (model id, SHA-256 of the normalized
+text). Only misses are embedded, in blocks of ``EMBED_BATCH_SIZE`` on
+``EMBED_THREADS`` threads, and every block is committed before the next one,
+so an interrupted build keeps what it already paid for.
+
+Vectors are stored as float16 (768 bytes for MiniLM's 384 dimensions).
+Fresh vectors go through the same float16 rounding before they are
+returned, so a text gets the same vector whether it was cached or not.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# ------------------ ✅ Paths ------------------ #
+FOLDER_PATH = r"E:\chest_xray\03. LLM medical diagnosis report generation Eric Topol"
+
+# Settings (override through environment variables)
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", os.cpu_count() or 1))
+# Empty disables the on-disk cache
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", os.path.join(FOLDER_PATH, "embedding_cache.sqlite"))
+# Misses embedded (and committed) per block
+BLOCK_BATCHES = 16
+LOOKUP_CHUNK = 500
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def connect(cache_path):
+    conn = sqlite3.connect(cache_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text_hash BLOB NOT NULL,        -- SHA-256 of the normalized text
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,           -- float16, little-endian
+            PRIMARY KEY (model, text_hash)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+
+class EmbeddingService(Embeddings):
+    """Sentence-transformer embeddings, batched and cached per (model, normalized text)."""
+
+    def __init__(self, model_name, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS,
+                 cache_path=EMBED_CACHE_PATH, base=None):
+        self.model_name = model_name
+        self.batch_size = int(batch_size)
+        self.threads = int(threads)
+        self.cache_path = cache_path or None
+        self._base = base
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+
+    @property
+    def base(self):
+        # The model is loaded on first use: a fully cached rebuild never loads it
+        with self._lock:
+            if self._base is None:
+                try:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                except ImportError:
+                    pass
+                from langchain.embeddings import HuggingFaceEmbeddings
+
+                self._base = HuggingFaceEmbeddings(model_name=self.model_name,
+                                                   encode_kwargs={"batch_size": self.batch_size})
+            return self._base
+
+    def _lookup(self, conn, keys):
+        found = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN "
+                f"({','.join('?' * len(chunk))})", [self.model_name] + chunk
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype="<f2")
+        return found
+
+    def embed_documents(self, texts):
+        normalized = [normalize_text(text) for text in texts]
+        keys = [text_key(text) for text in normalized]
+        unique = dict(zip(keys, normalized))
+        conn = connect(self.cache_path) if self.cache_path else None
+        try:
+            vectors = self._lookup(conn, list(unique)) if conn else {}
+            missing = [key for key in unique if key not in vectors]
+            block = self.batch_size * BLOCK_BATCHES
+            for start in range(0, len(missing), block):
+                block_keys = missing[start:start + block]
+                computed = np.asarray(self.base.embed_documents([unique[k] for k in block_keys]), dtype=np.float32)
+                computed = computed.astype("<f2")
+                if conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                        [(self.model_name, key, computed.shape[1], vector.tobytes())
+                         for key, vector in zip(block_keys, computed)]
+                    )
+                    conn.execute("COMMIT")
+                vectors.update(zip(block_keys, computed))
+        finally:
+            if conn:
+                conn.close()
+        with self._lock:
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+            self.duplicates += len(texts) - len(unique)
+        return [vectors[key].astype(np.float32).tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.base.embed_query(normalize_text(text))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'duplicates': self.duplicates,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding cache statistics.")
+    parser.add_argument("--cache", default=EMBED_CACHE_PATH)
+    args = parser.parse_args()
+    if not os.path.exists(args.cache):
+        raise SystemExit(f"❌ No embedding cache at {args.cache}")
+    conn = connect(args.cache)
+    rows = conn.execute("SELECT model, dim, COUNT(*), SUM(LENGTH(vector)) FROM embeddings GROUP BY model, dim")
+    for model, dim, count, size in rows:
+        print(f"📄 {model}: {count} vectors x {dim} dims, {size / 1e6:.1f} MB of float16")
+    print(f"💾 {args.cache}: {os.path.getsize(args.cache) / 1e6:.1f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+from eval_metrics import per_class_metrics
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# How often forked workers look for the result their parent process wrote
+SIDECAR_POLL_SECONDS = 5.0
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_manifest_hash(data_dir):
+    # Hashes relative path, size and mtime of every file instead of the pixel
+    # content, so checking for test-set changes stays cheap on large folders
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            rel = os.path.relpath(path, data_dir).replace(os.sep, "/")
+            digest.update(f"{rel}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def sidecar_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".eval.json"
+
+
+def evaluate_on_directory(model, test_dir, class_names, image_size=(150, 150), batch_size=32):
+    import tensorflow as tf
+
+    test_dataset = tf.keras.utils.image_dataset_from_directory(
+        test_dir, labels="inferred", label_mode="int", batch_size=batch_size,
+        image_size=image_size, shuffle=False
+    )
+    test_dataset = test_dataset.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y))
+    all_labels, all_probs = [], []
+    for images, labels in test_dataset:
+        all_probs.append(model.predict_on_batch(images))
+        all_labels.append(labels.numpy())
+    labels = np.concatenate(all_labels).astype(np.int64)
+    probs = np.concatenate(all_probs).astype(np.float64)
+    predicted = np.argmax(probs, axis=1)
+    true_probs = np.clip(probs[np.arange(len(labels)), labels], 1e-7, 1.0)
+    return {
+        'accuracy': float(np.mean(predicted == labels)),
+        'loss': float(-np.mean(np.log(true_probs))),
+        'num_samples': int(len(labels)),
+        'per_class': per_class_metrics(labels, predicted, class_names)
+    }
+
+
+class EvaluationCache:
+    """Test-set evaluation persisted next to the model file.
+
+    Results are keyed by the model file's SHA-256 and a manifest hash of the
+    test directory. ``start`` returns immediately: a background thread reuses
+    the sidecar when both keys match and only re-runs the evaluation when the
+    model or the test set changed.
+
+    Processes forked after ``start`` (pre-fork serving) do not inherit the
+    thread; while pending they poll the sidecar the parent writes instead,
+    checking the same keys. A failed evaluation is written there as an
+    error record so children stop waiting; it is never reused as a result.
+    """
+
+    def __init__(self, model_path, test_dir, class_names, evaluate_fn=evaluate_on_directory, model_hash=None):
+        self.model_path = model_path
+        self.model_hash = model_hash
+        self.test_dir = test_dir
+        self.class_names = list(class_names)
+        self.sidecar_path = sidecar_path_for(model_path)
+        self.evaluate_fn = evaluate_fn
+        self._lock = threading.Lock()
+        self._status = "pending"
+        self._result = None
+        self._error = None
+        self._thread = None
+        self._owner_pid = None
+        self._run_id = None
+        self._last_poll = 0.0
+        self._manifest_hash = None
+
+    def _read_sidecar(self):
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_sidecar(self, record):
+        tmp_path = self.sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, self.sidecar_path)
+
+    def _set(self, status, result=None, error=None):
+        with self._lock:
+            self._status = status
+            self._result = result
+            self._error = error
+
+    def _keys(self):
+        # Cached on the instance, so children forked after the parent computed
+        # them inherit the hashes and the rest compute them once
+        if self.model_hash is None:
+            self.model_hash = file_sha256(self.model_path)
+        if self._manifest_hash is None:
+            self._manifest_hash = dataset_manifest_hash(self.test_dir)
+        return self.model_hash, self._manifest_hash
+
+    def _matches(self, record, model_hash, manifest_hash):
+        return bool(record and record.get('model_sha256') == model_hash
+                    and record.get('test_manifest_sha256') == manifest_hash
+                    and record.get('class_names') == self.class_names)
+
+    def _run(self, model):
+        model_hash = manifest_hash = None
+        try:
+            model_hash, manifest_hash = self._keys()
+            record = self._read_sidecar()
+            if self._matches(record, model_hash, manifest_hash) and 'metrics' in record:
+                print(f"✅ Reusing cached evaluation from {self.sidecar_path}")
+                self._set("ready", record['metrics'])
+                return
+            print("⚙️ Model or test set changed, evaluating in background...")
+            metrics = self.evaluate_fn(model, self.test_dir, self.class_names)
+            self._write_sidecar({
+                'model_sha256': model_hash,
+                'test_manifest_sha256': manifest_hash,
+                'class_names': self.class_names,
+                'evaluated_at': datetime.now(timezone.utc).isoformat(),
+                'metrics': metrics
+            })
+            self._set("ready", metrics)
+            print(f"✅ Evaluation saved to {self.sidecar_path}")
+        except Exception as e:
+            print("Error evaluating model:", e)
+            traceback.print_exc()
+            self._set("error", error=str(e))
+            try:
+                # Lets forked workers polling the sidecar report the failure
+                self._write_sidecar({
+                    'model_sha256': model_hash,
+                    'test_manifest_sha256': manifest_hash,
+                    'class_names': self.class_names,
+                    'failed_at': datetime.now(timezone.utc).isoformat(),
+                    'run_id': self._run_id,
+                    'error': str(e)
+                })
+            except OSError as write_error:
+                print(f"⚠️ Could not record the evaluation error in {self.sidecar_path}: {write_error}")
+
+    def start(self, model):
+        self._owner_pid = os.getpid()
+        self._run_id = uuid.uuid4().hex
+        self._thread = threading.Thread(target=self._run, args=(model,), name="model-evaluation", daemon=True)
+        self._thread.start()
+        return self
+
+    def _poll_sidecar(self):
+        # Only for forked children whose evaluation thread lives in the parent
+        if self._owner_pid in (None, os.getpid()) or self._status != "pending":
+            return
+        now = time.monotonic()
+        if now - self._last_poll < SIDECAR_POLL_SECONDS:
+            return
+        self._last_poll = now
+        try:
+            model_hash, manifest_hash = self._keys()
+        except OSError as e:
+            self._set("error", error=str(e))
+            return
+        record = self._read_sidecar()
+        if not self._matches(record, model_hash, manifest_hash):
+            return
+        if 'error' in record:
+            # Only this run's failure; one left by an earlier run is being retried
+            if record.get('run_id') == self._run_id:
+                self._set("error", error=record['error'])
+        elif 'metrics' in record:
+            self._set("ready", record['metrics'])
+
+    def snapshot(self):
+        self._poll_sidecar()
+        with self._lock:
+            snapshot = {'status': self._status}
+            if self._result is not None:
+                snapshot.update(self._result)
+            if self._error is not None:
+                snapshot['error'] = self._error
+            return snapshot
+
+    @property
+    def test_accuracy(self):
+        self._poll_sidecar()
+        with self._lock:
+            if self._status == "ready":
+                return self._result['accuracy']
+            return self._status
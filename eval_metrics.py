@@ -0,0 +1,73 @@
+"""Classification metrics over label and probability arrays, vectorized with numpy.
+
+Shared by evaluate.py (the full report) and eval_cache.py (the summary
+cached next to each model).
+"""
+import numpy as np
+
+
+def confusion_matrix(labels, predicted, num_classes):
+    cm = np.bincount(labels * num_classes + predicted, minlength=num_classes * num_classes)
+    return cm.reshape(num_classes, num_classes)
+
+
+def per_class_metrics(labels, predicted, class_names):
+    num_classes = len(class_names)
+    cm = confusion_matrix(labels, predicted, num_classes)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted_count = cm.sum(axis=0)
+    precision = np.divide(tp, predicted_count, out=np.zeros_like(tp), where=predicted_count > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+    return {
+        class_names[i]: {
+            'precision': float(precision[i]),
+            'recall': float(recall[i]),
+            'f1': float(f1[i]),
+            'support': int(support[i])
+        }
+        for i in range(num_classes)
+    }
+
+
+def expected_calibration_error(probs, labels, num_bins=15):
+    """ECE over equal-width confidence bins, plus the per-bin reliability table."""
+    confidence = probs.max(axis=1)
+    correct = (probs.argmax(axis=1) == labels).astype(np.float64)
+    bins = np.minimum((confidence * num_bins).astype(np.int64), num_bins - 1)
+    count = np.bincount(bins, minlength=num_bins)
+    conf_sum = np.bincount(bins, weights=confidence, minlength=num_bins)
+    acc_sum = np.bincount(bins, weights=correct, minlength=num_bins)
+    ece = float(np.abs(acc_sum - conf_sum).sum() / max(len(labels), 1))
+    nonzero = np.maximum(count, 1)
+    reliability = [
+        {'bin_upper': (i + 1) / num_bins, 'count': int(count[i]),
+         'mean_confidence': float(conf_sum[i] / nonzero[i]), 'accuracy': float(acc_sum[i] / nonzero[i])}
+        for i in range(num_bins) if count[i]
+    ]
+    return ece, reliability
+
+
+def _average_ranks(values):
+    # 1-based ranks, ties share their average rank (Mann-Whitney convention)
+    order = np.argsort(values, kind="mergesort")
+    _, inverse, counts = np.unique(values[order], return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = ((ends - counts + 1 + ends) / 2.0)[inverse]
+    return ranks
+
+
+def roc_auc_ovr(probs, labels, num_classes):
+    """One-vs-rest ROC-AUC per class from ranks (NaN for a class without positives or negatives)."""
+    aucs = np.full(num_classes, np.nan)
+    for c in range(num_classes):
+        positive = labels == c
+        n_pos = int(positive.sum())
+        n_neg = len(labels) - n_pos
+        if n_pos and n_neg:
+            rank_sum = _average_ranks(np.asarray(probs[:, c], dtype=np.float64))[positive].sum()
+            aucs[c] = (rank_sum - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg)
+    return aucs
@@ -0,0 +1,200 @@
+"""Headless batch evaluation of a trained model on a labelled image folder.
+
+Usage:
+    python evaluate.py [--model PATH] [--test-dir DIR] [--backend keras|tflite]
+                       [--preprocess training|serving] [--batch-size 256]
+                       [--class-names class_names.json] [--out-dir DIR] [--bins 15]
+
+Images are streamed in large batches, so memory stays flat however big the
+test set is: decoding overlaps the forward pass, and the probabilities go
+into a preallocated, disk-backed (N, C) array instead of growing lists.
+Metrics are computed from that array in vectorized form: confusion matrix,
+per-class precision/recall/F1, macro and weighted averages, log loss,
+expected calibration error with its reliability table, and one-vs-rest
+ROC-AUC.
+
+``--preprocess training`` resizes like the training pipeline (bilinear);
+``serving`` uses fast_preprocess exactly as flask_pneumonia_api.py does.
+
+Writes to ``--out-dir`` (default ``<model>.eval/``): report.json,
+per_class.csv, predictions.csv (one row per image) and probs.npy.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from eval_cache import file_sha256
+from eval_metrics import confusion_matrix, expected_calibration_error, per_class_metrics, roc_auc_ovr
+from fast_preprocess import TARGET_SIZE, decode_into, to_model_input
+from inference_backends import INFERENCE_BACKEND, TFLITE_MODEL_PATH, load_backend
+from input_pipeline import list_image_files
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+test_path = os.path.join(base_path, "test")
+model_file = os.path.join(base_path, "trained_model", "lung_disease_model1.h5")
+
+DECODE_THREADS = int(os.environ.get("EVAL_DECODE_THREADS", os.cpu_count() or 1))
+
+
+def training_batches(test_dir, batch_size):
+    # The training input pipeline without cache or shuffle: parallel decode, prefetch.
+    # Always the whole folder: INPUT_NUM_SHARDS/INPUT_SHARD_INDEX are for training
+    from input_pipeline import build_dataset
+
+    dataset = build_dataset(test_dir, batch_size=batch_size, image_size=TARGET_SIZE, cache="",
+                            num_shards=1, shard_index=0)
+    for images, _ in dataset:
+        yield images.numpy()
+
+
+def serving_batches(paths, batch_size, threads=DECODE_THREADS):
+    """float32 batches decoded like the API; the next batch decodes while the caller predicts."""
+    width, height = TARGET_SIZE
+    buffers = [np.empty((batch_size, height, width, 3), dtype=np.uint8) for _ in range(2)]
+    inputs = np.empty((batch_size, height, width, 3), dtype=np.float32)
+
+    with ThreadPoolExecutor(threads) as decoder, ThreadPoolExecutor(1) as prefetcher:
+        def decode_batch(start, buffer):
+            chunk = paths[start:start + batch_size]
+            list(decoder.map(lambda item: decode_into(item[1], buffer[item[0]]), enumerate(chunk)))
+            return len(chunk)
+
+        pending = prefetcher.submit(decode_batch, 0, buffers[0])
+        for i, start in enumerate(range(0, len(paths), batch_size)):
+            count = pending.result()
+            if start + batch_size < len(paths):
+                pending = prefetcher.submit(decode_batch, start + batch_size, buffers[(i + 1) % 2])
+            yield to_model_input(buffers[i % 2][:count], out=inputs[:count])
+
+
+def compute_report(probs, labels, class_names, num_bins):
+    num_classes = len(class_names)
+    predicted = probs.argmax(axis=1)
+    cm = confusion_matrix(labels, predicted, num_classes)
+    per_class = per_class_metrics(labels, predicted, class_names)
+    aucs = roc_auc_ovr(probs, labels, num_classes)
+    for name, auc in zip(class_names, aucs):
+        per_class[name]['roc_auc'] = None if np.isnan(auc) else float(auc)
+    support = np.array([per_class[name]['support'] for name in class_names], dtype=np.float64)
+    weights = support / max(support.sum(), 1.0)
+
+    def averages(key):
+        values = np.array([np.nan if per_class[n][key] is None else per_class[n][key] for n in class_names])
+        valid = ~np.isnan(values)
+        return {
+            'macro': float(values[valid].mean()) if valid.any() else None,
+            'weighted': float((values[valid] * weights[valid]).sum() / weights[valid].sum()) if valid.any() else None,
+        }
+
+    true_probs = np.clip(probs[np.arange(len(labels)), labels], 1e-7, 1.0)
+    ece, reliability = expected_calibration_error(probs, labels, num_bins)
+    return {
+        'num_samples': int(len(labels)),
+        'accuracy': float(np.trace(cm) / max(len(labels), 1)),
+        'loss': float(-np.log(true_probs).mean()),
+        'confusion_matrix': {'labels': list(class_names), 'rows_true_columns_predicted': cm.tolist()},
+        'per_class': per_class,
+        'precision': averages('precision'),
+        'recall': averages('recall'),
+        'f1': averages('f1'),
+        'roc_auc_ovr': averages('roc_auc'),
+        'expected_calibration_error': ece,
+        'calibration_bins': num_bins,
+        'reliability': reliability,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=model_file)
+    parser.add_argument("--test-dir", default=test_path)
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=["keras", "tflite"])
+    parser.add_argument("--tflite-path", default=TFLITE_MODEL_PATH or None)
+    parser.add_argument("--preprocess", default="training", choices=["training", "serving"])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--class-names", default=None, help="JSON list (default: sorted test sub-directories)")
+    parser.add_argument("--out-dir", default=None)
+    parser.add_argument("--bins", type=int, default=15, help="confidence bins for the calibration error")
+    args = parser.parse_args()
+
+    paths, labels, class_names = list_image_files(args.test_dir)
+    if not paths:
+        raise ValueError(f"❌ No images found in {args.test_dir}")
+    if args.class_names:
+        with open(args.class_names, "r", encoding="utf-8") as f:
+            model_classes = json.load(f)
+        # Map folder labels onto the model's output order
+        remap = np.array([model_classes.index(name) for name in class_names], dtype=np.int64)
+        labels = [int(remap[label]) for label in labels]
+        class_names = model_classes
+    labels = np.asarray(labels, dtype=np.int64)
+
+    out_dir = args.out_dir or os.path.splitext(args.model)[0] + ".eval"
+    os.makedirs(out_dir, exist_ok=True)
+    backend = load_backend(args.backend, args.model, args.tflite_path)
+    print(f"⚙️ Evaluating {backend.model_path} ({backend.name}) on {len(paths)} images from {args.test_dir}")
+
+    probs = np.lib.format.open_memmap(os.path.join(out_dir, "probs.npy"), mode="w+", dtype=np.float32,
+                                      shape=(len(paths), len(class_names)))
+    if args.preprocess == "serving":
+        batches = serving_batches(paths, args.batch_size)
+    else:
+        batches = training_batches(args.test_dir, args.batch_size)
+
+    start = time.perf_counter()
+    done = 0
+    with open(os.path.join(out_dir, "predictions.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "label", "predicted", "confidence"] + list(class_names))
+        for batch in batches:
+            output = backend.predict_on_batch(batch)
+            if output.shape[1] != len(class_names):
+                raise ValueError(f"❌ Model has {output.shape[1]} outputs but {len(class_names)} class names")
+            if done + len(output) > len(paths):
+                raise RuntimeError(f"❌ Got more than {len(paths)} predictions for {len(paths)} images")
+            probs[done:done + len(output)] = output
+            predicted = output.argmax(axis=1)
+            for i in range(len(output)):
+                writer.writerow([paths[done + i], class_names[labels[done + i]], class_names[predicted[i]],
+                                 f"{output[i, predicted[i]]:.6f}"] + [f"{p:.6f}" for p in output[i]])
+            done += len(output)
+            print(f"   {done}/{len(paths)} images", end="\r")
+    seconds = time.perf_counter() - start
+    probs.flush()
+    if done != len(paths):
+        # Rows are lined up with labels by position, so a short run would skew every metric
+        raise RuntimeError(f"❌ Got {done} predictions for {len(paths)} images")
+
+    report = compute_report(probs, labels, class_names, args.bins)
+    report.update({
+        'model_path': backend.model_path,
+        'model_sha256': file_sha256(backend.model_path),
+        'backend': backend.name,
+        'preprocess': args.preprocess,
+        'test_dir': args.test_dir,
+        'seconds': seconds,
+        'images_per_second': len(paths) / seconds if seconds > 0 else None,
+    })
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(out_dir, "per_class.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class", "precision", "recall", "f1", "support", "roc_auc"])
+        for name in class_names:
+            row = report['per_class'][name]
+            writer.writerow([name, row['precision'], row['recall'], row['f1'], row['support'], row['roc_auc']])
+
+    print(f"\n✅ Accuracy {report['accuracy'] * 100:.2f}%, macro F1 {report['f1']['macro']:.4f}, "
+          f"ECE {report['expected_calibration_error']:.4f}, macro ROC-AUC {report['roc_auc_ovr']['macro']}")
+    print(f"✅ {len(paths)} images in {seconds:.1f}s ({report['images_per_second']:.1f} images/s)")
+    print(f"📄 Report written to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
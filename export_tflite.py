@@ -0,0 +1,119 @@
+"""Export the lung disease CNN to TFLite with post-training quantization.
+
+Usage:
+    python export_tflite.py [--model PATH] [--train-dir DIR] [--test-dir DIR]
+                            [--calibration-samples N]
+
+Writes <model>.float16.tflite and <model>.int8.tflite next to the .h5 file
+and prints accuracy, latency and size for each against the Keras baseline.
+Serve one with INFERENCE_BACKEND=tflite (TFLITE_MODEL_PATH picks the file).
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from eval_cache import evaluate_on_directory
+from inference_backends import KerasBackend, TFLiteBackend, tflite_path_for
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+train_path = os.path.join(base_path, "train")
+test_path = os.path.join(base_path, "test")
+model_file = os.path.join(base_path, "trained_model", "lung_disease_model1.h5")
+
+IMAGE_SIZE = (150, 150)
+
+
+def representative_dataset(train_dir, num_samples, seed=123):
+    # Calibration images go through the same [0, 1] scaling as serving
+    dataset = tf.keras.utils.image_dataset_from_directory(
+        train_dir, labels=None, batch_size=1, image_size=IMAGE_SIZE,
+        shuffle=True, seed=seed
+    ).take(num_samples)
+
+    def generator():
+        for image in dataset:
+            yield [tf.cast(image, tf.float32) / 255.0]
+
+    return generator
+
+
+def convert(model, quantization, train_dir=None, calibration_samples=200):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        # Full-integer kernels; input and output stay float32 so the serving
+        # code does not change
+        converter.representative_dataset = representative_dataset(train_dir, calibration_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    return converter.convert()
+
+
+def measure_latency(backend, batch_size, repeats=20):
+    batch = np.random.default_rng(0).random((batch_size, IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.float32)
+    backend.predict_on_batch(batch)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.predict_on_batch(batch)
+    return (time.perf_counter() - start) * 1000.0 / repeats
+
+
+def benchmark(name, backend, path, test_dir, class_names):
+    metrics = evaluate_on_directory(backend, test_dir, class_names)
+    return {
+        'variant': name,
+        'path': path,
+        'size_mb': os.path.getsize(path) / (1024 * 1024),
+        'accuracy': metrics['accuracy'],
+        'loss': metrics['loss'],
+        'latency_ms_batch1': measure_latency(backend, 1),
+        'latency_ms_batch32': measure_latency(backend, 32)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=model_file)
+    parser.add_argument("--train-dir", default=train_path)
+    parser.add_argument("--test-dir", default=test_path)
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    class_names = sorted(
+        d for d in os.listdir(args.train_dir) if os.path.isdir(os.path.join(args.train_dir, d))
+    )
+    keras_backend = KerasBackend(args.model)
+    results = [benchmark("keras", keras_backend, args.model, args.test_dir, class_names)]
+
+    for quantization in ("float16", "int8"):
+        out_path = tflite_path_for(args.model, quantization)
+        print(f"\n⚙️ Converting to {quantization} TFLite...")
+        tflite_model = convert(keras_backend.model, quantization, args.train_dir, args.calibration_samples)
+        with open(out_path, "wb") as f:
+            f.write(tflite_model)
+        print(f"✅ Saved: {out_path}")
+        results.append(benchmark(quantization, TFLiteBackend(out_path), out_path, args.test_dir, class_names))
+
+    baseline = results[0]
+    print(f"\n{'variant':>8} {'size MB':>8} {'acc %':>7} {'Δacc pp':>8} {'ms@1':>8} {'ms@32':>8}")
+    for r in results:
+        r['accuracy_delta'] = r['accuracy'] - baseline['accuracy']
+        print(f"{r['variant']:>8} {r['size_mb']:8.2f} {r['accuracy'] * 100:7.2f} "
+              f"{r['accuracy_delta'] * 100:+8.2f} {r['latency_ms_batch1']:8.2f} {r['latency_ms_batch32']:8.2f}")
+
+    report_path = os.path.splitext(args.model)[0] + ".export_report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from metrics import stage_timer
+
+TARGET_SIZE = (150, 150)
+# JPEG draft decoding is asked for at least this multiple of the target size
+# before the final nearest-neighbour resize
+DRAFT_OVERSAMPLE = int(os.environ.get("PREPROCESS_DRAFT_OVERSAMPLE", 2))
+# Set PREPROCESS_FAST_DECODE=0 to always decode at full resolution
+FAST_DECODE = os.environ.get("PREPROCESS_FAST_DECODE", "1") != "0"
+
+INV_255 = np.float32(1.0 / 255.0)
+
+# Tolerance against the Keras load_img/img_to_array path (values in [0, 1]):
+#  - PNG, BMP and other codecs without reduced-size decoding: identical output.
+#  - JPEG: the decoder downscales by 1/2, 1/4 or 1/8 in the DCT domain, which
+#    averages neighbouring pixels before nearest-neighbour sampling. On chest
+#    films the mean absolute difference stays below MEAN_ABS_TOLERANCE; single
+#    pixels on sharp edges can differ more. bench_preprocess.py reports both.
+MEAN_ABS_TOLERANCE = 0.02
+
+
+def open_image(source, target_size=TARGET_SIZE, fast_decode=FAST_DECODE):
+    """Open ``source`` (path or file object) and return an RGB image of ``target_size``.
+
+    Matches ``load_img(..., target_size=target_size)``: RGB conversion followed
+    by a nearest-neighbour resize. When ``fast_decode`` is set the JPEG decoder
+    is asked for a reduced-size image first, so a 3000x3000 film is never
+    materialised at full resolution.
+    """
+    width, height = target_size
+    with stage_timer("decode"):
+        img = Image.open(source)
+        if fast_decode and img.format == "JPEG":
+            img.draft("RGB", (width * DRAFT_OVERSAMPLE, height * DRAFT_OVERSAMPLE))
+        img.load()
+    with stage_timer("resize"):
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if img.size != (width, height):
+            img = img.resize((width, height), Image.NEAREST)
+    return img
+
+
+def decode_into(source, out, fast_decode=FAST_DECODE):
+    """Decode ``source`` straight into ``out``, a preallocated (H, W, 3) uint8 view."""
+    height, width = out.shape[:2]
+    img = open_image(source, (width, height), fast_decode=fast_decode)
+    np.copyto(out, np.asarray(img, dtype=np.uint8))
+    return out
+
+
+def to_model_input(batch, out=None):
+    """Normalize a uint8 (N, H, W, 3) batch to float32 in [0, 1] in a single pass."""
+    if out is None:
+        out = np.empty(batch.shape, dtype=np.float32)
+    np.multiply(batch, INV_255, out=out, dtype=np.float32)
+    return out
+
+
+class ImagePreprocessor:
+    """Reusable uint8 batch buffer for decoding several images before one forward pass."""
+
+    def __init__(self, batch_size, target_size=TARGET_SIZE, fast_decode=FAST_DECODE):
+        width, height = target_size
+        self.fast_decode = fast_decode
+        self.images = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+        self.inputs = np.empty((batch_size, height, width, 3), dtype=np.float32)
+        self.count = 0
+
+    @property
+    def full(self):
+        return self.count >= len(self.images)
+
+    def add(self, source):
+        decode_into(source, self.images[self.count], fast_decode=self.fast_decode)
+        self.count += 1
+
+    def model_input(self):
+        return to_model_input(self.images[:self.count], out=self.inputs[:self.count])
+
+    def reset(self):
+        self.count = 0
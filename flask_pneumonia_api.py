@@ -1,11 +1,23 @@
-from flask import Flask, request, jsonify
-import tensorflow as tf
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 import numpy as np
-from tensorflow.keras.preprocessing.image import img_to_array, load_img
 from flask_cors import CORS
 import io
 import traceback
 import os
+import json
+import time
+import base64
+from batch_ingest import iter_request_images
+from fast_preprocess import ImagePreprocessor, decode_into
+from prediction_cache import PredictionCache, content_key
+from inference_backends import INFERENCE_BACKEND, TFLITE_MODEL_PATH
+from model_registry import ModelManager
+from tta import TTA_MAX_VIEWS, predict_with_tta
+from gradcam import EXPLAIN_DEFAULT_SIZE, EXPLAIN_MAX_SIZE, render_overlay
+from metrics import (
+    BATCH_SIZE, PREDICTION_CACHE_EVENTS, REQUEST_SECONDS,
+    REQUESTS_IN_FLIGHT, REQUESTS_TOTAL, CONTENT_TYPE, render_metrics, stage_timer
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -13,6 +25,12 @@ CORS(app)
 MODEL_PATH = r"E:\chest_xray\Lung Disease Dataset\trained_model\lung_disease_model1.h5"
 TRAIN_DIR = r"E:\chest_xray\Lung Disease Dataset\train"
 TEST_DIR = r"E:\chest_xray\Lung Disease Dataset\test"
+# Versioned models (<version>/model.h5 + class_names.json); see model_registry.py
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", r"E:\chest_xray\Lung Disease Dataset\model_registry")
+# Optional shared secret for the /admin endpoints
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# Number of images per forward pass in /predict_batch
+PREDICT_BATCH_CHUNK = int(os.environ.get("PREDICT_BATCH_CHUNK", 32))
 
 # Add: Load class names from the dataset directory
 def get_class_names_from_dir(data_dir):
@@ -25,27 +43,64 @@ def get_class_names_from_dir(data_dir):
 # Update CLASS_NAMES to be loaded from the train directory
 CLASS_NAMES = get_class_names_from_dir(TRAIN_DIR)
 
-model = tf.keras.models.load_model(MODEL_PATH)
+# Repeated uploads of the same image are answered without touching TensorFlow
+prediction_cache = PredictionCache()
+# Grad-CAM overlays (PNG bytes) keyed the same way, so re-opening a study is free
+explanation_cache = PredictionCache(
+    max_entries=int(os.environ.get("EXPLANATION_CACHE_MAX_ENTRIES", 2000)),
+    max_bytes=int(os.environ.get("EXPLANATION_CACHE_MAX_BYTES", 128 * 1024 * 1024)),
+    cache_dir=os.environ.get("EXPLANATION_CACHE_DIR", ""),
+    disk_max_bytes=int(os.environ.get("EXPLANATION_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+)
 
-# Evaluate model on test set at startup and store test accuracy
-def get_test_accuracy(model, test_dir):
-    test_dataset = tf.keras.utils.image_dataset_from_directory(
-        test_dir, labels="inferred", label_mode="int", batch_size=32,
-        image_size=(150, 150), shuffle=False
-    )
-    test_dataset = test_dataset.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y))
-    loss, acc = model.evaluate(test_dataset, verbose=0)
-    return float(acc)
+# Serves the active registry version (or MODEL_PATH when the registry is empty).
+# Each version gets its own backend, micro-batcher and cached test-set
+# evaluation; new versions are loaded and warmed in the background, then
+# swapped in atomically
+models = ModelManager(
+    MODEL_REGISTRY_DIR, MODEL_PATH, CLASS_NAMES, INFERENCE_BACKEND,
+    tflite_path=TFLITE_MODEL_PATH or None, test_dir=TEST_DIR
+)
+models.load()
 
-test_accuracy = get_test_accuracy(model, TEST_DIR)
+@app.before_request
+def track_request_start():
+    models.ensure_watcher()
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(request.endpoint).inc()
+
+@app.after_request
+def track_request_status(response):
+    REQUESTS_TOTAL.labels(request.endpoint, response.status_code).inc()
+    return response
+
+@app.teardown_request
+def track_request_end(exc):
+    # stream_with_context tears down twice; popping keeps a request counted once.
+    # Streamed bodies are timed separately as the "batch_stream" stage
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUESTS_IN_FLIGHT.labels(request.endpoint).dec()
+        REQUEST_SECONDS.labels(request.endpoint).observe(time.perf_counter() - start)
 
 def prepare_image(file, target_size=(150, 150)):
-    # Read file bytes and wrap in BytesIO for load_img
-    img_bytes = file.read()
-    img = load_img(io.BytesIO(img_bytes), target_size=target_size)
-    img_array = img_to_array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
-    return img_array
+    # Decode at reduced size where the codec allows it, straight into a uint8
+    # buffer; scaling to [0, 1] happens once per batch in to_model_input
+    img_array = np.empty((target_size[1], target_size[0], 3), dtype=np.uint8)
+    return decode_into(file, img_array)
+
+def describe_prediction(prediction, handle):
+    class_names = handle.class_names
+    predicted_class = int(np.argmax(prediction))
+    return {
+        'predicted_class': class_names[predicted_class],
+        'confidence': float(np.max(prediction) * 100),
+        'disease_confidences': [
+            {'disease': class_names[i], 'confidence': float(prediction[i]) * 100}
+            for i in range(len(class_names))
+        ],
+        'model_version': handle.version
+    }
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -53,40 +108,236 @@ def predict():
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
         file = request.files['file']
-        img_array = prepare_image(file)
-        prediction = model.predict(img_array)
-        print("Model prediction output:", prediction)  # Debug print
-        predicted_class = int(np.argmax(prediction[0]))
-        print("Predicted class index:", predicted_class)  # Debug print
-        confidence = float(np.max(prediction[0]) * 100)
-        if predicted_class < 0 or predicted_class >= len(CLASS_NAMES):
+        # Optional test-time augmentation: ?tta=K (or form field) averages K views
+        try:
+            tta_views = int(request.args.get('tta') or request.form.get('tta') or 1)
+        except ValueError:
+            tta_views = 0
+        if tta_views < 1 or tta_views > TTA_MAX_VIEWS:
+            return jsonify({'error': f'tta must be between 1 and {TTA_MAX_VIEWS}'}), 400
+        # The whole request uses the version that was active when it started
+        handle = models.current
+        with stage_timer("upload_read"):
+            img_bytes = file.read()
+        if tta_views > 1:
+            return predict_tta(handle, img_bytes, tta_views)
+        with stage_timer("cache_lookup"):
+            cache_key = content_key(img_bytes, handle.cache_tag)
+            prediction = prediction_cache.get(cache_key)
+        if prediction is None:
+            img_array = prepare_image(io.BytesIO(img_bytes))
+            # Batcher returns this request's own row of softmax output
+            prediction = prediction_cache.put(cache_key, handle.batcher.predict(img_array))
+        predicted_class = int(np.argmax(prediction))
+        if predicted_class < 0 or predicted_class >= len(handle.class_names):
             return jsonify({
                 'error': f'Predicted class index {predicted_class} out of range for CLASS_NAMES',
                 'prediction': prediction.tolist(),
-                'predicted_class': predicted_class
+                'predicted_class': predicted_class,
+                'model_version': handle.version
             }), 500
-        class_label = CLASS_NAMES[predicted_class]
-        # Prepare all disease predictions with confidence
-        disease_confidences = [
-            {'disease': CLASS_NAMES[i], 'confidence': float(prediction[0][i]) * 100}
-            for i in range(len(CLASS_NAMES))
-        ]
-        return jsonify({
-            'predicted_class': class_label,
-            'confidence': confidence,
-            'disease_confidences': disease_confidences
-        })
+        with stage_timer("serialize"):
+            return jsonify(describe_prediction(prediction, handle))
     except Exception as e:
         print("Error in /predict:", e)
         traceback.print_exc()  # Print full stack trace to server log
         return jsonify({'error': str(e)}), 500
 
+def predict_tta(handle, img_bytes, num_views):
+    # All views go through one forward pass; the TTA schedule is seeded, so
+    # mean and spread are cached like a plain prediction
+    cache_key = content_key(img_bytes, f"{handle.cache_tag}-tta{num_views}")
+    cached = prediction_cache.get(cache_key)
+    if cached is None:
+        img_array = prepare_image(io.BytesIO(img_bytes))
+        BATCH_SIZE.labels("tta").observe(num_views)
+        with stage_timer("model_forward"):
+            mean, uncertainty, agreement = predict_with_tta(handle.backend, img_array, num_views)
+        cached = prediction_cache.put(cache_key, np.concatenate([mean, [uncertainty, agreement]]))
+    result = describe_prediction(cached[:-2], handle)
+    result.update({
+        'tta_views': num_views,
+        'uncertainty': float(cached[-2]) * 100,
+        'view_agreement': float(cached[-1])
+    })
+    with stage_timer("serialize"):
+        return jsonify(result)
+
+def predict_stream(images, chunk_size=PREDICT_BATCH_CHUNK):
+    # Decode as images arrive into a fixed uint8 buffer and flush one forward
+    # pass per full buffer, so memory does not grow with the upload size
+    preprocessor = ImagePreprocessor(chunk_size)
+    handle = models.current
+    names, keys = [], []
+
+    def flush():
+        try:
+            BATCH_SIZE.labels("bulk").observe(preprocessor.count)
+            with stage_timer("model_forward"):
+                predictions = handle.backend.predict_on_batch(preprocessor.model_input())
+            lines = [
+                dict(filename=name, **describe_prediction(prediction_cache.put(keys[i], predictions[i]), handle))
+                for i, name in enumerate(names)
+            ]
+        except Exception as e:
+            lines = [{'filename': name, 'error': str(e)} for name in names]
+        names.clear()
+        keys.clear()
+        preprocessor.reset()
+        return lines
+
+    for name, data in images:
+        cache_key = content_key(data, handle.cache_tag)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            yield dict(filename=name, **describe_prediction(cached, handle))
+            continue
+        try:
+            preprocessor.add(io.BytesIO(data))
+            names.append(name)
+            keys.append(cache_key)
+        except Exception as e:
+            yield {'filename': name, 'error': f'Could not decode image: {e}'}
+            continue
+        if preprocessor.full:
+            yield from flush()
+    if names:
+        yield from flush()
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    # Accepts multipart/form-data with any number of image or .zip parts,
+    # or a raw application/zip body, and streams back one NDJSON line per image
+    if request.mimetype not in ('multipart/form-data', 'application/zip', 'application/x-zip-compressed'):
+        return jsonify({'error': 'Expected multipart/form-data or application/zip body'}), 400
+    images = iter_request_images(request.stream, request.headers.get('Content-Type'))
+
+    def generate():
+        try:
+            with stage_timer("batch_stream"):
+                for line in predict_stream(images):
+                    yield json.dumps(line) + "\n"
+        except Exception as e:
+            print("Error in /predict_batch:", e)
+            traceback.print_exc()
+            yield json.dumps({'error': str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def pack_explanation(png, probs):
+    # PNG bytes followed by the float32 softmax row, as one cacheable uint8 array
+    return np.concatenate([np.frombuffer(png, dtype=np.uint8), probs.astype(np.float32).view(np.uint8)])
+
+def unpack_explanation(packed, num_classes):
+    split = len(packed) - 4 * num_classes
+    return packed[:split].tobytes(), packed[split:].copy().view(np.float32)
+
+def explain_images(handle, uploads, size):
+    # Cache hits are served from explanation_cache; all misses share one
+    # combined forward/backward Grad-CAM pass
+    results = [None] * len(uploads)
+    misses = []
+    for i, (name, data) in enumerate(uploads):
+        cache_key = content_key(data, f"{handle.cache_tag}-gradcam{size}")
+        cached = explanation_cache.get(cache_key)
+        if cached is not None:
+            results[i] = (name,) + unpack_explanation(cached, len(handle.class_names))
+        else:
+            misses.append((i, name, cache_key, prepare_image(io.BytesIO(data))))
+    if misses:
+        explainer = handle.explainer()
+        images = np.stack([image for _, _, _, image in misses], axis=0)
+        BATCH_SIZE.labels("explain").observe(len(misses))
+        with stage_timer("gradcam"):
+            predictions, heatmaps = explainer.explain(images.astype(np.float32) / 255.0)
+        for j, (i, name, cache_key, image) in enumerate(misses):
+            png = render_overlay(image, heatmaps[j], size=size)
+            probs = predictions[j].astype(np.float32)
+            explanation_cache.put(cache_key, pack_explanation(png, probs))
+            results[i] = (name, png, probs)
+    return results
+
+@app.route('/explain', methods=['POST'])
+def explain():
+    # One or more images under 'file'/'files'. A single image returns the PNG
+    # overlay directly (unless ?format=json); several return JSON with base64 PNGs
+    try:
+        uploads = [(f.filename, f.read()) for f in request.files.getlist('file') + request.files.getlist('files')]
+        if not uploads:
+            return jsonify({'error': 'No file uploaded'}), 400
+        size = int(request.args.get('size') or EXPLAIN_DEFAULT_SIZE)
+        if size < 16 or size > EXPLAIN_MAX_SIZE:
+            return jsonify({'error': f'size must be between 16 and {EXPLAIN_MAX_SIZE}'}), 400
+        handle = models.current
+        results = explain_images(handle, uploads, size)
+        if len(results) == 1 and request.args.get('format') != 'json':
+            _, png, probs = results[0]
+            prediction = describe_prediction(probs, handle)
+            response = Response(png, mimetype='image/png')
+            response.headers['X-Predicted-Class'] = prediction['predicted_class']
+            response.headers['X-Confidence'] = f"{prediction['confidence']:.2f}"
+            response.headers['X-Model-Version'] = handle.version
+            return response
+        return jsonify({
+            'model_version': handle.version,
+            'target_layer': handle.explainer().layer_name,
+            'explanations': [
+                dict(filename=name, heatmap_png=base64.b64encode(png).decode('ascii'),
+                     **describe_prediction(probs, handle))
+                for name, png, probs in results
+            ]
+        })
+    except Exception as e:
+        print("Error in /explain:", e)
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/model_info', methods=['GET'])
 def model_info():
+    handle = models.current
     return jsonify({
-        'class_names': CLASS_NAMES,
-        'test_accuracy': test_accuracy
+        'class_names': handle.class_names,
+        'model_version': handle.version,
+        'inference_backend': handle.backend.name,
+        'test_accuracy': handle.evaluation.test_accuracy,
+        'evaluation': handle.evaluation.snapshot(),
+        'batching': handle.batcher.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'explanation_cache': explanation_cache.stats()
     })
 
+def admin_authorized():
+    return not ADMIN_TOKEN or request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(models.status())
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # Loads and warms the requested (or registry target) version in the
+    # background; requests keep being served by the current version meanwhile
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if version is not None and version not in models.list_versions():
+        return jsonify({'error': f'Unknown model version: {version}'}), 404
+    if not models.load_in_background(version):
+        return jsonify({'error': 'A model reload is already in progress'}), 409
+    return jsonify({
+        'status': 'loading',
+        'requested_version': version or models.target_version(),
+        'active_version': models.current.version
+    }), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    for event in ('hits', 'disk_hits', 'misses', 'evictions', 'disk_evictions'):
+        PREDICTION_CACHE_EVENTS.labels(event).set(getattr(prediction_cache, event))
+    return Response(render_metrics(), mimetype=None, content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
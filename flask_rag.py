@@ -1,95 +1,34 @@
 import os
-import pickle
+import threading
+import time
 from flask import Flask, request, jsonify
-from pypdf import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.chat_models import ChatOpenAI
-from langchain.embeddings import HuggingFaceEmbeddings
-from pdf2image import convert_from_path
-import pytesseract
 from flask_cors import CORS  # Add this import
+from rag_ingest import update_store
+from vector_store import CURRENT_FILE, VectorStore, current_generation, migrate_pickle
 
 # Set OpenRouter API credentials
 os.environ["OPENAI_API_KEY"] = ""
 os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
 
 FOLDER_PATH = r"E:\chest_xray\03. LLM medical diagnosis report generation Eric Topol"
+# Legacy pickled store, migrated to STORE_DIR on first use
 PKL_PATH = os.path.join(FOLDER_PATH, "faiss_vector_store.pkl")
+STORE_DIR = os.path.join(FOLDER_PATH, "vector_store")
+# Settings (override through environment variables)
+# "hybrid" fuses vector and BM25 rankings (vector_store.py); "similarity" is vectors only
+RAG_SEARCH_TYPE = os.environ.get("RAG_SEARCH_TYPE", "hybrid")
+# Chunks stuffed into the prompt
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", 3))
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-def extract_text_with_ocr(pdf_path):
-    try:
-        pages = convert_from_path(pdf_path, dpi=300)
-        extracted = []
-        for i, page_image in enumerate(pages):
-            text = pytesseract.image_to_string(page_image)
-            extracted.append((i + 1, text.strip()))
-        return extracted
-    except Exception as e:
-        print(f"❌ OCR failed for {pdf_path}: {str(e)}")
-        return []
-
-def build_and_save_vector_store(folder_path, pkl_path):
-    print("🔍 Loading PDFs from folder:", folder_path)
-    documents = []
-    pdf_files = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith(".pdf")]
-    print(f"📄 Found {len(pdf_files)} PDFs.")
-
-    for path in pdf_files:
-        print(f"📘 Processing: {os.path.basename(path)}")
-        with open(path, "rb") as f:
-            pdf = PdfReader(f)
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                print(f"→ Page {i + 1} - Text Extracted: {bool(text)}")
-                if text and text.strip():
-                    documents.append(Document(
-                        page_content=text,
-                        metadata={"source": os.path.basename(path), "page": i + 1}
-                    ))
-
-            # OCR fallback if no text extracted
-            if not any(doc.metadata["source"] == os.path.basename(path) for doc in documents):
-                print(f"🔁 Falling back to OCR for: {os.path.basename(path)}")
-                ocr_texts = extract_text_with_ocr(path)
-                for page_num, text in ocr_texts:
-                    if text:
-                        documents.append(Document(
-                            page_content=text,
-                            metadata={"source": os.path.basename(path), "page": page_num}
-                        ))
-
-    if not documents:
-        raise ValueError("No valid text found in PDFs.")
-
-    print("🧠 Splitting text into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=200)
-    chunks = text_splitter.split_documents(documents)
-
-    print("🔗 Generating embeddings...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.from_documents(chunks, embedding=embeddings)
-
-    print(f"💾 Saving vector store to {pkl_path}")
-    with open(pkl_path, "wb") as f:
-        pickle.dump(vector_store, f)
-
-    return vector_store
-
-def load_vector_store(pkl_path):
-    print(f"📦 Loading vector store from {pkl_path}")
-    with open(pkl_path, "rb") as f:
-        return pickle.load(f)
+def load_vector_store(store_dir):
+    return VectorStore.load(store_dir)
 
-def get_pipeline():
-    if not os.path.exists(PKL_PATH):
-        raise RuntimeError("Vector store not trained. Please POST to /train first.")
-    vector_store = load_vector_store(PKL_PATH)
+def build_pipeline(vector_store):
     llm = ChatOpenAI(
         model_name="mistralai/mixtral-8x7b-instruct",
         temperature=0.3
@@ -97,16 +36,97 @@ def get_pipeline():
     pipeline = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_store.as_retriever(search_kwargs={"k": 4}),
+        retriever=vector_store.as_retriever(search_type=RAG_SEARCH_TYPE, search_kwargs={"k": RAG_TOP_K}),
         return_source_documents=True
     )
     return pipeline
 
+class PipelineHolder:
+    """Process-wide RetrievalQA pipeline, loaded once and swapped atomically.
+
+    ``get`` costs one ``os.stat`` of the store's CURRENT file while it is
+    unchanged. When its mtime or size changes (``/train`` here or in another
+    worker process) and it names a new generation, the store is reloaded
+    under a lock so concurrent requests load it only once. Each request
+    keeps the pipeline it was handed, so a swap never disturbs an in-flight
+    query.
+    """
+
+    def __init__(self, store_dir, legacy_pkl_path=None):
+        self.store_dir = store_dir
+        self.legacy_pkl_path = legacy_pkl_path
+        self._current = None  # (stat signature, generation, pipeline)
+        self._failed_signature = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        stat = os.stat(os.path.join(self.store_dir, CURRENT_FILE))
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _migrate_legacy(self):
+        with self._lock:
+            if current_generation(self.store_dir) is None:
+                migrate_pickle(self.legacy_pkl_path, self.store_dir)
+
+    def get(self):
+        try:
+            signature = self._signature()
+        except FileNotFoundError:
+            if not (self.legacy_pkl_path and os.path.exists(self.legacy_pkl_path)):
+                raise RuntimeError("Vector store not trained. Please POST to /train first.")
+            self._migrate_legacy()
+            signature = self._signature()
+        current = self._current
+        if current is not None and current[0] == signature:
+            return current[2]
+        with self._lock:
+            current = self._current
+            if current is not None and signature in (current[0], self._failed_signature):
+                return current[2]
+            generation = current_generation(self.store_dir)
+            if current is not None and current[1] == generation:
+                # Rewritten with the same generation: keep the loaded pipeline
+                self._current = (signature, generation, current[2])
+                return current[2]
+            try:
+                start = time.perf_counter()
+                vector_store = load_vector_store(self.store_dir)
+                pipeline = build_pipeline(vector_store)
+            except Exception as e:
+                if current is None:
+                    raise
+                print(f"❌ Reloading vector store failed, keeping the loaded one: {e}")
+                # Not retried until the file changes again
+                self._failed_signature = signature
+                return current[2]
+            self._current = (signature, vector_store.generation, pipeline)
+            print(f"✅ RAG pipeline ready in {time.perf_counter() - start:.1f}s")
+            return pipeline
+
+    def replace(self, vector_store):
+        """Swap in a store that was just built and saved, without reading it back."""
+        with self._lock:
+            pipeline = build_pipeline(vector_store)
+            self._current = (self._signature(), vector_store.generation, pipeline)
+
+pipeline_holder = PipelineHolder(STORE_DIR, PKL_PATH)
+# Serializes /train so two rebuilds never race on the same store file
+train_lock = threading.Lock()
+
+def get_pipeline():
+    return pipeline_holder.get()
+
 @app.route('/train', methods=['POST'])
 def train():
+    # Only new or changed PDFs are extracted and embedded; {"rebuild": true} re-embeds everything
+    rebuild = bool((request.get_json(silent=True) or {}).get("rebuild", False))
     try:
-        build_and_save_vector_store(FOLDER_PATH, PKL_PATH)
-        return jsonify({"status": "success", "message": "Training complete and vector store saved."})
+        with train_lock:
+            summary, vector_store = update_store(FOLDER_PATH, STORE_DIR, rebuild=rebuild)
+            if vector_store is not None:
+                pipeline_holder.replace(vector_store)
+        message = "Training complete and vector store saved." if vector_store is not None else "Vector store already up to date."
+        return jsonify({"status": "success", "message": message, "summary": summary})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
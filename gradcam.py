@@ -0,0 +1,124 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+# Settings (override through environment variables)
+EXPLAIN_DEFAULT_SIZE = int(os.environ.get("EXPLAIN_DEFAULT_SIZE", 300))
+EXPLAIN_MAX_SIZE = int(os.environ.get("EXPLAIN_MAX_SIZE", 1024))
+EXPLAIN_OVERLAY_ALPHA = float(os.environ.get("EXPLAIN_OVERLAY_ALPHA", 0.45))
+# Overlays are palette-quantized to this many colours to keep the PNGs small
+EXPLAIN_PNG_COLORS = int(os.environ.get("EXPLAIN_PNG_COLORS", 128))
+
+
+def find_target_layer(model):
+    """Index of the last top-level Conv2D layer, else of the last layer with a 4D output."""
+    import tensorflow as tf
+
+    conv_index = feature_index = None
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.layers.Conv2D):
+            conv_index = i
+        try:
+            if len(layer.output.shape) == 4:
+                feature_index = i
+        except (AttributeError, ValueError):
+            pass
+    index = conv_index if conv_index is not None else feature_index
+    if index is None:
+        raise ValueError("Model has no convolutional feature map to explain")
+    return index
+
+
+class GradCAM:
+    """Grad-CAM for Sequential models in one combined forward/backward pass.
+
+    The layers are applied one by one under a GradientTape, so the same pass
+    yields both the softmax output and the gradient of each sample's winning
+    class logit with respect to the target feature map. The logit is taken
+    before the softmax, whose gradient vanishes for confident predictions:
+    a final Dense layer is applied as kernel and bias with its activation
+    on top, a final Activation layer is skipped. Works on whole batches;
+    every sample gets its own heatmap.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self.layer_index = find_target_layer(model)
+        self.layer_name = model.layers[self.layer_index].name
+        head = model.layers[-1]
+        if isinstance(head, tf.keras.layers.Dense):
+            self.head = "dense"
+        elif isinstance(head, tf.keras.layers.Activation):
+            self.head = "activation"
+        else:
+            self.head = None
+        self._compute = tf.function(self._compute_eager, reduce_retracing=True)
+
+    def _compute_eager(self, images):
+        import tensorflow as tf
+
+        layers = self.model.layers if self.head is None else self.model.layers[:-1]
+        head = self.model.layers[-1]
+        with tf.GradientTape() as tape:
+            x = images
+            feature_map = None
+            for i, layer in enumerate(layers):
+                x = layer(x, training=False)
+                if i == self.layer_index:
+                    feature_map = x
+                    tape.watch(feature_map)
+            if self.head == "dense":
+                x = tf.cast(x, head.compute_dtype)
+                logits = tf.matmul(x, tf.cast(head.kernel, head.compute_dtype))
+                if head.use_bias:
+                    logits = logits + tf.cast(head.bias, head.compute_dtype)
+                predictions = head.activation(logits)
+            elif self.head == "activation":
+                logits = x
+                predictions = head(x, training=False)
+            else:
+                logits = predictions = x
+            winners = tf.argmax(predictions, axis=1)
+            # Samples are independent, so the gradient of the summed winning
+            # logits gives every sample its own gradient
+            scores = tf.gather(logits, winners, axis=1, batch_dims=1)
+        grads = tape.gradient(scores, feature_map)
+        weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * feature_map, axis=-1))
+        peak = tf.reduce_max(cams, axis=(1, 2), keepdims=True)
+        cams = tf.math.divide_no_nan(cams, peak)
+        return predictions, cams
+
+    def explain(self, batch):
+        """``batch`` is float32 (N, H, W, 3) in [0, 1]; returns (softmax, heatmaps in [0, 1])."""
+        predictions, cams = self._compute(np.asarray(batch, dtype=np.float32))
+        return predictions.numpy(), cams.numpy()
+
+
+def _jet(values):
+    # Piecewise-linear "jet" colormap without a matplotlib dependency
+    r = np.clip(1.5 - np.abs(4.0 * values - 3.0), 0.0, 1.0)
+    g = np.clip(1.5 - np.abs(4.0 * values - 2.0), 0.0, 1.0)
+    b = np.clip(1.5 - np.abs(4.0 * values - 1.0), 0.0, 1.0)
+    return np.stack([r, g, b], axis=-1)
+
+
+def render_overlay(image, heatmap, size=EXPLAIN_DEFAULT_SIZE, alpha=EXPLAIN_OVERLAY_ALPHA):
+    """Blend a heatmap over a uint8 (H, W, 3) image and return compact PNG bytes."""
+    base = Image.fromarray(image).convert("L").resize((size, size), Image.BILINEAR)
+    heat = Image.fromarray(np.uint8(np.clip(heatmap, 0.0, 1.0) * 255)).resize((size, size), Image.BILINEAR)
+    heat = np.asarray(heat, dtype=np.float32) / 255.0
+    gray = np.asarray(base, dtype=np.float32)[..., None] / 255.0
+    # Weight the colour by the heat so cold regions keep the original film
+    blend = alpha * heat[..., None]
+    overlay = gray * (1.0 - blend) + _jet(heat) * blend
+    out = io.BytesIO()
+    img = Image.fromarray(np.uint8(np.clip(overlay, 0.0, 1.0) * 255))
+    if EXPLAIN_PNG_COLORS:
+        img = img.quantize(colors=EXPLAIN_PNG_COLORS, method=Image.Quantize.MEDIANCUT)
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
@@ -0,0 +1,91 @@
+import os
+import threading
+
+import numpy as np
+
+# Settings (override through environment variables)
+# "keras" serves the .h5 model, "tflite" serves an exported .tflite model
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")
+TFLITE_MODEL_PATH = os.environ.get("TFLITE_MODEL_PATH", "")
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS", 0)) or None
+
+
+def tflite_path_for(model_path, quantization):
+    return f"{os.path.splitext(model_path)[0]}.{quantization}.tflite"
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, model_path, model=None):
+        import tensorflow as tf
+        self.model_path = model_path
+        self.model = model if model is not None else tf.keras.models.load_model(model_path)
+
+    def predict_on_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """Runs an exported .tflite model through the TFLite interpreter.
+
+    The interpreter is not thread-safe, so calls are serialized; the input
+    tensor is resized whenever the batch size changes. Quantized (int8)
+    inputs and outputs are handled using the tensor's scale/zero point.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=TFLITE_NUM_THREADS):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        shape = list(self._input['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._resize(batch.shape[0])
+            scale, zero_point = self._input['quantization']
+            if self._input['dtype'] != np.float32 and scale:
+                batch = np.round(batch / scale + zero_point).astype(self._input['dtype'])
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            scale, zero_point = self._output['quantization']
+            if self._output['dtype'] != np.float32 and scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            return np.array(output, dtype=np.float32)
+
+
+def load_backend(kind, model_path, tflite_path=None):
+    """Return the inference backend selected by ``kind`` ("keras" or "tflite")."""
+    if kind == "keras":
+        return KerasBackend(model_path)
+    if kind == "tflite":
+        path = tflite_path or tflite_path_for(model_path, "int8")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"TFLite model not found: {path}. Run export_tflite.py first.")
+        return TFLiteBackend(path)
+    raise ValueError(f"Unknown inference backend: {kind}")
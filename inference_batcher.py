@@ -0,0 +1,132 @@
+import os
+import threading
+import queue
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import BATCH_SIZE, STAGE_SECONDS
+
+# Settings (override through environment variables)
+BATCH_MAX_SIZE = int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("PREDICT_BATCH_MAX_WAIT_MS", 5))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects single-image requests and runs them through one forward pass.
+
+    Callers submit one sample (without the batch dimension) and block on the
+    returned future. A single worker thread waits for the first request, then
+    keeps collecting until either ``max_batch_size`` samples are queued or
+    ``max_wait_ms`` has elapsed, stacks them and calls ``predict_fn`` once.
+    Each caller gets back its own row of the output.
+
+    ``close`` lets the worker drain what is already queued and exit; samples
+    submitted afterwards run synchronously, so a retired batcher never hangs.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+        self._batch_sizes = Counter()
+
+    def _ensure_worker(self):
+        # Caller holds the lock. Started lazily so the thread belongs to the
+        # process that serves requests (also after a pre-fork)
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, sample):
+        future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._ensure_worker()
+                self._queue.put((sample, future, time.perf_counter()))
+        if closed:
+            try:
+                future.set_result(self.predict_fn(np.stack([sample], axis=0))[0])
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+
+    def predict(self, sample, timeout=None):
+        return self.submit(sample).result(timeout=timeout)
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        items = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            items, stop = self._collect()
+            if not items:
+                break
+            samples = [sample for sample, _, _ in items]
+            futures = [future for _, future, _ in items]
+            batch_start = time.perf_counter()
+            queue_wait = STAGE_SECONDS.labels("queue_wait")
+            for _, _, enqueued in items:
+                queue_wait.observe(batch_start - enqueued)
+            with self._lock:
+                self._batch_sizes[len(items)] += 1
+            BATCH_SIZE.labels("micro").observe(len(items))
+            try:
+                with STAGE_SECONDS.labels("model_forward").time():
+                    outputs = self.predict_fn(np.stack(samples, axis=0))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for i, future in enumerate(futures):
+                future.set_result(outputs[i])
+
+    def stats(self):
+        with self._lock:
+            sizes = dict(sorted(self._batch_sizes.items()))
+        batches = sum(sizes.values())
+        requests = sum(size * count for size, count in sizes.items())
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': batches,
+            'requests': requests,
+            'mean_batch_size': (requests / batches) if batches else 0.0,
+            'batch_size_distribution': {str(size): count for size, count in sizes.items()},
+        }
@@ -0,0 +1,239 @@
+"""Shared tf.data input pipeline for the training scripts.
+
+Replaces ``image_dataset_from_directory(...).map(normalize_data)``:
+
+    files -> shard -> parallel decode/resize (AUTOTUNE) -> cache (uint8)
+          -> shuffle -> batch -> normalize/augment per batch -> prefetch
+
+JPEG decoding only happens in the first epoch when a cache is enabled; later
+epochs read decoded uint8 images from memory or from a cache file on disk,
+a quarter of the size of the float32 batches the model sees. Labels and
+class order match ``image_dataset_from_directory`` (sorted sub-directories).
+"""
+import hashlib
+import json
+import os
+
+import tensorflow as tf
+
+AUTOTUNE = tf.data.AUTOTUNE
+IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png")
+
+# Settings (override through environment variables)
+# "memory", "" (no cache) or a directory for on-disk cache files
+INPUT_CACHE = os.environ.get("INPUT_CACHE", "memory")
+INPUT_SHUFFLE_BUFFER = int(os.environ.get("INPUT_SHUFFLE_BUFFER", 2048))
+INPUT_NUM_SHARDS = int(os.environ.get("INPUT_NUM_SHARDS", 1))
+INPUT_SHARD_INDEX = int(os.environ.get("INPUT_SHARD_INDEX", 0))
+INPUT_AUGMENT = os.environ.get("INPUT_AUGMENT", "0") == "1"
+# 1 reads splits through pre-resized shards (dataset_shards.py), written to <base>/shards
+# next to the dataset on first use; the default decodes the images (see INPUT_CACHE)
+INPUT_SHARDS = os.environ.get("INPUT_SHARDS", "0") == "1"
+# Manifest written by dedup_index.py --manifest; its listed files are left out of the train split
+INPUT_DEDUP_MANIFEST = os.environ.get("INPUT_DEDUP_MANIFEST", "")
+# 1 also leaves them out of val/test, which changes the evaluation sets
+INPUT_DEDUP_ALL_SPLITS = os.environ.get("INPUT_DEDUP_ALL_SPLITS", "0") == "1"
+INPUT_SEED = 123
+
+
+def list_image_files(directory, exclude=()):
+    """Return (paths, labels, class_names) in a fixed order, one class per sub-directory.
+
+    ``exclude`` holds paths relative to ``directory`` ("<class>/<file>") to skip.
+    """
+    exclude = set(exclude)
+    class_names = sorted(
+        d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))
+    )
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        for root, _, files in sorted(os.walk(os.path.join(directory, class_name))):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    if exclude and os.path.relpath(path, directory).replace(os.sep, "/") in exclude:
+                        continue
+                    paths.append(path)
+                    labels.append(label)
+    return paths, labels, class_names
+
+
+def dedup_exclusions(split, manifest_path=INPUT_DEDUP_MANIFEST, all_splits=INPUT_DEDUP_ALL_SPLITS):
+    """Relative paths that the dedup manifest drops from ``split``.
+
+    Empty without a manifest, and for every split but "train" unless ``all_splits``.
+    """
+    if not manifest_path or (split != "train" and not all_splits):
+        return set()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return set(manifest.get("drop", {}).get(split, {}))
+
+
+def _files_signature(paths, image_size, num_shards, shard_index):
+    # Names on-disk cache files so a changed file list or size never reuses a stale cache
+    digest = hashlib.sha256(f"{image_size}|{num_shards}|{shard_index}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _decode_and_resize(path, label, image_size):
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    # Same resize as image_dataset_from_directory (bilinear, no antialias);
+    # rounding to uint8 moves values by at most 0.5/255
+    image = tf.image.resize(image, image_size, method="bilinear")
+    return tf.cast(tf.clip_by_value(tf.round(image), 0.0, 255.0), tf.uint8), label
+
+
+def _augment_batch(images, batch_seed):
+    # Random horizontal flip and contrast change, drawn per image from the batch's stateless seed
+    flip_seed, contrast_seed = tf.unstack(tf.random.experimental.stateless_split(batch_seed, 2))
+    images = tf.image.stateless_random_flip_left_right(images, flip_seed)
+    contrast = tf.random.stateless_uniform([tf.shape(images)[0], 1, 1, 1], contrast_seed, 0.85, 1.15)
+    mean = tf.reduce_mean(images, axis=[1, 2, 3], keepdims=True)
+    return tf.clip_by_value((images - mean) * contrast + mean, 0.0, 1.0)
+
+
+def build_dataset(directory, batch_size=32, image_size=(150, 150), training=False,
+                  cache=INPUT_CACHE, shuffle_buffer=INPUT_SHUFFLE_BUFFER, augment=False,
+                  num_shards=INPUT_NUM_SHARDS, shard_index=INPUT_SHARD_INDEX,
+                  seed=INPUT_SEED, deterministic=True, exclude=()):
+    """Batched (float32 images in [0, 1], int labels) dataset for ``directory``.
+
+    ``training`` enables shuffling (reshuffled every epoch) and, with
+    ``augment``, random flips and contrast changes. ``cache`` is "memory",
+    a directory for on-disk cache files, or empty to decode every epoch.
+    Sharding splits the sorted file list, so shard ``i`` of ``n`` always
+    holds the same files. With ``deterministic`` the element order does not
+    depend on thread scheduling, only on ``seed``. ``exclude`` lists files
+    (relative to ``directory``) to leave out, e.g. from a dedup manifest.
+
+    Like ``image_dataset_from_directory``, the returned dataset carries
+    ``class_names`` and ``file_paths`` attributes.
+    """
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"❌ Directory not found: {directory}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    paths, labels, class_names = list_image_files(directory, exclude)
+    if not paths:
+        raise ValueError(f"❌ No images found in {directory}")
+    image_size = tuple(image_size)
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if num_shards > 1:
+        dataset = dataset.shard(num_shards, shard_index)
+    shard_paths = paths[shard_index::num_shards]
+
+    if training and not cache:
+        # Without a cache, shuffle the (cheap) file list before decoding
+        dataset = dataset.shuffle(len(shard_paths), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(
+        lambda path, label: _decode_and_resize(path, label, image_size),
+        num_parallel_calls=AUTOTUNE, deterministic=deterministic
+    )
+    if cache == "memory":
+        dataset = dataset.cache()
+    elif cache:
+        os.makedirs(cache, exist_ok=True)
+        signature = _files_signature(paths, image_size, num_shards, shard_index)
+        name = os.path.basename(os.path.normpath(directory))
+        dataset = dataset.cache(os.path.join(cache, f"{name}-{signature}.tfcache"))
+    if training and cache:
+        dataset = dataset.shuffle(min(shuffle_buffer, len(shard_paths)), seed=seed,
+                                  reshuffle_each_iteration=True)
+
+    dataset = _finish_batches(dataset.batch(batch_size), training and augment, seed, deterministic)
+    dataset.class_names = class_names
+    dataset.file_paths = shard_paths
+    return dataset
+
+
+def _finish_batches(dataset, augment, seed, deterministic):
+    # uint8 batches -> float32 in [0, 1] (+ augmentation), prefetched
+    def normalize(images, batch_labels):
+        return tf.cast(images, tf.float32) * (1.0 / 255.0), batch_labels
+
+    def normalize_and_augment(batch, batch_seed):
+        images, batch_labels = normalize(*batch)
+        return _augment_batch(images, batch_seed), batch_labels
+
+    if augment:
+        # One stateless seed per batch. Dataset.random draws a new sequence on
+        # every iteration (epoch), so each epoch sees new flips and contrasts,
+        # and the sequence of epochs still only depends on ``seed``
+        batch_seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+        dataset = tf.data.Dataset.zip((dataset, batch_seeds)).map(
+            normalize_and_augment, num_parallel_calls=AUTOTUNE, deterministic=deterministic
+        )
+    else:
+        dataset = dataset.map(normalize, num_parallel_calls=AUTOTUNE, deterministic=deterministic)
+    dataset = dataset.prefetch(AUTOTUNE)
+    options = tf.data.Options()
+    options.deterministic = deterministic
+    return dataset.with_options(options)
+
+
+def build_dataset_from_shards(split_dir, batch_size=32, training=False, augment=False,
+                              num_shards=INPUT_NUM_SHARDS, shard_index=INPUT_SHARD_INDEX,
+                              seed=INPUT_SEED, deterministic=True, exclude=()):
+    """Same batches as ``build_dataset``, read from shards written by dataset_shards.py.
+
+    Nothing is decoded: batches are sliced (or, when shuffled, gathered)
+    from the memory-mapped uint8 shards. Training shuffles the whole split
+    with a new permutation every epoch.
+    """
+    from dataset_shards import ShardedSplit
+
+    split = ShardedSplit(split_dir, exclude)
+    height, width = split.image_size
+    epoch = [0]
+
+    def generator():
+        epoch_seed = seed + epoch[0]
+        epoch[0] += 1
+        yield from split.batches(batch_size, shuffle=training, seed=epoch_seed,
+                                 num_shards=num_shards, shard_index=shard_index)
+
+    dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+        tf.TensorSpec((None, height, width, 3), tf.uint8),
+        tf.TensorSpec((None,), tf.int32)
+    ))
+    # A generator has unknown length; Keras needs it for steps per epoch
+    num_batches = -(-len(range(shard_index, len(split), num_shards)) // batch_size)
+    dataset = dataset.apply(tf.data.experimental.assert_cardinality(num_batches))
+    dataset = _finish_batches(dataset, training and augment, seed, deterministic)
+    dataset.class_names = split.class_names
+    dataset.file_paths = split.file_paths[shard_index::num_shards]
+    return dataset
+
+
+def load_split(path, training=False, cache=INPUT_CACHE, batch_size=32, augment=INPUT_AUGMENT,
+               use_shards=INPUT_SHARDS, seed=INPUT_SEED, dedup_manifest=INPUT_DEDUP_MANIFEST,
+               dedup_all_splits=INPUT_DEDUP_ALL_SPLITS):
+    """Dataset for one split directory (``<base>/train``, ...), through shards when enabled.
+
+    With ``use_shards`` (INPUT_SHARDS=1) the split is read from shards in
+    ``<base>/shards/<split>``, which this writes or updates first: only new
+    or changed images are decoded (once), the rest is memory-mapped, and
+    ``cache`` does not apply. Files dropped by ``dedup_manifest`` stay in
+    the shards but are never read; only the train split drops them unless
+    ``dedup_all_splits``.
+    """
+    exclude = dedup_exclusions(os.path.basename(os.path.normpath(path)), dedup_manifest, dedup_all_splits)
+    if exclude:
+        print(f"⚙️ Leaving out {len(exclude)} duplicate images from {path}")
+    if use_shards:
+        from dataset_shards import update_split
+
+        split_shards = os.path.join(os.path.dirname(os.path.normpath(path)), "shards", os.path.basename(path))
+        summary = update_split(path, split_shards, image_size=(150, 150))
+        if summary["added"] or summary["changed"] or summary["removed"]:
+            print(f"⚙️ Updated shards for {path}: +{summary['added']} added, "
+                  f"{summary['changed']} changed, {summary['removed']} removed")
+        return build_dataset_from_shards(split_shards, batch_size=batch_size, training=training,
+                                         augment=training and augment, seed=seed, exclude=exclude)
+    return build_dataset(path, batch_size=batch_size, image_size=(150, 150), training=training,
+                         cache=cache, augment=training and augment, seed=seed, exclude=exclude)
@@ -0,0 +1,157 @@
+"""BM25 inverted index over the vector store's chunks.
+
+Usage:
+    python lexical_index.py "query" [--store-dir DIR] [--k 5]      # top BM25 chunks of the current store
+
+``write_lexical_index`` runs inside ``vector_store.write_store``, so every
+generation carries its lexical index next to the FAISS index and both flip
+with CURRENT together. All of it is flat numpy arrays, memory-mapped on load::
+
+    lexical_terms.npy     sorted vocabulary (fixed-width unicode), looked up with np.searchsorted
+    lexical_indptr.npy    int64 (terms + 1) offsets of each term's postings (CSR)
+    lexical_rows.npy      int32 chunk-store row of every posting, ascending within a term
+    lexical_tf.npy        uint16 term frequency of every posting
+    lexical_idf.npy       float32 BM25 idf of every term
+    lexical_norms.npy     float32 k1 * (1 - b + b * length / average length) of every chunk
+
+With idf and the length norms precomputed, scoring a query term is one
+vectorized pass over its postings. Tokens are NFKC-normalized and
+casefolded words; hyphenated and dotted terms (drug names, "covid-19",
+ICD codes like "j18.9") are indexed whole and by their parts.
+"""
+import argparse
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TERM_LENGTH = 40
+TOKEN_RE = re.compile(r"\w+(?:[-.]\w+)*")
+PART_RE = re.compile(r"[-.]")
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have in is it its of on or that the this to was were which with
+""".split())
+FILES = ("terms", "indptr", "rows", "tf", "idf", "norms")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(unicodedata.normalize("NFKC", text).casefold()):
+        if len(token) > MAX_TERM_LENGTH or token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if PART_RE.search(token):
+            tokens.extend(part for part in PART_RE.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def _path(directory, name):
+    return os.path.join(directory, f"lexical_{name}.npy")
+
+
+def write_lexical_index(directory, texts, k1=BM25_K1, b=BM25_B):
+    """Index ``texts`` (in chunk-store row order) into ``directory``; returns the manifest entry."""
+    vocabulary = {}
+    term_ids, rows, tfs = [], [], []
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[row] = sum(counts.values())
+        for term, tf in counts.items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            rows.append(row)
+            tfs.append(tf)
+
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+    term_ids = rank[np.asarray(term_ids, dtype=np.int64)]
+    # Stable, so rows stay ascending within each term's postings
+    order = np.argsort(term_ids, kind="stable")
+    document_frequency = np.bincount(term_ids, minlength=len(terms))
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(document_frequency)
+    average_length = float(lengths.mean()) if len(texts) else 0.0
+
+    arrays = {
+        "terms": np.array(terms, dtype=f"<U{max([len(t) for t in terms] or [1])}"),
+        "indptr": indptr,
+        "rows": np.asarray(rows, dtype=np.int32)[order],
+        "tf": np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+        "idf": np.log1p((len(texts) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32),
+        "norms": (k1 * (1 - b + b * lengths / (average_length or 1.0))).astype(np.float32),
+    }
+    for name in FILES:
+        np.save(_path(directory, name), arrays[name])
+    return {"k1": k1, "b": b, "documents": len(texts), "terms": len(terms), "postings": len(rows),
+            "average_length": average_length}
+
+
+class LexicalIndex:
+    """One generation's BM25 index; ``search`` returns chunk-store rows."""
+
+    def __init__(self, directory, info):
+        self.k1 = info["k1"]
+        for name in FILES:
+            setattr(self, name, np.load(_path(directory, name), mmap_mode="r"))
+
+    @classmethod
+    def load(cls, directory, info):
+        """The index described by a manifest's ``lexical`` entry, or None for generations without one."""
+        if not info or not os.path.exists(_path(directory, "terms")):
+            return None
+        return cls(directory, info)
+
+    def term_id(self, term):
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def scores(self, query):
+        """BM25 score of every chunk for ``query`` (float32, one per row)."""
+        scores = np.zeros(len(self.norms), dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.term_id(term)
+            if i < 0:
+                continue
+            start, stop = self.indptr[i], self.indptr[i + 1]
+            rows = self.rows[start:stop]
+            tf = self.tf[start:stop].astype(np.float32)
+            # rows are unique within a term, so fancy-index accumulation is safe
+            scores[rows] += self.idf[i] * tf * (self.k1 + 1) / (tf + self.norms[rows])
+        return scores
+
+    def search(self, query, k=4):
+        """(scores, rows) of the ``k`` best chunks with any query term, best first."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = hits[np.lexsort((hits, -scores[hits]))]
+        return scores[top], top
+
+
+def main():
+    from vector_store import STORE_DIR, VectorStore
+
+    parser = argparse.ArgumentParser(description="BM25 search over the vector store's chunks.")
+    parser.add_argument("query")
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    store = VectorStore.load(args.store_dir)
+    if store.lexical is None:
+        raise SystemExit(f"❌ {store.generation} has no lexical index, run /train or rag_ingest.py to rebuild it")
+    scores, rows = store.lexical.search(args.query, args.k)
+    for score, row in zip(scores, rows):
+        document = store.chunks.document(row)
+        print(f"📄 {score:6.2f}  {document.metadata['source']} p.{document.metadata['page']}: "
+              f"{' '.join(document.page_content.split())[:100]}")
+
+
+if __name__ == "__main__":
+    main()
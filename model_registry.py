@@ -0,0 +1,229 @@
+"""Versioned model registry with background loading and atomic hot-swap.
+
+Registry layout (MODEL_REGISTRY_DIR)::
+
+    registry/
+      ACTIVE                # optional: name of the version to serve
+      v1/model.h5
+      v1/class_names.json   # ["COVID", "NORMAL", ...] in training index order
+      v2/model.h5
+      v2/model.int8.tflite  # optional, served when INFERENCE_BACKEND=tflite
+      v2/class_names.json
+
+Without an ACTIVE file the highest version (natural sort) is served. When
+the registry is missing or empty the single legacy model is served instead.
+
+Every request takes one ``ModelHandle`` at its start and uses it until it
+finishes, so a swap never changes the model under an in-flight request. The
+retired handle's micro-batcher drains its queue and exits.
+"""
+import json
+import os
+import re
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from eval_cache import EvaluationCache, file_sha256
+from fast_preprocess import TARGET_SIZE, to_model_input
+from inference_backends import KerasBackend, load_backend, tflite_path_for
+from inference_batcher import MicroBatcher, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from metrics import MODEL_LOAD_SECONDS
+
+MODEL_FILE_NAME = "model.h5"
+CLASS_NAMES_FILE = "class_names.json"
+ACTIVE_FILE = "ACTIVE"
+# Seconds between registry checks; 0 disables the watcher (admin endpoint only)
+REGISTRY_POLL_SECONDS = float(os.environ.get("MODEL_REGISTRY_POLL_SECONDS", 0))
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+class ModelHandle:
+    """One loaded, warmed model version and everything bound to it."""
+
+    def __init__(self, version, model_path, class_names, backend_kind, tflite_path=None, test_dir=None):
+        start = time.perf_counter()
+        self.model_path = model_path
+        self.class_names = list(class_names)
+        self.backend = load_backend(backend_kind, model_path, tflite_path)
+        self.sha256 = file_sha256(self.backend.model_path)
+        # The legacy single-model setup is identified by its content hash
+        self.version = version or f"legacy-{self.sha256[:12]}"
+        # Part of prediction cache keys, so cached outputs never outlive the weights
+        self.cache_tag = self.sha256[:16]
+        self.batcher = MicroBatcher(
+            lambda batch: self.backend.predict_on_batch(to_model_input(batch)),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS
+        )
+        self.evaluation = None
+        if test_dir:
+            self.evaluation = EvaluationCache(
+                self.backend.model_path, test_dir, self.class_names, model_hash=self.sha256
+            )
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self.warm_up()
+        self.load_seconds = time.perf_counter() - start
+
+    def warm_up(self):
+        # First call traces/allocates; do it before the handle takes traffic
+        width, height = TARGET_SIZE
+        output = self.backend.predict_on_batch(np.zeros((1, height, width, 3), dtype=np.float32))
+        if output.shape[-1] != len(self.class_names):
+            raise ValueError(
+                f"Model {self.version} has {output.shape[-1]} outputs but {len(self.class_names)} class names"
+            )
+
+    def explainer(self):
+        # Built on first use; a TFLite-served version loads its Keras model
+        # only for explanations, since gradients need the full graph
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    from gradcam import GradCAM
+                    if isinstance(self.backend, KerasBackend):
+                        keras_model = self.backend.model
+                    else:
+                        keras_model = KerasBackend(self.model_path).model
+                    self._explainer = GradCAM(keras_model)
+        return self._explainer
+
+    def retire(self):
+        self.batcher.close()
+
+
+class ModelManager:
+    """Holds the active ModelHandle and swaps in new versions without downtime."""
+
+    def __init__(self, registry_dir, legacy_model_path, legacy_class_names, backend_kind,
+                 tflite_path=None, test_dir=None, poll_seconds=REGISTRY_POLL_SECONDS):
+        self.registry_dir = registry_dir
+        self.legacy_model_path = legacy_model_path
+        self.legacy_class_names = list(legacy_class_names)
+        self.backend_kind = backend_kind
+        self.tflite_path = tflite_path
+        self.test_dir = test_dir
+        self.poll_seconds = poll_seconds
+        self._current = None
+        self._swap_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._loading = None
+        self._last_error = None
+        self._watcher = None
+
+    # ------------------ Registry ------------------ #
+    def list_versions(self):
+        if not self.registry_dir or not os.path.isdir(self.registry_dir):
+            return []
+        return sorted(
+            (d for d in os.listdir(self.registry_dir)
+             if os.path.isfile(os.path.join(self.registry_dir, d, MODEL_FILE_NAME))),
+            key=_natural_key
+        )
+
+    def target_version(self):
+        versions = self.list_versions()
+        if not versions:
+            return None
+        active_path = os.path.join(self.registry_dir, ACTIVE_FILE)
+        if os.path.exists(active_path):
+            with open(active_path, "r", encoding="utf-8") as f:
+                active = f.read().strip()
+            if active in versions:
+                return active
+            print(f"⚠️ ACTIVE names unknown version {active!r}, serving latest")
+        return versions[-1]
+
+    def _build_handle(self, version):
+        if version is None:
+            return ModelHandle(
+                None, self.legacy_model_path, self.legacy_class_names,
+                self.backend_kind, self.tflite_path, self.test_dir
+            )
+        version_dir = os.path.join(self.registry_dir, version)
+        with open(os.path.join(version_dir, CLASS_NAMES_FILE), "r", encoding="utf-8") as f:
+            class_names = json.load(f)
+        model_path = os.path.join(version_dir, MODEL_FILE_NAME)
+        return ModelHandle(
+            version, model_path, class_names, self.backend_kind,
+            tflite_path_for(model_path, "int8"), self.test_dir
+        )
+
+    # ------------------ Loading and swapping ------------------ #
+    @property
+    def current(self):
+        return self._current
+
+    def load(self, version=None):
+        """Load ``version`` (default: registry target), warm it and swap it in."""
+        with self._swap_lock:
+            if version is None:
+                version = self.target_version()
+            if self._current is not None and self._current.version == version:
+                return self._current
+            print(f"⚙️ Loading model version {version or 'legacy'}...")
+            handle = self._build_handle(version)
+            if handle.evaluation is not None:
+                handle.evaluation.start(handle.backend)
+            previous, self._current = self._current, handle
+            MODEL_LOAD_SECONDS.set(handle.load_seconds)
+            print(f"✅ Serving model version {handle.version} (loaded in {handle.load_seconds:.1f}s)")
+        if previous is not None:
+            previous.retire()
+        return handle
+
+    def load_in_background(self, version=None):
+        with self._state_lock:
+            if self._loading is not None and self._loading.is_alive():
+                return False
+            self._loading = threading.Thread(target=self._load_safely, args=(version,),
+                                             name="model-reload", daemon=True)
+            self._loading.start()
+            return True
+
+    def _load_safely(self, version):
+        try:
+            self.load(version)
+            self._last_error = None
+        except Exception as e:
+            print("Error loading model version:", e)
+            traceback.print_exc()
+            self._last_error = f"{version}: {e}"
+
+    # ------------------ Watcher ------------------ #
+    def ensure_watcher(self):
+        # Called per request: threads do not survive a pre-fork, so every
+        # worker process starts its own watcher on first use
+        if self.poll_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        with self._state_lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                target = self.target_version()
+                current = self._current
+                if target is not None and (current is None or current.version != target):
+                    self._load_safely(target)
+            except Exception as e:
+                print("Error watching model registry:", e)
+
+    def status(self):
+        loading = self._loading is not None and self._loading.is_alive()
+        return {
+            'active_version': self._current.version if self._current else None,
+            'available_versions': self.list_versions(),
+            'target_version': self.target_version(),
+            'loading': loading,
+            'last_error': self._last_error
+        }
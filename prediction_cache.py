@@ -0,0 +1,178 @@
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Settings (override through environment variables)
+CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", 10000))
+CACHE_MAX_BYTES = int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Empty disables on-disk persistence
+CACHE_DIR = os.environ.get("PREDICTION_CACHE_DIR", "")
+# Size cap of the on-disk tier, 0 for unbounded
+CACHE_DISK_MAX_BYTES = int(os.environ.get("PREDICTION_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+# Eviction trims the disk tier to this fraction of its cap, so the
+# directory is not rescanned on every write once it is full
+DISK_LOW_WATER = 0.9
+
+
+def content_key(data, model_version):
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{model_version}-{digest}"
+
+
+class PredictionCache:
+    """LRU cache of model outputs keyed by upload content hash and model version.
+
+    The in-memory tier is bounded by both ``max_entries`` and ``max_bytes``
+    (size of the stored arrays). When ``cache_dir`` is set every entry is also
+    written there as a ``.npy`` file and memory misses fall back to disk, so
+    the cache survives restarts. The directory is bounded by
+    ``disk_max_bytes``: past it the least recently written or read files
+    (by mtime) are deleted. Workers sharing the directory each rescan it
+    when evicting, so ``disk_bytes`` is exact only right after a scan.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, cache_dir=CACHE_DIR,
+                 disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.cache_dir = cache_dir or None
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            self._evict_disk()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def _disk_files(self):
+        """(mtime, size, path) of every entry file in the cache directory."""
+        files = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def _evict_disk(self):
+        if self.disk_max_bytes <= 0 or self._disk_bytes <= self.disk_max_bytes:
+            return
+        with self._disk_lock:
+            files = sorted(self._disk_files())
+            total = sum(size for _, size, _ in files)
+            target = int(self.disk_max_bytes * DISK_LOW_WATER)
+            evicted = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    evicted += 1
+                except FileNotFoundError:
+                    # Another worker sharing the directory got there first
+                    pass
+                except OSError as e:
+                    print(f"⚠️ Could not evict prediction cache file {path}: {e}")
+                    continue
+                total -= size
+            with self._lock:
+                self._disk_bytes = total
+                self.disk_evictions += evicted
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).nbytes
+        if value.nbytes > self.max_bytes or self.max_entries < 1:
+            return
+        self._entries[key] = value
+        self._bytes += value.nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        if self.cache_dir:
+            try:
+                value = np.load(self._disk_path(key), allow_pickle=False)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                try:
+                    # Reads count as use, so eviction by mtime is LRU
+                    now = time.time()
+                    os.utime(self._disk_path(key), (now, now))
+                except OSError:
+                    pass
+                with self._lock:
+                    self._store(key, value)
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        value = np.array(value, copy=True)
+        value.setflags(write=False)
+        with self._lock:
+            self._store(key, value)
+        if self.cache_dir:
+            tmp_path = self._disk_path(key) + ".tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, value, allow_pickle=False)
+                    size = f.tell()
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"⚠️ Could not persist prediction cache entry {key}: {e}")
+            else:
+                with self._lock:
+                    self._disk_bytes += size
+                self._evict_disk()
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'persistent': self.cache_dir is not None,
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'hit_rate': ((self.hits + self.disk_hits) / lookups) if lookups else 0.0
+            }
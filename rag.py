@@ -1,15 +1,12 @@
 import os
 import gradio as gr
-from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.chat_models import ChatOpenAI
 from langchain.embeddings import HuggingFaceEmbeddings
 
-from pdf2image import convert_from_path
-import pytesseract
+from rag_ingest import extract_folder
 
 # ✅ Set your OpenRouter API credentials
 os.environ["OPENAI_API_KEY"] = ""
@@ -18,50 +15,18 @@ os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
 # 📁 Folder path
 FOLDER_PATH = r"E:\chest_xray\03. LLM medical diagnosis report generation Eric Topol"
 
-# --------- OCR Fallback ---------
-def extract_text_with_ocr(pdf_path):
-    try:
-        pages = convert_from_path(pdf_path, dpi=300)
-        extracted = []
-        for i, page_image in enumerate(pages):
-            text = pytesseract.image_to_string(page_image)
-            extracted.append((i + 1, text.strip()))
-        return extracted
-    except Exception as e:
-        print(f"❌ OCR failed for {pdf_path}: {str(e)}")
-        return []
-
 # --------- RAG Initialization ---------
 def initialize_rag_from_folder(folder_path):
     try:
         print("🔍 Loading PDFs from folder:", folder_path)
-        documents = []
         pdf_files = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith(".pdf")]
         print(f"📄 Found {len(pdf_files)} PDFs.")
 
-        for path in pdf_files:
-            print(f"📘 Processing: {os.path.basename(path)}")
-            with open(path, "rb") as f:
-                pdf = PdfReader(f)
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    print(f"→ Page {i + 1} - Text Extracted: {bool(text)}")
-                    if text and text.strip():
-                        documents.append(Document(
-                            page_content=text,
-                            metadata={"source": os.path.basename(path), "page": i + 1}
-                        ))
-
-            # OCR fallback if no text extracted
-            if not any(doc.metadata["source"] == os.path.basename(path) for doc in documents):
-                print(f"🔁 Falling back to OCR for: {os.path.basename(path)}")
-                ocr_texts = extract_text_with_ocr(path)
-                for page_num, text in ocr_texts:
-                    if text:
-                        documents.append(Document(
-                            page_content=text,
-                            metadata={"source": os.path.basename(path), "page": page_num}
-                        ))
+        # Files and page ranges are extracted in parallel; only pages without a text layer are OCRed
+        documents = []
+        for path, num_pages, file_documents in extract_folder(pdf_files):
+            print(f"📘 Processed: {os.path.basename(path)} ({num_pages} pages, {len(file_documents)} with text)")
+            documents.extend(file_documents)
 
         if not documents:
             raise ValueError("No valid text found in PDFs.")
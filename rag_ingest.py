@@ -0,0 +1,284 @@
+"""Incremental PDF ingestion into the native vector store (vector_store.py).
+
+Usage:
+    python rag_ingest.py [--folder DIR] [--store-dir DIR] [--rebuild] [--workers N]
+
+Each generation's manifest keeps one record per PDF: content SHA-256, size,
+mtime, page count and the contiguous chunk-id range of its chunks. An
+update only extracts, splits and embeds PDFs that are new or whose content
+changed (size and mtime are checked first, the hash only when they
+differ); vectors of changed and deleted PDFs are removed by id, and the
+result is merged with the unchanged vectors into a new generation.
+
+The index type comes from ``VECTOR_INDEX`` (see vector_store.py). Flat,
+IVF and PQ indexes are updated in place; the index is rebuilt over all
+chunks when another type is requested, when an HNSW index would have to
+delete vectors (HNSW cannot), and when a trained index has outgrown the
+data it was trained on. Rebuilds take the unchanged chunks' vectors from
+the embedding cache. The BM25 index (lexical_index.py) is rebuilt over all
+chunks with every generation; tokenizing is cheap next to embedding.
+
+Extraction runs in a process pool over page ranges (``extract_folder``).
+Pages with a text layer are read with pypdf; only pages without one are
+rasterized, one page at a time, and OCRed.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import numpy as np
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from eval_cache import file_sha256
+from vector_store import (
+    EMBEDDING_MODEL, FOLDER_PATH, STORE_DIR, VectorStore, build_index, index_config, index_is_stale, load_embeddings,
+    read_manifest, write_store
+)
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 200
+OCR_DPI = 300
+# Settings (override through environment variables)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_PAGES_PER_TASK = int(os.environ.get("INGEST_PAGES_PER_TASK", 16))
+
+
+# ------------------ ✅ Extraction engine ------------------ #
+def ocr_page(pdf_path, page_number, dpi=OCR_DPI):
+    """OCR text of one page; only that page is rasterized, and the image is dropped right after."""
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return pytesseract.image_to_string(images[0]).strip() if images else ""
+
+
+def extract_page_range(path, first_page, last_page):
+    """[(page, text, used_ocr)] for pages ``first_page``..``last_page`` (1-based, inclusive).
+
+    Pages with a text layer are read directly; only pages without one are OCRed.
+    """
+    results = []
+    with open(path, "rb") as f:
+        pdf = PdfReader(f)
+        for number in range(first_page, last_page + 1):
+            text = pdf.pages[number - 1].extract_text()
+            if text and text.strip():
+                results.append((number, text, False))
+                continue
+            try:
+                text = ocr_page(path, number)
+            except Exception as e:
+                print(f"❌ OCR failed for {os.path.basename(path)} page {number}: {str(e)}")
+                continue
+            if text:
+                results.append((number, text, True))
+    return results
+
+
+def _page_count(path):
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def extract_folder(paths, workers=INGEST_WORKERS, pages_per_task=INGEST_PAGES_PER_TASK):
+    """Yield (path, page count, Documents) for every PDF in ``paths``, in order.
+
+    Each file is cut into page ranges and the ranges of all files are spread
+    over a process pool. At most two ranges per worker are in flight and a
+    file's pages are released as soon as it is yielded, so memory stays
+    bounded by the window, not by the size of the corpus.
+    """
+    counts = [_page_count(path) for path in paths]
+    tasks = [(i, path, first, min(first + pages_per_task - 1, count))
+             for i, (path, count) in enumerate(zip(paths, counts)) for first in range(1, count + 1, pages_per_task)]
+    remaining = [0] * len(paths)
+    for i, *_ in tasks:
+        remaining[i] += 1
+    pages = [[] for _ in paths]
+    next_file = 0
+
+    def finished_files():
+        nonlocal next_file
+        while next_file < len(paths) and remaining[next_file] == 0:
+            path = paths[next_file]
+            source = os.path.basename(path)
+            documents = [Document(page_content=text, metadata={"source": source, "page": number})
+                         for number, text, _ in sorted(pages[next_file])]
+            pages[next_file] = None
+            yield path, counts[next_file], documents
+            next_file += 1
+
+    if workers <= 1 or len(tasks) <= 1:
+        for i, path, first, last in tasks:
+            pages[i].extend(extract_page_range(path, first, last))
+            remaining[i] -= 1
+            yield from finished_files()
+        yield from finished_files()
+        return
+
+    pending = {}
+    queue = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit():
+            for i, path, first, last in islice(queue, 2 * workers - len(pending)):
+                pending[pool.submit(extract_page_range, path, first, last)] = i
+
+        submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                pages[i].extend(future.result())
+                remaining[i] -= 1
+            submit()
+            yield from finished_files()
+    yield from finished_files()
+
+
+def extract_pdf(path):
+    """(page count, Documents) for one PDF, in this process."""
+    _, num_pages, documents = next(extract_folder([path], workers=1))
+    return num_pages, documents
+
+
+def split_documents(documents):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return splitter.split_documents(documents)
+
+
+def _scan_folder(folder_path):
+    files = {}
+    for name in sorted(os.listdir(folder_path)):
+        if name.endswith(".pdf"):
+            path = os.path.join(folder_path, name)
+            stat = os.stat(path)
+            files[name] = (path, stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def update_store(folder_path=FOLDER_PATH, store_dir=STORE_DIR, embedding_model=EMBEDDING_MODEL, rebuild=False,
+                 workers=INGEST_WORKERS):
+    """Bring the store in line with the PDFs in ``folder_path``.
+
+    Returns (summary, VectorStore of the new generation or None when nothing changed).
+    """
+    start = time.perf_counter()
+    scanned = _scan_folder(folder_path)
+    if not scanned:
+        raise ValueError(f"No PDFs found in {folder_path}")
+
+    _, manifest = (None, None) if rebuild else read_manifest(store_dir)
+    if manifest is not None and (manifest.get("embedding_model") != embedding_model or "files" not in manifest):
+        # Other embeddings, or a migrated store without per-PDF records
+        print("⚙️ Existing store cannot be updated in place, rebuilding")
+        manifest = None
+    records = dict(manifest["files"]) if manifest else {}
+
+    unchanged, changed, added = [], [], []
+    for name, (path, size, mtime_ns) in scanned.items():
+        record = records.get(name)
+        if record is None:
+            added.append(name)
+        elif record["size"] == size and record["mtime_ns"] == mtime_ns:
+            unchanged.append(name)
+        elif record["sha256"] == file_sha256(path):
+            # Touched or copied over with the same bytes: keep its chunks
+            record.update(size=size, mtime_ns=mtime_ns)
+            unchanged.append(name)
+        else:
+            changed.append(name)
+    removed = sorted(set(records) - set(scanned))
+    summary = {"added": len(added), "changed": len(changed), "removed": len(removed), "unchanged": len(unchanged)}
+
+    requested = index_config()
+    if (manifest is not None and not (added or changed or removed) and "lexical" in manifest
+            and not index_is_stale(manifest.get("index", {"type": "flat"}), requested, manifest["count"])):
+        summary.update(chunks=manifest["count"], seconds=time.perf_counter() - start)
+        return summary, None
+
+    # ------------------ Keep the vectors of unchanged PDFs ------------------ #
+    previous = VectorStore.load(store_dir, mmap=False) if manifest is not None else None
+    rebuild_index = previous is None
+    if previous is not None:
+        index = previous.index
+        index_info = previous.manifest.get("index", {"type": "flat"})
+        dropped = np.concatenate([np.arange(*records[name]["chunk_ids"], dtype=np.int64)
+                                  for name in changed + removed] or [np.zeros(0, np.int64)])
+        if len(dropped) and index_info["type"] == "hnsw":
+            rebuild_index = True
+        elif len(dropped):
+            index.remove_ids(dropped)
+        chunks = previous.chunks
+        keep_rows = np.flatnonzero(~np.isin(chunks.ids, dropped))
+        chunk_ids = [int(chunks.ids[row]) for row in keep_rows]
+        texts = [chunks.text(row) for row in keep_rows]
+        sources = [chunks.sources[chunks.source_ids[row]] for row in keep_rows]
+        pages = [int(chunks.pages[row]) for row in keep_rows]
+        next_id = previous.manifest["next_id"]
+    else:
+        index, index_info, chunk_ids, texts, sources, pages, next_id = None, None, [], [], [], [], 0
+    files = {name: records[name] for name in unchanged}
+
+    # ------------------ Extract, split and embed new or changed PDFs ------------------ #
+    new_texts = []
+    to_extract = added + changed
+    for path, num_pages, documents in extract_folder([scanned[name][0] for name in to_extract], workers):
+        name = os.path.basename(path)
+        _, size, mtime_ns = scanned[name]
+        print(f"📘 Processed: {name} ({num_pages} pages, {len(documents)} with text)")
+        file_chunks = split_documents(documents)
+        files[name] = {
+            "sha256": file_sha256(path), "size": size, "mtime_ns": mtime_ns, "pages": num_pages,
+            "chunk_ids": [next_id, next_id + len(file_chunks)],
+        }
+        for chunk in file_chunks:
+            chunk_ids.append(next_id)
+            texts.append(chunk.page_content)
+            sources.append(name)
+            pages.append(chunk.metadata.get("page", 0))
+            new_texts.append(chunk.page_content)
+            next_id += 1
+
+    if not chunk_ids:
+        raise ValueError("No valid text found in PDFs.")
+    metric = previous.manifest["metric"] if previous else "l2"
+    rebuild_index = rebuild_index or index_is_stale(index_info, requested, len(chunk_ids))
+    if rebuild_index or new_texts:
+        embeddings = load_embeddings(embedding_model)
+        hits_before = getattr(embeddings, "hits", 0)
+        if rebuild_index:
+            print(f"🔗 Building the {requested['type']} index over {len(texts)} chunks "
+                  f"({len(new_texts)} new)...")
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            index, index_info = build_index(vectors, chunk_ids, metric, requested)
+        else:
+            print(f"🔗 Embedding {len(new_texts)} new chunks...")
+            vectors = np.asarray(embeddings.embed_documents(new_texts), dtype=np.float32)
+            index.add_with_ids(vectors, np.asarray(chunk_ids[len(chunk_ids) - len(new_texts):], dtype=np.int64))
+        summary["embedding_cache_hits"] = getattr(embeddings, "hits", 0) - hits_before
+    generation = write_store(store_dir, index, np.asarray(chunk_ids, dtype=np.int64), texts, sources, pages,
+                             embedding_model, metric, files=files, next_id=next_id, index_info=index_info)
+    summary.update(chunks=len(chunk_ids), embedded=len(new_texts), index=index_info["type"],
+                   generation=generation, seconds=time.perf_counter() - start)
+    return summary, VectorStore.load(store_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index a folder of PDFs.")
+    parser.add_argument("--folder", default=FOLDER_PATH)
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing store and re-embed everything")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="extraction/OCR processes")
+    args = parser.parse_args()
+    summary, _ = update_store(args.folder, args.store_dir, rebuild=args.rebuild, workers=args.workers)
+    print(f"✅ +{summary['added']} added, {summary['changed']} changed, {summary['removed']} removed, "
+          f"{summary['unchanged']} unchanged -> {summary['chunks']} chunks in {summary['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
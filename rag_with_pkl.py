@@ -1,16 +1,11 @@
 import os
 import gradio as gr
-import pickle
-from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_community.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.chat_models import ChatOpenAI
-from langchain.embeddings import HuggingFaceEmbeddings
 
-from pdf2image import convert_from_path
-import pytesseract
+from rag_ingest import extract_folder
+from vector_store import build_store, current_generation, open_store
 
 # ✅ Set your OpenRouter API credentials
 os.environ["OPENAI_API_KEY"] = ""
@@ -18,51 +13,21 @@ os.environ["OPENAI_API_BASE"] = "https://openrouter.ai/api/v1"
 
 # 📁 Folder path
 FOLDER_PATH = r"E:\chest_xray\03. LLM medical diagnosis report generation Eric Topol"
+# Legacy pickled store, migrated to STORE_DIR on first use
 PKL_PATH = os.path.join(FOLDER_PATH, "faiss_vector_store.pkl")
-
-# --------- OCR Fallback ---------
-def extract_text_with_ocr(pdf_path):
-    try:
-        pages = convert_from_path(pdf_path, dpi=300)
-        extracted = []
-        for i, page_image in enumerate(pages):
-            text = pytesseract.image_to_string(page_image)
-            extracted.append((i + 1, text.strip()))
-        return extracted
-    except Exception as e:
-        print(f"❌ OCR failed for {pdf_path}: {str(e)}")
-        return []
+STORE_DIR = os.path.join(FOLDER_PATH, "vector_store")
 
 # --------- Vector Store Initialization ---------
-def build_and_save_vector_store(folder_path, pkl_path):
+def build_and_save_vector_store(folder_path, store_dir):
     print("🔍 Loading PDFs from folder:", folder_path)
-    documents = []
     pdf_files = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith(".pdf")]
     print(f"📄 Found {len(pdf_files)} PDFs.")
 
-    for path in pdf_files:
-        print(f"📘 Processing: {os.path.basename(path)}")
-        with open(path, "rb") as f:
-            pdf = PdfReader(f)
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                print(f"→ Page {i + 1} - Text Extracted: {bool(text)}")
-                if text and text.strip():
-                    documents.append(Document(
-                        page_content=text,
-                        metadata={"source": os.path.basename(path), "page": i + 1}
-                    ))
-
-            # OCR fallback if no text extracted
-            if not any(doc.metadata["source"] == os.path.basename(path) for doc in documents):
-                print(f"🔁 Falling back to OCR for: {os.path.basename(path)}")
-                ocr_texts = extract_text_with_ocr(path)
-                for page_num, text in ocr_texts:
-                    if text:
-                        documents.append(Document(
-                            page_content=text,
-                            metadata={"source": os.path.basename(path), "page": page_num}
-                        ))
+    # Files and page ranges are extracted in parallel; only pages without a text layer are OCRed
+    documents = []
+    for path, num_pages, file_documents in extract_folder(pdf_files):
+        print(f"📘 Processed: {os.path.basename(path)} ({num_pages} pages, {len(file_documents)} with text)")
+        documents.extend(file_documents)
 
     if not documents:
         raise ValueError("No valid text found in PDFs.")
@@ -71,26 +36,14 @@ def build_and_save_vector_store(folder_path, pkl_path):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=200)
     chunks = text_splitter.split_documents(documents)
 
-    print("🔗 Generating embeddings...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.from_documents(chunks, embedding=embeddings)
-
-    print(f"💾 Saving vector store to {pkl_path}")
-    with open(pkl_path, "wb") as f:
-        pickle.dump(vector_store, f)
-
-    return vector_store
-
-def load_vector_store(pkl_path):
-    print(f"📦 Loading vector store from {pkl_path}")
-    with open(pkl_path, "rb") as f:
-        return pickle.load(f)
+    print(f"🔗 Generating embeddings and saving vector store to {store_dir}")
+    return build_store(store_dir, chunks)
 
-def initialize_rag_with_pkl(folder_path, pkl_path):
-    if os.path.exists(pkl_path):
-        vector_store = load_vector_store(pkl_path)
+def initialize_rag_with_pkl(folder_path, store_dir, pkl_path=PKL_PATH):
+    if current_generation(store_dir) is not None or os.path.exists(pkl_path):
+        vector_store = open_store(store_dir, pkl_path)
     else:
-        vector_store = build_and_save_vector_store(folder_path, pkl_path)
+        vector_store = build_and_save_vector_store(folder_path, store_dir)
 
     print("🤖 Loading LLM via OpenRouter...")
     llm = ChatOpenAI(
@@ -133,7 +86,7 @@ def chat_with_rag(chat_history, query, pipeline):
 
 # --------- Gradio Chatbot UI ---------
 def create_chatbot_interface():
-    pipeline = initialize_rag_with_pkl(FOLDER_PATH, PKL_PATH)
+    pipeline = initialize_rag_with_pkl(FOLDER_PATH, STORE_DIR, PKL_PATH)
     if pipeline is None:
         print("❌ Error initializing RAG pipeline. Check folder and PDFs.")
 
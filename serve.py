@@ -0,0 +1,149 @@
+"""Production pre-fork server for flask_pneumonia_api.
+
+Usage:
+    python serve.py [--workers N] [--tf-threads T] [--request-threads R] [--port 5000]
+
+Runs N gunicorn workers. With preloading the master process loads the model
+once and forks, so the read-only weights are shared copy-on-write. Each
+worker is pinned to its own slice of CPU cores and TensorFlow / TFLite are
+capped to ``--tf-threads`` intra-op threads (inter-op 1).
+
+Picking worker and thread counts for C physical cores:
+  - Throughput first (many concurrent uploads): T = 1 and N = C. Every core
+    runs its own forward passes; the micro-batcher still groups requests
+    inside a worker.
+  - Latency first (few, large requests): T = 2..4 and N = C // T, so a single
+    forward pass can spread over several cores.
+  - Keep N * T <= C. Oversubscribing makes TensorFlow threads fight over
+    cores and is slower than either option above.
+  - R request threads per worker (default 4) only need to be high enough for
+    the micro-batcher to see concurrent requests; they mostly wait on I/O.
+``python serve.py --plan`` prints the resulting layout without starting.
+Memory grows by roughly one activation workspace per worker, not one model.
+
+Copy-on-write sharing needs the model loaded before the fork, which is only
+safe for the TFLite backend (INFERENCE_BACKEND=tflite, see export_tflite.py):
+TensorFlow's runtime thread pools do not survive fork() and workers
+deadlock on their first predict. ``--preload auto`` (default) therefore
+preloads for TFLite and lets each worker load its own copy for Keras.
+bench_serving.py measures throughput from 1 to N workers.
+"""
+import argparse
+import os
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_workers(cores, tf_threads, workers=None):
+    """Return one list of pinned core ids per worker."""
+    tf_threads = max(1, tf_threads)
+    if workers is None:
+        workers = max(1, len(cores) // tf_threads)
+    return [
+        [cores[(i * tf_threads + j) % len(cores)] for j in range(tf_threads)]
+        for i in range(workers)
+    ]
+
+
+def configure_inference_threads(tf_threads):
+    # Must run before TensorFlow creates its thread pools (i.e. before the
+    # model is loaded), which is why it happens ahead of importing the app
+    os.environ.setdefault("TFLITE_NUM_THREADS", str(tf_threads))
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(tf_threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    if os.environ.get("INFERENCE_BACKEND", "keras") == "keras":
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def build_application(options, tf_threads, layout):
+    from gunicorn.app.base import BaseApplication
+
+    # pid -> layout slot of every live worker, kept in the arbiter
+    slots = {}
+
+    def pre_fork(server, worker):
+        # Runs in the arbiter before the fork, when the new worker has no pid
+        # yet; workers forked since the last call are recorded here instead
+        for pid, live in server.WORKERS.items():
+            slots.setdefault(pid, live.core_slot)
+        taken = set(slots.values())
+        # A replacement takes the lowest slot freed by child_exit
+        worker.core_slot = next((i for i in range(len(layout)) if i not in taken), len(slots) % len(layout))
+
+    def post_fork(server, worker):
+        cores = layout[worker.core_slot]
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        server.log.info("Worker %s pinned to cores %s (slot %s)", worker.pid, cores, worker.core_slot)
+
+    def child_exit(server, worker):
+        slots.pop(worker.pid, None)
+
+    class PreforkApplication(BaseApplication):
+        def __init__(self):
+            self.options = dict(options, pre_fork=pre_fork, post_fork=post_fork, child_exit=child_exit)
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            configure_inference_threads(tf_threads)
+            from flask_pneumonia_api import app
+            return app
+
+    return PreforkApplication()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=None, help="default: cores // tf-threads")
+    parser.add_argument("--tf-threads", type=int, default=1)
+    parser.add_argument("--request-threads", type=int, default=4)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--preload", choices=["auto", "yes", "no"], default="auto",
+                        help="load the model in the master before forking (auto: TFLite only)")
+    parser.add_argument("--plan", action="store_true", help="print the worker layout and exit")
+    args = parser.parse_args()
+
+    cores = available_cores()
+    layout = plan_workers(cores, args.tf_threads, args.workers)
+    if len(layout) * args.tf_threads > len(cores):
+        print(f"⚠️ {len(layout)} workers x {args.tf_threads} threads oversubscribes {len(cores)} cores")
+    print(f"✅ {len(cores)} cores, {len(layout)} workers, {args.tf_threads} inference threads each")
+    for i, worker_cores in enumerate(layout):
+        print(f"   worker {i + 1}: cores {worker_cores}")
+    if args.plan:
+        return
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit("❌ gunicorn is required for serve.py: pip install gunicorn")
+
+    backend = os.environ.get("INFERENCE_BACKEND", "keras")
+    preload = args.preload == "yes" or (args.preload == "auto" and backend == "tflite")
+    print(f"✅ Backend {backend}, model {'shared by preload' if preload else 'loaded per worker'}")
+
+    options = {
+        'bind': f"{args.host}:{args.port}",
+        'workers': len(layout),
+        'worker_class': "gthread",
+        'threads': args.request_threads,
+        'preload_app': preload,
+        'timeout': args.timeout,
+    }
+    build_application(options, args.tf_threads, layout).run()
+
+
+if __name__ == "__main__":
+    main()
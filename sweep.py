@@ -0,0 +1,360 @@
+"""Parallel hyperparameter sweep for the lung disease CNN with ASHA early stopping.
+
+Usage:
+    python sweep.py [--space space.json] [--trials 20] [--workers N] [--cores-per-worker C]
+                    [--min-epochs 1] [--max-epochs 27] [--eta 3] [--name NAME]
+                    [--registry-version V]
+
+Trials run in a pool of worker processes, each pinned to its own slice of
+cores (serve.py's layout) with TensorFlow capped to that many threads, so
+N workers x C cores never oversubscribe the machine.
+
+Early stopping is asynchronous successive halving: at every rung (epochs
+min_epochs * eta**k) a trial records its validation loss and only keeps
+training while it is among the best 1/eta of the trials that reached that
+rung so far. Poor configurations stop after a few epochs and free their
+worker for the next trial.
+
+Results live in ``<sweep dir>/sweep.sqlite`` (tables ``trials`` and
+``rungs``). The trial with the lowest validation loss is evaluated on the
+test split and exported as ``<sweep dir>/best/model.h5`` +
+``class_names.json`` (the model registry layout); ``--registry-version``
+also copies it into MODEL_REGISTRY_DIR, where flask_pneumonia_api.py
+picks it up.
+
+Search space file (JSON), every key optional::
+
+    {"learning_rate": {"log_uniform": [1e-4, 3e-3]},
+     "dense_units": {"choice": [128, 256, 512]},
+     "dropout": {"uniform": [0.2, 0.6]},
+     "conv_filters": {"choice": [[32, 64, 128, 256], [16, 32, 64, 128]]}}
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import shutil
+import sqlite3
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+
+from serve import available_cores, plan_workers
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+train_path = os.path.join(base_path, "train")
+val_path = os.path.join(base_path, "val")
+test_path = os.path.join(base_path, "test")
+sweeps_path = os.path.join(base_path, "sweeps")
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", os.path.join(base_path, "model_registry"))
+
+DEFAULT_SPACE = {
+    "learning_rate": {"log_uniform": [1e-4, 3e-3]},
+    "dense_units": {"choice": [128, 256, 512]},
+    "dropout": {"uniform": [0.2, 0.6]},
+    "conv_filters": {"choice": [[16, 32, 64, 128], [32, 64, 128, 256], [32, 64, 128]]},
+}
+SWEEP_SEED = 123
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, spec in space.items():
+        if "choice" in spec:
+            params[name] = spec["choice"][int(rng.integers(len(spec["choice"])))]
+        elif "uniform" in spec:
+            low, high = spec["uniform"]
+            params[name] = float(rng.uniform(low, high))
+        elif "log_uniform" in spec:
+            low, high = spec["log_uniform"]
+            params[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            raise ValueError(f"Unknown search space spec for {name}: {spec}")
+    return params
+
+
+def rung_epochs(min_epochs, max_epochs, eta):
+    rungs = []
+    epoch = max(1, min_epochs)
+    while epoch < max_epochs:
+        rungs.append(epoch)
+        epoch *= eta
+    return rungs
+
+
+# ------------------ ✅ Results table ------------------ #
+def connect(db_path):
+    # Autocommit; writers take an IMMEDIATE lock when they need a consistent read
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def create_tables(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS trials (
+            trial_id INTEGER PRIMARY KEY,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,          -- pending, running, stopped, completed, failed
+            epochs INTEGER DEFAULT 0,
+            best_val_loss REAL,
+            best_val_accuracy REAL,
+            mean_epoch_seconds REAL,
+            model_path TEXT,
+            error TEXT,
+            started REAL,
+            finished REAL
+        );
+        CREATE TABLE IF NOT EXISTS rungs (
+            trial_id INTEGER NOT NULL,
+            epoch INTEGER NOT NULL,
+            val_loss REAL NOT NULL,
+            PRIMARY KEY (trial_id, epoch)
+        );
+    """)
+
+
+def record_rung(conn, trial_id, epoch, val_loss, eta):
+    """Record a rung result; True when the trial is in the top 1/eta at this rung and continues."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT OR REPLACE INTO rungs VALUES (?, ?, ?)", (trial_id, epoch, val_loss))
+        losses = sorted(row[0] for row in conn.execute("SELECT val_loss FROM rungs WHERE epoch = ?", (epoch,)))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    keep = len(losses) // eta
+    # Too few results at this rung to judge yet: keep going
+    return keep == 0 or val_loss <= losses[keep - 1]
+
+
+# ------------------ ✅ Worker processes ------------------ #
+_worker_data = None
+CORE_SLICE_WAIT_SECONDS = 5
+
+
+def _init_worker(core_slices, threads):
+    # A worker the pool starts to replace a dead one finds no free slice (the
+    # dead worker never returned its own); it runs unpinned instead of blocking.
+    # The short wait only covers the parent's queue feeder thread at startup
+    try:
+        cores = core_slices.get(timeout=CORE_SLICE_WAIT_SECONDS)
+    except queue.Empty:
+        cores = None
+        print(f"⚠️ No free core slice for worker {os.getpid()}, running it unpinned")
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _datasets(train_dir, val_dir):
+    # Loaded once per worker and reused by every trial it runs
+    global _worker_data
+    if _worker_data is None:
+        from input_pipeline import load_split
+        _worker_data = (load_split(train_dir, training=True), load_split(val_dir))
+    return _worker_data
+
+
+def run_trial(task):
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import ReduceLROnPlateau
+
+    from training_utils import EpochTimer, build_model, compile_model
+
+    trial_id, params, config = task
+    conn = connect(config["db_path"])
+    conn.execute("UPDATE trials SET status = 'running', started = ? WHERE trial_id = ?", (time.time(), trial_id))
+    try:
+        train, val = _datasets(config["train_dir"], config["val_dir"])
+        tf.keras.utils.set_random_seed(SWEEP_SEED + trial_id)
+        model = compile_model(build_model(
+            len(train.class_names),
+            conv_filters=tuple(params.get("conv_filters", (32, 64, 128, 256))),
+            dense_units=int(params.get("dense_units", 256)),
+            dropout=float(params.get("dropout", 0.5))
+        ), learning_rate=float(params.get("learning_rate", 0.001)), jit_compile=False)
+
+        rungs = set(config["rungs"])
+        best = {"val_loss": float("inf"), "val_accuracy": None, "weights": None}
+        stopped = [False]
+
+        class Asha(tf.keras.callbacks.Callback):
+            def on_epoch_end(self, epoch, logs=None):
+                if logs["val_loss"] < best["val_loss"]:
+                    best.update(val_loss=float(logs["val_loss"]), val_accuracy=float(logs["val_accuracy"]),
+                                weights=self.model.get_weights())
+                conn.execute("UPDATE trials SET epochs = ? WHERE trial_id = ?", (epoch + 1, trial_id))
+                if epoch + 1 in rungs and not record_rung(conn, trial_id, epoch + 1, float(logs["val_loss"]),
+                                                          config["eta"]):
+                    stopped[0] = True
+                    self.model.stop_training = True
+
+        timer = EpochTimer()
+        model.fit(train, validation_data=val, epochs=config["max_epochs"], verbose=0,
+                  callbacks=[ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3), Asha(), timer])
+
+        if best["weights"] is None:
+            raise ValueError("validation loss never became finite")
+        model.set_weights(best["weights"])
+        trial_dir = os.path.join(config["sweep_dir"], "trials", f"trial-{trial_id:04d}")
+        os.makedirs(trial_dir, exist_ok=True)
+        model_path = os.path.join(trial_dir, "model.h5")
+        model.save(model_path)
+        with open(os.path.join(trial_dir, "class_names.json"), "w", encoding="utf-8") as f:
+            json.dump(train.class_names, f)
+        status = "stopped" if stopped[0] else "completed"
+        conn.execute(
+            "UPDATE trials SET status = ?, best_val_loss = ?, best_val_accuracy = ?, mean_epoch_seconds = ?, "
+            "model_path = ?, finished = ? WHERE trial_id = ?",
+            (status, best["val_loss"], best["val_accuracy"], float(np.mean(timer.epoch_seconds)),
+             model_path, time.time(), trial_id)
+        )
+        return trial_id, status, len(timer.epoch_seconds), best["val_loss"], best["val_accuracy"]
+    except Exception as e:
+        traceback.print_exc()
+        conn.execute("UPDATE trials SET status = 'failed', error = ?, finished = ? WHERE trial_id = ?",
+                     (str(e), time.time(), trial_id))
+        return trial_id, "failed", 0, None, None
+    finally:
+        conn.close()
+
+
+# ------------------ ✅ Export ------------------ #
+def export_best(conn, sweep_dir, train_dir, test_dir, registry_version=None):
+    row = conn.execute(
+        "SELECT trial_id, params, best_val_loss, best_val_accuracy, model_path FROM trials "
+        "WHERE status IN ('stopped', 'completed') ORDER BY best_val_loss ASC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        print("❌ No trial finished successfully, nothing to export")
+        return None
+    trial_id, params, val_loss, val_accuracy, model_path = row
+
+    import tensorflow as tf
+    from input_pipeline import load_split
+
+    # The model's output order is the train split's, saved with each trial
+    class_names_path = os.path.join(os.path.dirname(model_path), "class_names.json")
+    if os.path.exists(class_names_path):
+        with open(class_names_path, "r", encoding="utf-8") as f:
+            class_names = json.load(f)
+    else:
+        class_names = load_split(train_dir).class_names
+    test = load_split(test_dir)
+    if list(test.class_names) != list(class_names):
+        print(f"❌ Test classes {test.class_names} do not match the training classes {class_names}, "
+              f"not exporting trial {trial_id}")
+        return None
+    model = tf.keras.models.load_model(model_path)
+    test_loss, test_accuracy = model.evaluate(test, verbose=0)
+
+    targets = [os.path.join(sweep_dir, "best")]
+    if registry_version:
+        targets.append(os.path.join(MODEL_REGISTRY_DIR, registry_version))
+    for target in targets:
+        os.makedirs(target, exist_ok=True)
+        with open(os.path.join(target, "class_names.json"), "w", encoding="utf-8") as f:
+            json.dump(class_names, f)
+        # Model file last: the registry watcher only sees a version once model.h5 exists
+        shutil.copyfile(model_path, os.path.join(target, "model.h5.tmp"))
+        os.replace(os.path.join(target, "model.h5.tmp"), os.path.join(target, "model.h5"))
+    print(f"\n✅ Best trial {trial_id}: val_loss {val_loss:.4f}, val_accuracy {val_accuracy * 100:.2f}%, "
+          f"test_accuracy {test_accuracy * 100:.2f}%")
+    print(f"   params: {params}")
+    print(f"✅ Exported to: {', '.join(targets)}")
+    return {"trial_id": trial_id, "test_loss": test_loss, "test_accuracy": test_accuracy}
+
+
+def print_results(conn, limit=10):
+    rows = conn.execute(
+        "SELECT trial_id, status, epochs, best_val_loss, best_val_accuracy, mean_epoch_seconds, params "
+        "FROM trials ORDER BY best_val_loss IS NULL, best_val_loss ASC LIMIT ?", (limit,)
+    ).fetchall()
+    print(f"\n{'trial':>5} {'status':<10} {'epochs':>6} {'val_loss':>9} {'val_acc':>8} {'s/epoch':>8}  params")
+    for trial_id, status, epochs, val_loss, val_accuracy, seconds, params in rows:
+        val_loss = f"{val_loss:9.4f}" if val_loss is not None else f"{'-':>9}"
+        val_accuracy = f"{val_accuracy * 100:7.2f}%" if val_accuracy is not None else f"{'-':>8}"
+        seconds = f"{seconds:8.2f}" if seconds is not None else f"{'-':>8}"
+        print(f"{trial_id:>5} {status:<10} {epochs:>6} {val_loss} {val_accuracy} {seconds}  {params}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep with ASHA early stopping.")
+    parser.add_argument("--space", default=None, help="search space JSON file (default: DEFAULT_SPACE)")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cores-per-worker", type=int, default=2)
+    parser.add_argument("--min-epochs", type=int, default=1)
+    parser.add_argument("--max-epochs", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--name", default=datetime.now().strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--registry-version", default=None,
+                        help="also copy the best model to <MODEL_REGISTRY_DIR>/<version>")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, "r", encoding="utf-8") as f:
+            space = json.load(f)
+    sweep_dir = os.path.join(sweeps_path, args.name)
+    os.makedirs(sweep_dir, exist_ok=True)
+    db_path = os.path.join(sweep_dir, "sweep.sqlite")
+    conn = connect(db_path)
+    create_tables(conn)
+
+    # Decode new images into the shared shards once, before workers open them
+    from input_pipeline import INPUT_SHARDS
+    if INPUT_SHARDS:
+        from dataset_shards import update_split
+        for split in (train_path, val_path, test_path):
+            update_split(split, os.path.join(os.path.dirname(split), "shards", os.path.basename(split)))
+
+    rng = np.random.default_rng(SWEEP_SEED)
+    first_id = (conn.execute("SELECT MAX(trial_id) FROM trials").fetchone()[0] or 0) + 1
+    tasks = []
+    for trial_id in range(first_id, first_id + args.trials):
+        params = sample_params(space, rng)
+        conn.execute("INSERT INTO trials (trial_id, params, status) VALUES (?, ?, 'pending')",
+                     (trial_id, json.dumps(params)))
+        tasks.append((trial_id, params, None))
+
+    layout = plan_workers(available_cores(), args.cores_per_worker, args.workers)
+    config = {
+        "db_path": db_path, "sweep_dir": sweep_dir, "train_dir": train_path, "val_dir": val_path,
+        "rungs": rung_epochs(args.min_epochs, args.max_epochs, args.eta),
+        "max_epochs": args.max_epochs, "eta": args.eta,
+    }
+    tasks = [(trial_id, params, config) for trial_id, params, _ in tasks]
+    print(f"⚙️ {len(tasks)} trials on {len(layout)} workers x {args.cores_per_worker} cores, "
+          f"rungs at epochs {config['rungs']} (max {args.max_epochs}), results in {db_path}")
+
+    # spawn: TensorFlow's thread pools do not survive fork()
+    context = multiprocessing.get_context("spawn")
+    core_slices = context.Queue()
+    for cores in layout:
+        core_slices.put(cores)
+    start = time.perf_counter()
+    with context.Pool(len(layout), initializer=_init_worker, initargs=(core_slices, args.cores_per_worker)) as pool:
+        for trial_id, status, epochs, val_loss, val_accuracy in pool.imap_unordered(run_trial, tasks):
+            detail = f"val_loss {val_loss:.4f}" if val_loss is not None else "see traceback above"
+            print(f"{'✅' if status != 'failed' else '❌'} Trial {trial_id} {status} after {epochs} epochs, {detail}")
+    print(f"\n✅ Sweep finished in {time.perf_counter() - start:.1f}s")
+
+    print_results(conn)
+    export_best(conn, sweep_dir, train_path, test_path, args.registry_version)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
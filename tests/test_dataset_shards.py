@@ -0,0 +1,82 @@
+"""dataset_shards.update_split keeps shards in line with the source folder, including compaction."""
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+import dataset_shards  # noqa: E402
+from dataset_shards import ShardedSplit, update_split  # noqa: E402
+
+# 8x8 images resize to themselves, so stored pixels equal the source pixels
+IMAGE_SIZE = (8, 8)
+SHARD_SIZE = 4
+
+
+def write_image(path, value):
+    pixels = np.full(IMAGE_SIZE + (3,), value, dtype=np.uint8)
+    pixels[0, 0] = (value * 7) % 256  # not a flat image, so a transposed row would show
+    with open(path, "wb") as f:
+        f.write(tf.io.encode_png(pixels).numpy())
+    return pixels
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 10))
+
+
+def assert_matches(split_dir, expected, class_names):
+    split = ShardedSplit(split_dir)
+    assert split.class_names == class_names
+    assert sorted(split.file_paths) == sorted(expected)
+    images = split.take(np.arange(len(split)))
+    for i, rel in enumerate(split.file_paths):
+        assert np.array_equal(images[i], expected[rel])
+        assert split.labels[i] == class_names.index(rel.split("/")[0])
+    # No orphaned shard files next to the manifest
+    manifest = dataset_shards._read_manifest(split_dir)
+    on_disk = sorted(name for name in os.listdir(split_dir) if name.endswith(".npy"))
+    assert on_disk == sorted(s["file"] for s in manifest["shards"])
+
+
+def test_update_touch_change_delete_compact(tmp_path):
+    source, split_dir = tmp_path / "train", str(tmp_path / "shards" / "train")
+    class_names = ["NORMAL", "PNEUMONIA"]
+    expected = {}
+    for label, class_name in enumerate(class_names):
+        os.makedirs(source / class_name)
+        for i in range(8):
+            rel = f"{class_name}/img{i}.png"
+            expected[rel] = write_image(str(source / rel), 10 * i + 100 * label)
+
+    summary = update_split(str(source), split_dir, IMAGE_SIZE, shard_size=SHARD_SIZE)
+    assert (summary["images"], summary["added"], summary["shards"]) == (16, 16, 4)
+    assert_matches(split_dir, expected, class_names)
+
+    # Touched but identical: nothing is decoded again
+    bump_mtime(str(source / "NORMAL/img0.png"))
+    summary = update_split(str(source), split_dir, IMAGE_SIZE, shard_size=SHARD_SIZE)
+    assert (summary["added"], summary["changed"], summary["removed"]) == (0, 0, 0)
+    assert_matches(split_dir, expected, class_names)
+
+    # Changed content: stored under a new shard row, the old row is dead
+    expected["NORMAL/img1.png"] = write_image(str(source / "NORMAL/img1.png"), 250)
+    bump_mtime(str(source / "NORMAL/img1.png"))
+    summary = update_split(str(source), split_dir, IMAGE_SIZE, shard_size=SHARD_SIZE)
+    assert (summary["added"], summary["changed"], summary["compacted"]) == (0, 1, False)
+    assert_matches(split_dir, expected, class_names)
+
+    # Deleting past COMPACT_DEAD_FRACTION copies the live rows into fresh shards
+    for i in range(2, 7):
+        os.remove(str(source / f"PNEUMONIA/img{i}.png"))
+        del expected[f"PNEUMONIA/img{i}.png"]
+    summary = update_split(str(source), split_dir, IMAGE_SIZE, shard_size=SHARD_SIZE)
+    assert (summary["removed"], summary["compacted"], summary["images"]) == (5, True, 11)
+    assert summary["shards"] == -(-11 // SHARD_SIZE)
+    assert_matches(split_dir, expected, class_names)
+
+    # Excluded files are hidden without touching the shards
+    split = ShardedSplit(split_dir, exclude={"NORMAL/img3.png"})
+    assert "NORMAL/img3.png" not in split.file_paths and len(split) == 10
@@ -0,0 +1,193 @@
+"""Incremental ingestion (rag_ingest.update_store) keeps the store consistent.
+
+Builds a store from a few tiny PDFs, then adds, touches, changes and
+deletes files, checking after every step that the per-PDF chunk-id
+ranges, the FAISS index, the chunk store and searches agree.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("pypdf")
+pytest.importorskip("langchain")
+
+import rag_ingest  # noqa: E402
+import vector_store  # noqa: E402
+from langchain.embeddings.base import Embeddings  # noqa: E402
+
+MODEL = "test-hash-embeddings"
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors, so tests need no model download."""
+
+    dimension = 128
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1.0
+        return (vector / max(np.linalg.norm(vector), 1e-6)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with one Helvetica text line per entry of each page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "BT /F1 9 Tf 30 800 Td 11 TL " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+
+def write_document(folder, name, keyword, num_pages=3):
+    # Every line is unique, so no two chunks share a text (or a vector)
+    pages = [[f"{keyword} {name} page {page} line {line} lung finding note {line * page}" for line in range(12)]
+             for page in range(1, num_pages + 1)]
+    path = os.path.join(folder, name)
+    write_pdf(path, pages)
+    return path
+
+
+def bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def assert_consistent(store, folder, keywords):
+    manifest = store.manifest
+    chunks = store.chunks
+    ids = np.asarray(chunks.ids)
+    assert sorted(manifest["files"]) == sorted(f for f in os.listdir(folder) if f.endswith(".pdf"))
+    assert np.all(np.diff(ids) > 0), "chunk ids must be stored in ascending order"
+    assert store.index.ntotal == len(ids) == manifest["count"]
+    assert manifest["next_id"] >= ids.max() + 1
+
+    # The per-PDF ranges are disjoint, cover every chunk, and hold only that PDF's chunks
+    ranges = [np.arange(*record["chunk_ids"]) for record in manifest["files"].values()]
+    assert np.array_equal(np.sort(np.concatenate(ranges)), ids)
+    for name, record in manifest["files"].items():
+        rows = chunks.rows(np.arange(*record["chunk_ids"]))
+        assert len(rows) and (rows >= 0).all()
+        assert {chunks.document(row).metadata["source"] for row in rows} == {name}
+
+    # Row lookups: every id maps to its own row, unknown ids (and FAISS's -1 padding) to -1
+    assert np.array_equal(chunks.rows(ids), np.arange(len(ids)))
+    assert (chunks.rows([-1, int(ids.max()) + 1, int(ids.max()) + 1000]) == -1).all()
+
+    # Every vector in the index is found under its own chunk id
+    vectors = np.asarray(HashEmbeddings().embed_documents([chunks.text(row) for row in range(len(ids))]),
+                         dtype=np.float32)
+    _, found = store.search(vectors, 1)
+    assert np.array_equal(found[:, 0], ids)
+
+    # A document's keyword finds only that document, lexically and through the hybrid retriever
+    for name, keyword in keywords.items():
+        _, rows = store.lexical.search(keyword, 5)
+        assert len(rows) and {chunks.document(row).metadata["source"] for row in rows} == {name}
+        assert store.hybrid_search(keyword, k=1)[0].metadata["source"] == name
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    monkeypatch.setitem(vector_store._embeddings, MODEL, HashEmbeddings())
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_add_touch_change_delete(tmp_path, monkeypatch, embeddings, index_type):
+    monkeypatch.setattr(rag_ingest, "index_config", lambda: vector_store.index_config(index_type))
+    folder, store_dir = str(tmp_path / "pdfs"), str(tmp_path / "store")
+    os.makedirs(folder)
+
+    def update():
+        return rag_ingest.update_store(folder, store_dir, MODEL, workers=1)
+
+    keywords = {"a.pdf": "alphazulu", "b.pdf": "bravozulu", "c.pdf": "charliezulu"}
+    for name, keyword in keywords.items():
+        write_document(folder, name, keyword)
+    summary, store = update()
+    assert (summary["added"], summary["embedded"]) == (3, store.manifest["count"])
+    assert store.manifest["index"]["type"] == index_type
+    assert_consistent(store, folder, keywords)
+    first_ranges = {name: record["chunk_ids"] for name, record in store.manifest["files"].items()}
+
+    # Add: only the new PDF is embedded, existing ranges are kept
+    keywords["d.pdf"] = "deltazulu"
+    write_document(folder, "d.pdf", "deltazulu", num_pages=2)
+    summary, store = update()
+    assert (summary["added"], summary["unchanged"]) == (1, 3)
+    assert summary["embedded"] == np.subtract(*store.manifest["files"]["d.pdf"]["chunk_ids"][::-1])
+    assert all(store.manifest["files"][name]["chunk_ids"] == r for name, r in first_ranges.items())
+    assert_consistent(store, folder, keywords)
+
+    # Touch: same bytes, new mtime; nothing is re-extracted or re-embedded
+    bump_mtime(os.path.join(folder, "a.pdf"))
+    summary, unchanged_store = update()
+    assert unchanged_store is None
+    assert (summary["added"], summary["changed"], summary["removed"], summary["unchanged"]) == (0, 0, 0, 4)
+
+    # Change: the old range is removed and the new chunks get fresh ids past next_id
+    next_id = store.manifest["next_id"]
+    keywords["b.pdf"] = "brandnewzulu"
+    write_document(folder, "b.pdf", "brandnewzulu", num_pages=4)
+    bump_mtime(os.path.join(folder, "b.pdf"), 20)
+    summary, store = update()
+    assert (summary["changed"], summary["unchanged"]) == (1, 3)
+    assert store.manifest["files"]["b.pdf"]["chunk_ids"][0] == next_id
+    assert not store.chunks.documents(np.arange(*first_ranges["b.pdf"]))
+    assert not len(store.lexical.search("bravozulu", 5)[1])
+    assert_consistent(store, folder, keywords)
+
+    # Delete
+    os.remove(os.path.join(folder, "c.pdf"))
+    del keywords["c.pdf"]
+    summary, store = update()
+    assert (summary["removed"], summary["unchanged"]) == (1, 3)
+    assert not store.chunks.documents(np.arange(*first_ranges["c.pdf"]))
+    assert_consistent(store, folder, keywords)
+
+    # A full rebuild gives the same documents under fresh ids
+    summary, rebuilt = rag_ingest.update_store(folder, store_dir, MODEL, rebuild=True, workers=1)
+    assert sorted(rebuilt.manifest["files"]) == sorted(store.manifest["files"])
+    assert rebuilt.manifest["count"] == store.manifest["count"]
+    assert_consistent(rebuilt, folder, keywords)
+
+
+def test_switching_index_type_rebuilds(tmp_path, monkeypatch, embeddings):
+    folder, store_dir = str(tmp_path / "pdfs"), str(tmp_path / "store")
+    os.makedirs(folder)
+    keywords = {"a.pdf": "alphazulu", "b.pdf": "bravozulu"}
+    for name, keyword in keywords.items():
+        write_document(folder, name, keyword)
+    monkeypatch.setattr(rag_ingest, "index_config", lambda: vector_store.index_config("flat"))
+    rag_ingest.update_store(folder, store_dir, MODEL, workers=1)
+
+    monkeypatch.setattr(rag_ingest, "index_config", lambda: vector_store.index_config("hnsw"))
+    summary, store = rag_ingest.update_store(folder, store_dir, MODEL, workers=1)
+    assert store is not None and summary["embedded"] == 0
+    assert store.manifest["index"]["type"] == "hnsw"
+    assert_consistent(store, folder, keywords)
@@ -7,6 +7,7 @@ import numpy as np
 from tensorflow.keras.preprocessing.image import load_img, img_to_array
 from tkinter import filedialog
 from tkinter import Tk
+from input_pipeline import INPUT_AUGMENT, build_dataset
 
 # Suppress the root Tkinter window
 root = Tk()
@@ -18,42 +19,11 @@ train_path = os.path.join(base_path, "train")
 val_path = os.path.join(base_path, "val")
 test_path = os.path.join(base_path, "test")
 
-# Load datasets
-train_dataset = tf.keras.utils.image_dataset_from_directory(
-    train_path,
-    labels="inferred",
-    label_mode="int",
-    batch_size=32,
-    image_size=(150, 150),
-    seed=123
-)
-
-val_dataset = tf.keras.utils.image_dataset_from_directory(
-    val_path,
-    labels="inferred",
-    label_mode="int",
-    batch_size=32,
-    image_size=(150, 150),
-    seed=123
-)
-
-test_dataset = tf.keras.utils.image_dataset_from_directory(
-    test_path,
-    labels="inferred",
-    label_mode="int",
-    batch_size=32,
-    image_size=(150, 150),
-    seed=123
-)
-
-# Normalize pixel values
-def normalize_data(image, label):
-    image = tf.cast(image, tf.float32) / 255.0  # Normalize to [0, 1]
-    return image, label
-
-train_dataset = train_dataset.map(normalize_data)
-val_dataset = val_dataset.map(normalize_data)
-test_dataset = test_dataset.map(normalize_data)
+# Load datasets (parallel decode, cache, shuffle and prefetch: input_pipeline.py)
+train_dataset = build_dataset(train_path, batch_size=32, image_size=(150, 150), training=True,
+                              augment=INPUT_AUGMENT, seed=123)
+val_dataset = build_dataset(val_path, batch_size=32, image_size=(150, 150))
+test_dataset = build_dataset(test_path, batch_size=32, image_size=(150, 150), cache="")
 
 # Define the CNN model
 model = tf.keras.Sequential([
@@ -0,0 +1,198 @@
+"""Model definition, compile-level modes and resumable checkpoints for training.
+
+Modes (opt-in, environment variables):
+    TRAIN_JIT_COMPILE=1          XLA-compile the train/eval steps (Keras leaves
+                                 XLA off on CPU-only machines by default)
+    TRAIN_MIXED_PRECISION=1      mixed_bfloat16 policy: bfloat16 compute with
+                                 float32 weights; the softmax stays float32
+
+``ResumableCheckpoint`` saves weights, optimizer slots, step counter and
+learning rate every ``every_epochs`` epochs, together with the EarlyStopping
+and ReduceLROnPlateau counters. ``fit`` resumes from the latest checkpoint
+with ``initial_epoch`` set, so a crash at epoch 40 costs at most a few
+epochs. The saved model is always plain float32, whatever the mode.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+
+# Settings (override through environment variables)
+TRAIN_JIT_COMPILE = os.environ.get("TRAIN_JIT_COMPILE", "0") == "1"
+TRAIN_MIXED_PRECISION = os.environ.get("TRAIN_MIXED_PRECISION", "0") == "1"
+CHECKPOINT_EVERY_EPOCHS = int(os.environ.get("TRAIN_CHECKPOINT_EVERY_EPOCHS", 1))
+CHECKPOINTS_TO_KEEP = 3
+STATE_FILE = "training_state.json"
+# EarlyStopping's best weights as of checkpoint N: best-<N>.weights.npz
+BEST_WEIGHTS_PATTERN = "best-{:06d}.weights.npz"
+
+
+def configure_precision(mixed_precision=TRAIN_MIXED_PRECISION):
+    # Must run before the model is built; the policy is process-wide
+    tf.keras.mixed_precision.set_global_policy("mixed_bfloat16" if mixed_precision else "float32")
+
+
+def build_model(num_classes, input_shape=(150, 150, 3), conv_filters=(32, 64, 128, 256),
+                dense_units=256, dropout=0.5):
+    """The lung disease CNN from becterial_pheumonia.py (uses the current precision policy)."""
+    layers = [tf.keras.Input(shape=input_shape)]
+    for filters in conv_filters:
+        layers.append(tf.keras.layers.Conv2D(filters, (3, 3), activation='relu'))
+        layers.append(tf.keras.layers.MaxPooling2D((2, 2)))
+    layers += [
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(dense_units, activation='relu'),
+        tf.keras.layers.Dropout(dropout),
+        # float32 output keeps the softmax and the loss numerically stable
+        tf.keras.layers.Dense(num_classes, activation='softmax', dtype="float32")
+    ]
+    return tf.keras.Sequential(layers)
+
+
+def compile_model(model, learning_rate=0.001, jit_compile=TRAIN_JIT_COMPILE):
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=jit_compile
+    )
+    return model
+
+
+def to_float32_model(model, build_fn):
+    """Copy trained weights into a float32 twin built by ``build_fn`` for saving/serving."""
+    if model.dtype_policy.name == "float32":
+        return model
+    policy = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy("float32")
+    try:
+        twin = build_fn()
+    finally:
+        tf.keras.mixed_precision.set_global_policy(policy)
+    twin.set_weights(model.get_weights())
+    return twin
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Wall time per epoch (the first one includes tracing / XLA compilation)."""
+
+    def __init__(self):
+        super().__init__()
+        self.epoch_seconds = []
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._start
+        self.epoch_seconds.append(seconds)
+        if logs is not None:
+            logs["epoch_seconds"] = seconds
+
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """Periodic training checkpoints with automatic resume.
+
+    Call ``restore()`` after compiling and before ``fit``; it returns the
+    epoch to pass as ``initial_epoch``. ``callbacks`` are the EarlyStopping /
+    ReduceLROnPlateau instances whose counters are saved too. Put this
+    callback after them in the fit() list: they reset their counters in
+    ``on_train_begin`` and the saved values are put back right after.
+    """
+
+    def __init__(self, checkpoint_dir, callbacks=(), every_epochs=CHECKPOINT_EVERY_EPOCHS):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.tracked = list(callbacks)
+        self.every_epochs = max(int(every_epochs), 1)
+        self._manager = None
+        self._pending_state = None
+
+    def _checkpoint_manager(self):
+        if self._manager is None:
+            checkpoint = tf.train.Checkpoint(model=self.model, optimizer=self.model.optimizer)
+            self._manager = tf.train.CheckpointManager(checkpoint, self.checkpoint_dir, CHECKPOINTS_TO_KEEP)
+        return self._manager
+
+    def _state_path(self):
+        return os.path.join(self.checkpoint_dir, STATE_FILE)
+
+    def restore(self, model):
+        """Load the latest checkpoint into ``model``; returns the epoch to resume from (0 if none)."""
+        self.set_model(model)
+        if not os.path.exists(self._state_path()):
+            return 0
+        with open(self._state_path(), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        # Slot variables must exist before a restore can fill them
+        model.optimizer.build(model.trainable_variables)
+        if state.get("best_weights"):
+            # EarlyStopping(restore_best_weights=True) keeps its best weights in memory
+            with np.load(os.path.join(self.checkpoint_dir, state["best_weights"])) as saved:
+                state["best_weights_values"] = [saved[f"arr_{i}"] for i in range(len(saved.files))]
+        self._checkpoint_manager().checkpoint.restore(state["checkpoint"]).assert_existing_objects_matched()
+        model.optimizer.learning_rate = state["learning_rate"]
+        self._pending_state = state
+        print(f"✅ Resuming training from {state['checkpoint']} (epoch {state['epoch']})")
+        return state["epoch"]
+
+    def on_train_begin(self, logs=None):
+        state, self._pending_state = self._pending_state, None
+        if state is None:
+            return
+        for callback in self.tracked:
+            saved = state["callbacks"].get(type(callback).__name__)
+            if not saved:
+                continue
+            for name, value in saved.items():
+                setattr(callback, name, value)
+            if isinstance(callback, EarlyStopping) and state.get("best_weights_values") is not None:
+                callback.best_weights = state["best_weights_values"]
+
+    def on_epoch_end(self, epoch, logs=None):
+        if (epoch + 1) % self.every_epochs:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._checkpoint_manager().save(checkpoint_number=epoch + 1)
+        # Saved from EarlyStopping itself at checkpoint time, so the best
+        # weights, the checkpoint and the counters describe the same epoch
+        best_weights = None
+        for callback in self.tracked:
+            if isinstance(callback, EarlyStopping) and callback.best_weights is not None:
+                best_weights = BEST_WEIGHTS_PATTERN.format(epoch + 1)
+                np.savez(os.path.join(self.checkpoint_dir, best_weights), *callback.best_weights)
+        callbacks_state = {}
+        for callback in self.tracked:
+            if isinstance(callback, EarlyStopping):
+                callbacks_state["EarlyStopping"] = {
+                    "wait": callback.wait, "best": float(callback.best), "best_epoch": callback.best_epoch
+                }
+            elif isinstance(callback, ReduceLROnPlateau):
+                callbacks_state["ReduceLROnPlateau"] = {
+                    "wait": callback.wait, "best": float(callback.best), "cooldown_counter": callback.cooldown_counter
+                }
+        state = {
+            "checkpoint": path,
+            "epoch": epoch + 1,
+            "learning_rate": float(self.model.optimizer.learning_rate),
+            "callbacks": callbacks_state,
+            "best_weights": best_weights,
+        }
+        # The state names its checkpoint, so a crash between the two writes
+        # resumes from the previous, still complete checkpoint
+        tmp_path = self._state_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path())
+        for name in os.listdir(self.checkpoint_dir):
+            if name.startswith("best-") and name.endswith(".weights.npz") and name != best_weights:
+                os.remove(os.path.join(self.checkpoint_dir, name))
+
+    def clear(self):
+        # Called once the final model is saved: a finished run is never resumed
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
@@ -0,0 +1,177 @@
+"""Transfer learning with a frozen, pretrained backbone and cached features.
+
+Usage:
+    python transfer_learning.py --weights PATH [--backbone MobileNetV2] [--epochs 50]
+                                [--model-file PATH | --registry-version V] [--overwrite]
+
+The backbone (ImageNet weights from a local ``include_top=False`` file, no
+download) runs once per split; its pooled feature vectors are cached under
+``<base_path>/feature_cache`` keyed by backbone weights, split contents and
+the files the dedup manifest leaves out. Only the small classification head
+is trained, on the cached features, so an epoch takes seconds. Reruns with
+unchanged data skip the backbone entirely. Augmentation does not apply
+here: every image has one feature vector.
+
+The saved model is the full network (scaling -> backbone -> pooling ->
+head) taking 150x150 RGB in [0, 1], like the CNN in becterial_pheumonia.py,
+so flask_pneumonia_api.py serves it unchanged (MODEL_PATH or a registry
+version).
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+
+from eval_cache import dataset_manifest_hash, file_sha256
+from input_pipeline import dedup_exclusions, load_split
+
+# ------------------ ✅ Paths ------------------ #
+base_path = r"E:\chest_xray\Lung Disease Dataset"
+train_path = os.path.join(base_path, "train")
+val_path = os.path.join(base_path, "val")
+test_path = os.path.join(base_path, "test")
+model_save_path = os.path.join(base_path, "trained_model")
+model_file = os.path.join(model_save_path, "lung_disease_model1.h5")
+feature_cache_path = os.path.join(base_path, "feature_cache")
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", os.path.join(base_path, "model_registry"))
+
+IMAGE_SIZE = (150, 150)
+
+# Backbone -> (constructor, scale, offset) mapping our [0, 1] input to the
+# range the pretrained weights expect
+BACKBONES = {
+    "MobileNetV2": (tf.keras.applications.MobileNetV2, 2.0, -1.0),
+    "ResNet50V2": (tf.keras.applications.ResNet50V2, 2.0, -1.0),
+    "Xception": (tf.keras.applications.Xception, 2.0, -1.0),
+    "EfficientNetB0": (tf.keras.applications.EfficientNetB0, 255.0, 0.0),  # rescales internally
+}
+
+
+def build_feature_extractor(backbone_name, weights_path):
+    constructor, scale, offset = BACKBONES[backbone_name]
+    backbone = constructor(include_top=False, weights=weights_path, input_shape=IMAGE_SIZE + (3,))
+    backbone.trainable = False
+    # Pooling stays a separate top-level layer so Grad-CAM (gradcam.py) finds
+    # the backbone as the last 4D feature map of the served model
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=IMAGE_SIZE + (3,)),
+        tf.keras.layers.Rescaling(scale, offset),
+        backbone,
+        tf.keras.layers.GlobalAveragePooling2D(),
+    ], name=f"{backbone_name.lower()}_features")
+
+
+def build_head(feature_dim, num_classes):
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=(feature_dim,)),
+        tf.keras.layers.Dense(256, activation='relu'),
+        tf.keras.layers.Dropout(0.5),
+        tf.keras.layers.Dense(num_classes, activation='softmax')
+    ], name="head")
+
+
+def cached_features(extractor, split_path, cache_dir, weights_hash):
+    """(features, labels, class_names) for a split, computed at most once per data/weights state."""
+    key = f"{weights_hash[:12]}-{dataset_manifest_hash(split_path)[:12]}"
+    exclude = dedup_exclusions(os.path.basename(os.path.normpath(split_path)))
+    if exclude:
+        # load_split leaves these files out, so they are part of the data state
+        key += "-" + hashlib.sha256("\n".join(sorted(exclude)).encode("utf-8")).hexdigest()[:12]
+    cache_file = os.path.join(cache_dir, f"{os.path.basename(split_path)}-{extractor.name}-{key}.npz")
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            print(f"✅ Using cached features: {cache_file}")
+            return cached["features"], cached["labels"], [str(c) for c in cached["class_names"]]
+
+    print(f"⚙️ Extracting {extractor.name} features for {split_path}...")
+    start = time.perf_counter()
+    dataset = load_split(split_path, cache="")
+    features, labels = [], []
+    for images, batch_labels in dataset:
+        features.append(extractor.predict_on_batch(images))
+        labels.append(batch_labels.numpy())
+    features = np.concatenate(features).astype(np.float32)
+    labels = np.concatenate(labels).astype(np.int32)
+    print(f"✅ {len(labels)} images in {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = cache_file + ".tmp.npz"
+    np.savez(tmp_file, features=features, labels=labels, class_names=np.array(dataset.class_names))
+    os.replace(tmp_file, cache_file)
+    return features, labels, dataset.class_names
+
+
+def feature_dataset(features, labels, training, batch_size=32):
+    dataset = tf.data.Dataset.from_tensor_slices((features, labels))
+    if training:
+        dataset = dataset.shuffle(len(labels), seed=123, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a classification head on cached backbone features.")
+    parser.add_argument("--weights", required=True, help="local include_top=False weights file for the backbone")
+    parser.add_argument("--backbone", default="MobileNetV2", choices=sorted(BACKBONES))
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--feature-cache", default=feature_cache_path)
+    parser.add_argument("--model-file", default=model_file)
+    parser.add_argument("--registry-version", default=None,
+                        help="save as <MODEL_REGISTRY_DIR>/<version>/model.h5 + class_names.json instead")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    if args.registry_version:
+        out_dir = os.path.join(MODEL_REGISTRY_DIR, args.registry_version)
+        out_file = os.path.join(out_dir, "model.h5")
+    else:
+        out_dir, out_file = os.path.dirname(args.model_file), args.model_file
+    if os.path.exists(out_file) and not args.overwrite:
+        raise FileExistsError(f"❌ {out_file} exists, pass --overwrite to replace it")
+    if not os.path.exists(args.weights):
+        raise FileNotFoundError(f"❌ Backbone weights not found: {args.weights}")
+
+    extractor = build_feature_extractor(args.backbone, args.weights)
+    weights_hash = file_sha256(args.weights)
+    train_x, train_y, class_names = cached_features(extractor, train_path, args.feature_cache, weights_hash)
+    val_x, val_y, _ = cached_features(extractor, val_path, args.feature_cache, weights_hash)
+    test_x, test_y, _ = cached_features(extractor, test_path, args.feature_cache, weights_hash)
+    print(f"\n✅ Found Classes: {class_names}")
+
+    head = build_head(train_x.shape[1], len(class_names))
+    head.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=0.001),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    early_stop = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+    lr_scheduler = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3)
+    head.fit(
+        feature_dataset(train_x, train_y, training=True),
+        validation_data=feature_dataset(val_x, val_y, training=False),
+        epochs=args.epochs,
+        callbacks=[early_stop, lr_scheduler]
+    )
+    test_loss, test_accuracy = head.evaluate(feature_dataset(test_x, test_y, training=False), verbose=0)
+
+    # Full network for serving: the frozen extractor followed by the trained head
+    model = tf.keras.Sequential(
+        [tf.keras.Input(shape=IMAGE_SIZE + (3,))] + extractor.layers + head.layers,
+        name=f"{args.backbone.lower()}_transfer"
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    model.save(out_file)
+    if args.registry_version:
+        with open(os.path.join(out_dir, "class_names.json"), "w", encoding="utf-8") as f:
+            json.dump(class_names, f)
+    print(f"\n✅ Model has been saved to: {out_file}")
+    print(f"Test Loss: {test_loss:.4f}")
+    print(f"Test Accuracy: {test_accuracy * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+from fast_preprocess import INV_255
+
+# Settings (override through environment variables)
+TTA_MAX_VIEWS = int(os.environ.get("TTA_MAX_VIEWS", 32))
+TTA_MAX_SHIFT = float(os.environ.get("TTA_MAX_SHIFT", 0.06))      # fraction of width/height
+TTA_CONTRAST_JITTER = float(os.environ.get("TTA_CONTRAST_JITTER", 0.15))
+TTA_SEED = 1234
+
+
+def augment_views(image, num_views, seed=TTA_SEED, max_shift=TTA_MAX_SHIFT, contrast_jitter=TTA_CONTRAST_JITTER):
+    """Build ``num_views`` augmented float32 views of one uint8 (H, W, 3) image.
+
+    View 0 is the unmodified image. The others combine a horizontal flip (every
+    other view), a small translation with edge replication and a contrast
+    change around the image mean. All views come out of one fancy-indexing
+    gather and one broadcasted multiply-add, already scaled to [0, 1]. The
+    schedule is seeded so the same image always yields the same views.
+    """
+    height, width = image.shape[:2]
+    rng = np.random.default_rng(seed)
+    max_dy = int(round(height * max_shift))
+    max_dx = int(round(width * max_shift))
+    dy = rng.integers(-max_dy, max_dy + 1, size=num_views)
+    dx = rng.integers(-max_dx, max_dx + 1, size=num_views)
+    contrast = 1.0 + rng.uniform(-contrast_jitter, contrast_jitter, size=num_views)
+    flip = (np.arange(num_views) % 2) == 1
+    dy[0] = dx[0] = 0
+    contrast[0] = 1.0
+
+    rows = np.clip(np.arange(height)[None, :] - dy[:, None], 0, height - 1)
+    cols = np.clip(np.arange(width)[None, :] - dx[:, None], 0, width - 1)
+    cols = np.where(flip[:, None], width - 1 - cols, cols)
+    views = image[rows[:, :, None], cols[:, None, :]].astype(np.float32)   # (K, H, W, 3)
+
+    mean = views.mean(axis=(1, 2, 3), keepdims=True)
+    scale = (contrast.astype(np.float32) * INV_255).reshape(-1, 1, 1, 1)
+    views = (views - mean) * scale + mean * INV_255
+    np.clip(views, 0.0, 1.0, out=views)
+    return views
+
+
+def predict_with_tta(backend, image, num_views):
+    """Run all views in one forward pass and summarise them.
+
+    Returns (mean softmax, uncertainty, agreement): uncertainty is the
+    standard deviation of the winning class probability across views and
+    agreement the fraction of views whose own argmax matches the mean's.
+    """
+    views = augment_views(image, num_views)
+    probs = np.asarray(backend.predict_on_batch(views), dtype=np.float32)
+    mean = probs.mean(axis=0)
+    winner = int(np.argmax(mean))
+    uncertainty = float(probs[:, winner].std())
+    agreement = float(np.mean(np.argmax(probs, axis=1) == winner))
+    return mean, uncertainty, agreement
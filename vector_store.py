@@ -0,0 +1,484 @@
+"""Native on-disk vector store for the RAG scripts (replaces pickled LangChain FAISS).
+
+Usage:
+    python vector_store.py [--store-dir DIR] [--migrate faiss_vector_store.pkl]
+
+Layout::
+
+    vector_store/
+      CURRENT               # name of the generation to read
+      gen-000002/
+        manifest.json       # format, embedding model, dimension, metric, index type, sources, per-PDF records
+        index.faiss         # FAISS index (flat, IVF, HNSW or IVF-PQ) wrapped in IndexIDMap2 (ids = chunk ids)
+        chunk_ids.npy       # int64, ascending
+        text_offsets.npy    # int64 (n + 1) byte offsets into text.bin
+        text.bin            # UTF-8 chunk texts back to back
+        source_ids.npy      # int32 index into manifest["sources"]
+        pages.npy           # int32 page number, 0 when unknown
+        lexical_*.npy       # BM25 inverted index over the chunk texts (lexical_index.py)
+
+Nothing is unpickled: the index is read with FAISS memory-mapping flags and
+the chunk columns are ``np.load(mmap_mode="r")``, so worker processes share
+one page-cached copy and a chunk's text is only read when a search returns
+it. Every write goes to a new generation and then flips CURRENT, so readers
+never see a half-written store; the previous generation is kept for
+readers that still have it open.
+
+The index type is chosen with ``VECTOR_INDEX`` when a store is built:
+
+    flat    exact search, 4 bytes per dimension per chunk (the default)
+    ivf     inverted lists over k-means cells; ``VECTOR_NPROBE`` cells are scanned per query
+    hnsw    graph search; ``VECTOR_EF_SEARCH`` candidates are kept per query, deletes force a rebuild
+    pq      IVF with product-quantized vectors, one byte per sub-vector
+
+IVF and PQ are trained on the store's own vectors while it is built; a
+corpus too small to train them falls back to the nearest type that can be
+built. The type and its parameters are recorded in the manifest, and the
+search parameters can be changed at load time through the environment
+without a rebuild. ``bench_vector_index.py`` compares the types.
+
+``as_retriever(search_type="hybrid")`` fuses the vector ranking with the
+BM25 ranking by reciprocal rank fusion: exact terms such as drug names and
+ICD codes, which sentence embeddings blur, still rank their chunks high.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from typing import Any
+
+import faiss
+import numpy as np
+from langchain.schema import BaseRetriever, Document
+
+from lexical_index import LexicalIndex, write_lexical_index
+
+# ------------------ ✅ Paths ------------------ #
+FOLDER_PATH = r"E:\chest_xray\03. LLM medical diagnosis report generation Eric Topol"
+STORE_DIR = os.path.join(FOLDER_PATH, "vector_store")
+PKL_PATH = os.path.join(FOLDER_PATH, "faiss_vector_store.pkl")
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+KEEP_GENERATIONS = 2
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+INDEX_TYPES = ("flat", "ivf", "hnsw", "pq")
+# Settings (override through environment variables)
+VECTOR_INDEX = os.environ.get("VECTOR_INDEX", "flat")
+VECTOR_NLIST = int(os.environ.get("VECTOR_NLIST", 0))          # IVF cells, 0: about 4 * sqrt(chunks)
+VECTOR_HNSW_M = int(os.environ.get("VECTOR_HNSW_M", 32))       # HNSW neighbours per node
+VECTOR_PQ_M = int(os.environ.get("VECTOR_PQ_M", 0))            # PQ sub-vectors, 0: dimension / 8
+SEARCH_DEFAULTS = {"nprobe": 8, "efSearch": 64}
+# Points k-means wants per centroid; fewer train, but badly
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+# Candidates each ranking contributes to hybrid search
+HYBRID_FETCH_K = int(os.environ.get("HYBRID_FETCH_K", 20))
+# Reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+RRF_K = 60
+# Retrain IVF/PQ once an index holds this many times the vectors it was trained on
+RETRAIN_GROWTH = 2
+
+_embeddings = {}
+_embeddings_lock = threading.Lock()
+
+
+def load_embeddings(model_name=EMBEDDING_MODEL):
+    """One embedding service per process, shared by every store that uses it (see embedding_service.py)."""
+    with _embeddings_lock:
+        if model_name not in _embeddings:
+            from embedding_service import EmbeddingService
+
+            _embeddings[model_name] = EmbeddingService(model_name)
+        return _embeddings[model_name]
+
+
+# ------------------ ✅ Writing ------------------ #
+def _write_chunks(directory, chunk_ids, texts, sources, pages):
+    order = np.argsort(chunk_ids, kind="stable")
+    encoded = [texts[i].encode("utf-8") for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    source_names = sorted(set(sources))
+    source_index = {name: i for i, name in enumerate(source_names)}
+    np.save(os.path.join(directory, "chunk_ids.npy"), np.asarray(chunk_ids, dtype=np.int64)[order])
+    np.save(os.path.join(directory, "text_offsets.npy"), offsets)
+    np.save(os.path.join(directory, "source_ids.npy"),
+            np.array([source_index[sources[i]] for i in order], dtype=np.int32))
+    np.save(os.path.join(directory, "pages.npy"), np.array([pages[i] or 0 for i in order], dtype=np.int32))
+    with open(os.path.join(directory, "text.bin"), "wb") as f:
+        for blob in encoded:
+            f.write(blob)
+    return source_names
+
+
+def _generations(store_dir):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(d for d in os.listdir(store_dir) if d.startswith("gen-"))
+
+
+def current_generation(store_dir):
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_store(store_dir, index, chunk_ids, texts, sources, pages, embedding_model=EMBEDDING_MODEL,
+                metric="l2", files=None, next_id=None, index_info=None):
+    """Write a new generation and make it current. ``index`` must be an IndexIDMap2 over ``chunk_ids``.
+
+    ``files`` holds the per-PDF ingestion records (see rag_ingest.py);
+    ``next_id`` keeps chunk ids increasing across incremental updates;
+    ``index_info`` is the index type as built (``build_index``), flat when omitted.
+    """
+    if index.ntotal != len(chunk_ids):
+        raise ValueError(f"Index holds {index.ntotal} vectors but {len(chunk_ids)} chunks were given")
+    os.makedirs(store_dir, exist_ok=True)
+    existing = _generations(store_dir)
+    number = int(existing[-1].split("-")[1]) + 1 if existing else 1
+    generation = f"gen-{number:06d}"
+    directory = os.path.join(store_dir, generation)
+    os.makedirs(directory)
+
+    faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+    source_names = _write_chunks(directory, chunk_ids, texts, sources, pages)
+    lexical = write_lexical_index(directory, [texts[i] for i in np.argsort(chunk_ids, kind="stable")])
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": embedding_model,
+        "dimension": index.d,
+        "metric": metric,
+        "count": len(chunk_ids),
+        "next_id": int(max(next_id or 0, max(chunk_ids) + 1 if len(chunk_ids) else 0)),
+        "index_file": INDEX_FILE,
+        "index": index_info or {"type": "flat"},
+        "lexical": lexical,
+        "sources": source_names,
+    }
+    if files is not None:
+        manifest["files"] = files
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    tmp_path = os.path.join(store_dir, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp_path, os.path.join(store_dir, CURRENT_FILE))
+
+    for old in _generations(store_dir)[:-KEEP_GENERATIONS]:
+        # On Windows a generation still mapped by another process cannot be
+        # deleted yet; the next write tries again
+        shutil.rmtree(os.path.join(store_dir, old), ignore_errors=True)
+    return generation
+
+
+def new_index(dimension, metric="l2"):
+    return faiss.IndexIDMap2(faiss.IndexFlat(dimension, METRICS[metric]))
+
+
+# ------------------ ✅ Index types ------------------ #
+def index_config(index_type=VECTOR_INDEX, nlist=VECTOR_NLIST, hnsw_m=VECTOR_HNSW_M, pq_m=VECTOR_PQ_M):
+    """Requested index type and build parameters (0 = derived from the data when the index is built)."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+    config = {"type": index_type}
+    if index_type in ("ivf", "pq"):
+        config["nlist"] = int(nlist)
+    if index_type == "hnsw":
+        config["m"] = int(hnsw_m)
+    if index_type == "pq":
+        config["pq_m"] = int(pq_m)
+    return config
+
+
+def _resolve_config(config, count, dimension):
+    """``config`` with every derived parameter filled in for ``count`` vectors, or a fallback type."""
+    resolved = dict(config)
+    kind = resolved["type"]
+    if kind == "pq":
+        pq_m = resolved.get("pq_m") or max(1, dimension // 8)
+        while dimension % pq_m:
+            pq_m -= 1
+        resolved["pq_m"] = pq_m
+        if count < PQ_CENTROIDS:
+            print(f"⚠️ {count} chunks are too few to train product quantization, using ivf")
+            resolved = {"type": "ivf", "nlist": resolved["nlist"]}
+            kind = "ivf"
+    if kind in ("ivf", "pq"):
+        nlist = resolved.get("nlist") or int(4 * np.sqrt(count))
+        nlist = min(nlist, count // MIN_POINTS_PER_CENTROID)
+        if nlist < 2:
+            print(f"⚠️ {count} chunks are too few to train {kind}, using flat")
+            return {"type": "flat"}
+        resolved["nlist"] = nlist
+    return resolved
+
+
+def _factory_string(config):
+    kind = config["type"]
+    if kind == "ivf":
+        return f"IVF{config['nlist']},Flat"
+    if kind == "hnsw":
+        return f"HNSW{config['m']},Flat"
+    if kind == "pq":
+        return f"IVF{config['nlist']},PQ{config['pq_m']}x8"
+    return "Flat"
+
+
+def build_index(vectors, chunk_ids, metric="l2", config=None):
+    """(IndexIDMap2, resolved config) over ``vectors``; IVF and PQ are trained on them first."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    requested = config or index_config()
+    config = _resolve_config(requested, len(vectors), vectors.shape[1])
+    inner = faiss.index_factory(vectors.shape[1], _factory_string(config), METRICS[metric])
+    if not inner.is_trained:
+        start = time.perf_counter()
+        inner.train(vectors)
+        print(f"⚙️ Trained {config['type']} index on {len(vectors)} vectors in {time.perf_counter() - start:.1f}s")
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, np.asarray(chunk_ids, dtype=np.int64))
+    config.update(built_on=len(vectors), requested=dict(requested))
+    return index, config
+
+
+def search_params(config, overrides=None):
+    """Query-time parameters for an index of ``config``: ``overrides``, then the environment, then defaults.
+
+    They are not part of the manifest, so they can be tuned without a rebuild.
+    """
+    names = {"ivf": ["nprobe"], "pq": ["nprobe"], "hnsw": ["efSearch"]}.get(config.get("type"), [])
+    environment = {"nprobe": os.environ.get("VECTOR_NPROBE"), "efSearch": os.environ.get("VECTOR_EF_SEARCH")}
+    return {name: int((overrides or {}).get(name) or environment[name] or SEARCH_DEFAULTS[name]) for name in names}
+
+
+def apply_search_params(index, params):
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+
+def index_is_stale(index_info, requested, count):
+    """True when an index described by ``index_info`` should be rebuilt for ``count`` vectors.
+
+    That is when another type or other parameters are requested, or when a
+    trained index (or one that fell back to a simpler type) has grown past
+    ``RETRAIN_GROWTH`` times the vectors it was built from.
+    """
+    if index_info.get("requested", {"type": index_info["type"]}) != requested:
+        return True
+    trained = index_info["type"] in ("ivf", "pq") or index_info["type"] != requested["type"]
+    return trained and count > RETRAIN_GROWTH * index_info.get("built_on", count)
+
+
+def build_store(store_dir, chunks, embedding_model=EMBEDDING_MODEL, config=None):
+    """Embed LangChain ``chunks`` and write them as a new generation; returns the loaded store."""
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = np.asarray(load_embeddings(embedding_model).embed_documents(texts), dtype=np.float32)
+    chunk_ids = np.arange(len(texts), dtype=np.int64)
+    index, index_info = build_index(vectors, chunk_ids, config=config)
+    write_store(store_dir, index, chunk_ids, texts,
+                [chunk.metadata.get("source", "") for chunk in chunks],
+                [chunk.metadata.get("page", 0) for chunk in chunks], embedding_model, index_info=index_info)
+    return VectorStore.load(store_dir)
+
+
+def migrate_pickle(pkl_path, store_dir):
+    """Convert a pickled LangChain FAISS store (trusted, self-written file) into the native format."""
+    print(f"⚙️ Migrating {pkl_path} to {store_dir}")
+    with open(pkl_path, "rb") as f:
+        legacy = pickle.load(f)
+    index = legacy.index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    documents = [legacy.docstore.search(legacy.index_to_docstore_id[i]) for i in range(index.ntotal)]
+    metric = "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+    chunk_ids = np.arange(index.ntotal, dtype=np.int64)
+    native = new_index(index.d, metric)
+    native.add_with_ids(vectors, chunk_ids)
+    embedding_model = getattr(legacy.embedding_function, "model_name", EMBEDDING_MODEL)
+    generation = write_store(store_dir, native, chunk_ids, [doc.page_content for doc in documents],
+                             [doc.metadata.get("source", "") for doc in documents],
+                             [doc.metadata.get("page", 0) for doc in documents], embedding_model, metric)
+    print(f"✅ Migrated {index.ntotal} chunks into {generation}")
+    return generation
+
+
+# ------------------ ✅ Reading ------------------ #
+def read_manifest(store_dir):
+    """(generation, manifest) of the current generation, or (None, None) without a store."""
+    generation = current_generation(store_dir)
+    if generation is None:
+        return None, None
+    with open(os.path.join(store_dir, generation, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return generation, json.load(f)
+
+
+def _read_index(path, mmap=True):
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            pass  # faiss build or index type without memory-mapped reads
+    return faiss.read_index(path)
+
+
+class ChunkStore:
+    """Columnar chunk texts and metadata, memory-mapped and looked up by chunk id."""
+
+    def __init__(self, directory, sources):
+        self.sources = sources
+        self.ids = np.load(os.path.join(directory, "chunk_ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "text_offsets.npy"), mmap_mode="r")
+        self.source_ids = np.load(os.path.join(directory, "source_ids.npy"), mmap_mode="r")
+        self.pages = np.load(os.path.join(directory, "pages.npy"), mmap_mode="r")
+        text_path = os.path.join(directory, "text.bin")
+        # np.memmap cannot map an empty file
+        self._text = (np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path)
+                      else np.zeros(0, dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, chunk_ids):
+        """Row of every id, -1 where the id is unknown (FAISS pads missing results with -1)."""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, chunk_ids)
+        clipped = np.minimum(rows, max(len(self.ids) - 1, 0))
+        found = (rows < len(self.ids)) & (np.asarray(self.ids[clipped]) == chunk_ids) if len(self.ids) else False
+        return np.where(found, rows, -1)
+
+    def text(self, row):
+        return bytes(self._text[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def document(self, row):
+        return Document(
+            page_content=self.text(row),
+            metadata={"source": self.sources[self.source_ids[row]], "page": int(self.pages[row]),
+                      "chunk_id": int(self.ids[row])}
+        )
+
+    def documents(self, chunk_ids):
+        return [self.document(row) for row in self.rows(chunk_ids) if row >= 0]
+
+
+class VectorStore:
+    """One loaded generation: the FAISS index plus its chunk store."""
+
+    def __init__(self, store_dir, generation, manifest, index, chunks, lexical=None):
+        self.store_dir = store_dir
+        self.generation = generation
+        self.manifest = manifest
+        self.index = index
+        self.chunks = chunks
+        self.lexical = lexical
+
+    @classmethod
+    def load(cls, store_dir, mmap=True):
+        generation, manifest = read_manifest(store_dir)
+        if generation is None:
+            raise FileNotFoundError(f"No vector store in {store_dir}")
+        directory = os.path.join(store_dir, generation)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format {manifest.get('format_version')} in {directory}")
+        index = _read_index(os.path.join(directory, manifest["index_file"]), mmap)
+        index_info = manifest.get("index", {"type": "flat"})
+        apply_search_params(index, search_params(index_info))
+        print(f"📦 Loaded vector store {generation} ({manifest['count']} chunks, {index_info['type']} index)")
+        return cls(store_dir, generation, manifest, index, ChunkStore(directory, manifest["sources"]),
+                   LexicalIndex.load(directory, manifest.get("lexical")))
+
+    @property
+    def embeddings(self):
+        return load_embeddings(self.manifest["embedding_model"])
+
+    def search(self, query_vectors, k=4):
+        """(distances, chunk ids) for a float32 (n, d) batch of query vectors."""
+        return self.index.search(np.ascontiguousarray(query_vectors, dtype=np.float32), k)
+
+    def similarity_search(self, query, k=4):
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)[None]
+        _, ids = self.search(vector, k)
+        return self.chunks.documents(ids[0])
+
+    def hybrid_search(self, query, k=4, fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K):
+        """Top ``k`` chunks by reciprocal rank fusion of the vector and BM25 rankings.
+
+        Each ranking contributes its best ``fetch_k`` chunks; a chunk scores
+        1 / (rrf_k + rank) per ranking it appears in. Without a lexical index
+        (generations written before it existed) this is a similarity search.
+        """
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)[None]
+        _, ids = self.search(vector, max(k, fetch_k))
+        rankings = [[row for row in self.chunks.rows(ids[0]) if row >= 0]]
+        if self.lexical is not None:
+            rankings.append(self.lexical.search(query, max(k, fetch_k))[1])
+        fused = {}
+        for ranking in rankings:
+            for rank, row in enumerate(ranking, start=1):
+                fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (rrf_k + rank)
+        documents = []
+        for row in sorted(fused, key=lambda row: -fused[row])[:k]:
+            document = self.chunks.document(row)
+            document.metadata["rrf_score"] = fused[row]
+            documents.append(document)
+        return documents
+
+    def as_retriever(self, search_type="similarity", search_kwargs=None):
+        search_kwargs = search_kwargs or {}
+        return StoreRetriever(store=self, search_type=search_type, k=search_kwargs.get("k", 4),
+                              fetch_k=search_kwargs.get("fetch_k", HYBRID_FETCH_K))
+
+
+class StoreRetriever(BaseRetriever):
+    """LangChain retriever over a VectorStore, usable in RetrievalQA.
+
+    ``search_type`` is "similarity" (vectors only) or "hybrid" (vectors and BM25, see ``hybrid_search``).
+    """
+
+    store: Any
+    search_type: str = "similarity"
+    k: int = 4
+    fetch_k: int = HYBRID_FETCH_K
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if self.search_type == "hybrid":
+            return self.store.hybrid_search(query, self.k, self.fetch_k)
+        if self.search_type != "similarity":
+            raise ValueError(f"Unknown search_type {self.search_type!r}, expected 'similarity' or 'hybrid'")
+        return self.store.similarity_search(query, self.k)
+
+
+def open_store(store_dir=STORE_DIR, legacy_pkl_path=PKL_PATH):
+    """Load the current generation, migrating a legacy pickle on first use."""
+    if current_generation(store_dir) is None and legacy_pkl_path and os.path.exists(legacy_pkl_path):
+        migrate_pickle(legacy_pkl_path, store_dir)
+    return VectorStore.load(store_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Native memory-mapped vector store.")
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    parser.add_argument("--migrate", default=None, metavar="PKL", help="convert a pickled FAISS store")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate_pickle(args.migrate, args.store_dir)
+    store = VectorStore.load(args.store_dir)
+    directory = os.path.join(args.store_dir, store.generation)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(json.dumps({k: v for k, v in store.manifest.items() if k != "sources"}, indent=2))
+    print(f"📄 {len(store.manifest['sources'])} sources, {size / 1e6:.1f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()